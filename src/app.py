@@ -2,35 +2,118 @@
 import os
 import io
 import json
+import time
 import asyncio
-import uvicorn
-import httpx
 import logging
-import subprocess
 import socket
 import wave
+import argparse
+import importlib.util
+from collections import deque
 from contextlib import asynccontextmanager
-from wyoming.client import AsyncTcpClient
-from wyoming.audio import AudioChunk, AudioStop
-from wyoming.asr import Transcribe, Transcript
-from fastapi import FastAPI, WebSocketDisconnect, Request, UploadFile, File, HTTPException, Depends
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, UploadFile, File, HTTPException, Depends
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, JSONResponse
-from routes import settings, clients, chatHistory, presets
-from routes.globals import connected_clients, pending_deletions
-from routes.utils import validate_connection
+from routes import settings, clients, chatHistory, presets, admission, metrics, tracing, models, state, upstreams
+from routes.globals import pending_deletions, transcript_cache
+from routes.utils import validate_connection, send_to_clients
+from generate_model_dict import generate_model_dict, LIVE2D_DIR
 
 # Load constants from settings.yaml
-config = settings.load_settings()
+# NOTE: httpx, wyoming, numpy (routes.audio) and uvicorn are imported on first use, keeping them out of startup.
+# Run 'python app.py --profile-startup' to see what the backend spends its startup time on.
+config = settings.get_config()
 HOST = config.get("backend", {}).get("app", {}).get("host", "0.0.0.0")
 PORT = config.get("backend", {}).get("app", {}).get("port", 11405)
 PROTOCOL = config.get("backend", {}).get("app", {}).get("protocol", "http")
 LOG_LEVEL = config.get("backend", {}).get("logging", {}).get("level", "INFO").upper()
-OLLAMA_WEBHOOK = config.get("urls", {}).get("ollama_webhook", "http://homeassistant.local:8123/api/webhook/ollama_chat")
+OLLAMA_WEBHOOK = config.get("backend", {}).get("urls", {}).get("ollama_webhook", "http://homeassistant.local:8123/api/webhook/ollama_chat")
+OLLAMA_WEBHOOKS = config.get("backend", {}).get("urls", {}).get("ollama_webhooks", [])
+WEBHOOK_CONFIG = config.get("backend", {}).get("webhook", {})
+BREAKER_CONFIG = config.get("backend", {}).get("breaker", {})
 WHISPER_HOST = config.get("backend", {}).get("urls", {}).get("whisper_host", "127.0.0.1")
 WHISPER_PORT = config.get("backend", {}).get("urls", {}).get("whisper_port", 10300)
+WHISPER_ENDPOINTS = config.get("backend", {}).get("urls", {}).get("whisper_endpoints", [])
 SAVE_CHAT_HISTORY = bool(config.get("frontend", {}).get("save-chat-history", True))
 TIMEOUT_DURATION = config.get("frontend", {}).get("timeout", 180)
+PRIVATE_MODE_CONFIG = config.get("backend", {}).get("private_mode", {})
+DELETION_SWEEP_INTERVAL = PRIVATE_MODE_CONFIG.get("sweep_interval", 10)
+pending_deletions.ttl = PRIVATE_MODE_CONFIG.get("ack_timeout", 300)
+pending_deletions.max_entries = PRIVATE_MODE_CONFIG.get("max_pending", 256)
+STT_RESAMPLE = bool(config.get("backend", {}).get("stt", {}).get("resample", True))
+STT_LANGUAGE = config.get("backend", {}).get("stt", {}).get("language", "en")
+STT_HEALTH_INTERVAL = config.get("backend", {}).get("stt", {}).get("health_interval", 10)
+STT_UNHEALTHY_AFTER = config.get("backend", {}).get("stt", {}).get("unhealthy_after", 2)
+transcript_cache.max_entries = config.get("backend", {}).get("stt", {}).get("cache_size", 128)
+transcript_cache.ttl = config.get("backend", {}).get("stt", {}).get("cache_ttl", 600)
+VAD_ENABLED = bool(config.get("backend", {}).get("vad", {}).get("enabled", True))
+TTS_POSTPROCESS = bool(config.get("backend", {}).get("tts", {}).get("enabled", True))
+LIPSYNC_ENABLED = bool(config.get("backend", {}).get("lipsync", {}).get("enabled", True))
+MODEL_WATCH_INTERVAL = config.get("backend", {}).get("models", {}).get("watch_interval", 10)
+MODEL_BUNDLE = bool(config.get("backend", {}).get("models", {}).get("bundle", True))
+MODEL_TEXTURE_VARIANTS = bool(config.get("backend", {}).get("models", {}).get("texture_variants", True))
+STATE_CONFIG = config.get("backend", {}).get("state", {})
+SERVER_CONFIG = config.get("backend", {}).get("server", {})
+WEBSOCKET_CONFIG = config.get("backend", {}).get("websocket", {})
+NOTIFICATION_CLAIM_TTL = 30  # Seconds before another worker may take over a notification whose claimant died
+
+async def whisper_health_check(endpoint: upstreams.Endpoint) -> bool:
+    """
+    Checks that a Whisper endpoint answers a Wyoming 'describe' request with its info.
+
+    Args:
+        endpoint (Endpoint): The Whisper endpoint.
+
+    Returns:
+        bool: True if the endpoint answered.
+    """
+    from wyoming.client import AsyncTcpClient
+    from wyoming.info import Describe, Info
+
+    async with AsyncTcpClient(endpoint.host, endpoint.port) as client:
+        await client.write_event(Describe().event())
+        while (event := await client.read_event()) is not None:
+            if Info.is_type(event.type):
+                return True
+    return False
+
+async def broadcast_upstream_status(breaker: upstreams.CircuitBreaker):
+    """Tells every client (on every worker) that an upstream service became unavailable, is being probed or recovered."""
+    await state.backend.publish("broadcast", breaker.event())
+
+def circuit_breaker(name: str, slow_seconds: float) -> upstreams.CircuitBreaker:
+    """Builds the circuit breaker of an upstream service from 'backend.breaker' in settings.yaml."""
+    return upstreams.CircuitBreaker(
+        name,
+        enabled=bool(BREAKER_CONFIG.get("enabled", True)),
+        window=BREAKER_CONFIG.get("window", 20),
+        min_calls=BREAKER_CONFIG.get("min_calls", 5),
+        failure_ratio=BREAKER_CONFIG.get("failure_ratio", 0.5),
+        slow_seconds=BREAKER_CONFIG.get(f"{name}_slow_seconds", slow_seconds),
+        slow_ratio=BREAKER_CONFIG.get("slow_ratio", 0.8),
+        open_seconds=BREAKER_CONFIG.get("open_seconds", 30),
+        probes=BREAKER_CONFIG.get("probes", 1),
+        on_change=broadcast_upstream_status
+    )
+
+# Whisper endpoints, each request being sent to the one with the fewest outstanding requests
+stt_pool = upstreams.pools["stt"] = upstreams.EndpointPool(
+    "stt", upstreams.parse_tcp_endpoints(WHISPER_ENDPOINTS, WHISPER_HOST, WHISPER_PORT),
+    health_check=whisper_health_check, interval=STT_HEALTH_INTERVAL, unhealthy_after=STT_UNHEALTHY_AFTER,
+    breaker=circuit_breaker("stt", 3)
+)
+if not config.get("backend", {}).get("admission", {}).get("stt_concurrency", 0):
+    admission.stages["stt"].concurrency = len(stt_pool.endpoints)
+
+# Ollama webhook endpoints, tried fastest first and failed over (or hedged, see 'backend.webhook') when one is slow or down
+webhook_pool = upstreams.pools["webhook"] = upstreams.EndpointPool(
+    "webhook", upstreams.parse_url_endpoints([OLLAMA_WEBHOOK, *OLLAMA_WEBHOOKS]),
+    breaker=circuit_breaker("webhook", 30)
+)
+
+def webhook_hedge_delay(endpoint: upstreams.Endpoint) -> float:
+    """Returns how long to wait for a webhook endpoint before also sending the prompt to the next one."""
+    return upstreams.hedge_delay(endpoint, WEBHOOK_CONFIG.get("hedge_percentile", 95), WEBHOOK_CONFIG.get("hedge_delay", 2))
 
 # Initialize logging framework
 logging.basicConfig(level=LOG_LEVEL, format="[vCHAOS] (%(levelname)s) %(message)s")
@@ -42,29 +125,50 @@ async def lifespan(app: FastAPI):
     """
     Manages application startup and shutdown events.
     
+    - Connects to the shared state backend, so that several workers can serve clients together.
+    - Health-checks the Whisper endpoints, taking unresponsive ones out of rotation (one worker checks for all).
     - Monitors existence of 'notification_file' signalling responses from Piper Docker.
+    - Sweeps expired pending deletions in private mode.
+    - Packages Live2D models, and adds new ones to model_dict.json as they appear.
+    - Writes recorded trace hops to the trace log in the background.
     - Suppresses asyncio connection errors.
     - Ensures clean shutdown.
     
     Args:
         app (FastAPI): The FastAPI application instance.
     """
+    state.backend = state.create_backend(STATE_CONFIG)
+    await state.backend.start()
+    asyncio.create_task(stt_pool.run_health_checks())
     asyncio.create_task(monitor_notifications())
+    if not SAVE_CHAT_HISTORY:
+        asyncio.create_task(sweep_pending_deletions())
+    asyncio.create_task(watch_live2d_models())
+    asyncio.create_task(tracing.write_log())
     suppress_asyncio_error()
 
     yield
 
     logger.info("App is shutting down...")
+    await tracing.flush_log()
+    await state.backend.stop()
 
 # Using FastAPI/WebSockets + Uvicorn for real-time communication
 app = FastAPI(lifespan=lifespan)
 notification_file = "output/new_audio.json"
 
+# Broadcasts published by any worker are delivered to the clients connected to each worker
+state.subscribe("broadcast", send_to_clients)
+
 # Include API routes
 app.include_router(settings.router)
 app.include_router(clients.router)
 app.include_router(chatHistory.router)
 app.include_router(presets.router)
+app.include_router(admission.router)
+app.include_router(metrics.router)
+app.include_router(tracing.router)
+app.include_router(models.router)
 
 # Serve static files
 app.mount("/static", StaticFiles(directory="static", html=True), name="static")
@@ -72,14 +176,34 @@ app.mount("/live2d_models", StaticFiles(directory="live2d_models"), name="live2d
 app.mount("/output", StaticFiles(directory="output"), name="output")
 
 @app.get("/")
-async def serve_root():
+async def serve_root(request: Request):
     """
     Serves the frontend webpage for vCHAOS.
+    The bundle of the configured Live2D model, with the texture variant chosen for this device,
+    is announced with a 'Link: preload' header, so the browser downloads it while the page and
+    its scripts are still loading. The chosen variant is passed to the frontend in a cookie.
+
+    Args:
+        request (Request): The incoming request, carrying the client's device hint.
 
     Returns:
         FileResponse: The 'index.html' file from the static directory.
     """
-    return FileResponse("static/index.html")
+    variant = models.choose_variant(request)
+    headers = {"Accept-CH": "Sec-CH-Viewport-Width, Sec-CH-DPR, Sec-CH-Device-Memory"}
+    try:
+        settings.settings_response.refresh()
+        settings.models_response.refresh()
+        model_name = settings.settings_response.content.get("model-name")
+        model = next((m for m in settings.models_response.content if m["name"] == model_name), None)
+        if link := models.preload_links(model, variant):
+            headers["Link"] = link
+    except Exception as e:
+        logger.debug(f"No model preload hint: {e}")
+
+    response = FileResponse("static/index.html", headers=headers)
+    response.set_cookie("texture-variant", variant, samesite="strict")
+    return response
 
 @app.post("/api/send_prompt")
 async def send_prompt(request: Request, _: None = Depends(validate_connection)):
@@ -91,9 +215,11 @@ async def send_prompt(request: Request, _: None = Depends(validate_connection)):
         _: None: Validates whether request originates from an active WebSocket client.
 
     Returns:
-        JSONResponse: Success message and input text if processed successfully.
+        JSONResponse: Success message, input text and correlation ID ('trace_id') if processed successfully.
         Always returns 200 OK status code to ensure graceful handling.
         If an exception occurs, an error message will be returned.
+        429 error with a 'Retry-After' header if the LLM admission queue is full.
+        503 error with a 'Retry-After' header if the webhook's circuit breaker is open.
     """
     try:
         data = await request.json()
@@ -102,25 +228,101 @@ async def send_prompt(request: Request, _: None = Depends(validate_connection)):
         if not user_input:
             return {"success": False, "error": "No input text provided"}
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await asyncio.wait_for(
-                    client.post(OLLAMA_WEBHOOK, json={"text": user_input}, headers={"Content-Type": "application/json"}),
-                    timeout=TIMEOUT_DURATION
-                )
-                response.raise_for_status()
-                return {"success": True, "message": "Sent successfully", "input": user_input}
-
-            except asyncio.TimeoutError:
-                return {"success": False, "error": f"Request timed out after {TIMEOUT_DURATION} seconds"}
-
-    except httpx.RequestError as e:
-        return {"success": False, "error": f"HTTP Request error: {str(e)}"}
+        return await forward_prompt(user_input, request.client.host, data.get("trace_id"))
+
+    except admission.AdmissionRejected as e:
+        return admission.rejection_response(e)
+    except upstreams.CircuitOpen as e:
+        return upstreams.unavailable_response(e)
     except Exception as e:
         return {"success": False, "error": f"Application error: {str(e)}"}
 
+async def forward_prompt(user_input: str, client_ip: str, trace_id: str = None) -> dict:
+    """
+    Forwards a prompt to the Ollama webhook once the LLM admission queue has a free slot.
+    With several webhook endpoints, the fastest is tried first, failing over to the others if it errors;
+    with hedging enabled, a slow endpoint is raced against the next one after its p95 latency.
+
+    Args:
+        user_input (str): The prompt text.
+        client_ip (str): IP of the requesting client.
+        trace_id (str): Correlation ID supplied by the client, or None to generate one.
+
+    Returns:
+        dict: Success message, input text and correlation ID, or an error message if the webhook timed out, could not be reached
+            or returned an error status (without its URL, which is a credential).
+
+    Raises:
+        AdmissionRejected: If the LLM admission queue is full.
+        CircuitOpen: If the webhook's circuit breaker is open, failing the prompt without queueing it.
+    """
+    import httpx
+
+    webhook_pool.breaker.check()
+    trace_id = tracing.start_trace(trace_id)
+    tracing.record(trace_id, "prompt_received", client=client_ip)
+
+    try:
+        async with admission.stages["llm"].admit(client_ip):
+            started = metrics.begin("webhook")
+            failed = True
+            tracing.record(trace_id, "webhook_sent")
+            try:
+                async with httpx.AsyncClient() as client:
+                    async def post(endpoint: upstreams.Endpoint):
+                        response = await client.post(endpoint.address, json={"text": user_input, "trace_id": trace_id}, headers={"Content-Type": "application/json"})
+                        response.raise_for_status()
+                        return response
+
+                    try:
+                        async with webhook_pool.breaker.guard():
+                            endpoint, _ = await asyncio.wait_for(
+                                upstreams.send_with_failover(
+                                    webhook_pool, post, webhook_hedge_delay if WEBHOOK_CONFIG.get("hedge", False) else None,
+                                    WEBHOOK_CONFIG.get("attempt_timeout", 0) or TIMEOUT_DURATION / len(webhook_pool.endpoints)
+                                ),
+                                timeout=TIMEOUT_DURATION
+                            )
+                        failed = False
+                        tracing.record(trace_id, "webhook_completed", endpoint=endpoint.label)
+                        return {"success": True, "message": "Sent successfully", "input": user_input, "trace_id": trace_id}
+
+                    except asyncio.TimeoutError:
+                        return {"success": False, "error": f"Request timed out after {TIMEOUT_DURATION} seconds"}
+                    except httpx.HTTPStatusError as e:
+                        return {"success": False, "error": f"Webhook returned {e.response.status_code}"}
+                    except httpx.RequestError as e:
+                        return {"success": False, "error": f"HTTP Request error: {str(e)}"}
+            finally:
+                metrics.end("webhook", started, failed)
+                if failed:
+                    tracing.discard_pending(trace_id)
+
+    except admission.AdmissionRejected:
+        tracing.discard_pending(trace_id)
+        raise
+
 @app.post("/api/send_voice")
-async def send_voice(audio: UploadFile = File(...), _: None = Depends(validate_connection)):
+async def send_voice(request: Request, audio: UploadFile = File(...), _: None = Depends(validate_connection)):
+    """
+    Transcribes the user's recorded voice prompt via the Faster-Whisper (Wyoming) backend.
+    The audio is first converted to 16 kHz mono 16-bit (see 'backend.stt' in settings.yaml),
+    then leading/trailing silence and long pauses are trimmed (see 'backend.vad' in settings.yaml).
+    Transcripts are cached by recording, so the same recording sent again skips Whisper entirely.
+
+    Args:
+        request (Request): The incoming request, used to report the client's queue position.
+        audio (UploadFile): The recorded .wav file.
+        _: None: Validates whether request originates from an active WebSocket client.
+
+    Returns:
+        JSONResponse: The transcribed text, the amount of silence trimmed and whether the transcript was cached if processed successfully.
+        429 error with a 'Retry-After' header if the STT admission queue is full.
+        503 error with a 'Retry-After' header if the Whisper circuit breaker is open (cached transcripts are still served).
+        500 error for further exceptions.
+    """
+    from routes import audio as audio_utils
+
     try:
         input_bytes = await audio.read()
 
@@ -130,40 +332,236 @@ async def send_voice(audio: UploadFile = File(...), _: None = Depends(validate_c
             frames = wf.readframes(wf.getnframes())
             params = wf.getparams()
 
+        rate, width, channels = params.framerate, params.sampwidth, params.nchannels
+        cache_key = transcript_cache.key(frames, rate, width, channels, STT_LANGUAGE)
+        if (cached := transcript_cache.get(cache_key)) is not None:
+            logger.info("Voice prompt transcript served from cache")
+            return {**cached, "cached": True}
+        stt_pool.breaker.check()
+
+        if STT_RESAMPLE:
+            frames, rate, width, channels = await asyncio.to_thread(audio_utils.to_whisper_format, frames, rate, width, channels)
+
+        trimmed = {"trimmed_bytes": 0, "trimmed_ms": 0.0}
+        if VAD_ENABLED:
+            frames, trimmed = await asyncio.to_thread(audio_utils.trim_silence, frames, rate, width, channels)
+            logger.info(f"Trimmed {trimmed['trimmed_bytes']} bytes ({trimmed['trimmed_ms']} ms) of silence from voice prompt")
+
         # Send to Faster-Whisper backend
-        async with AsyncTcpClient(WHISPER_HOST, WHISPER_PORT) as client:
-            await client.write_event(Transcribe(language="en").event())
-
-            chunk_size = 4096
-            offset = 0
-            while offset < len(frames):
-                chunk = AudioChunk(
-                    rate=params.framerate,
-                    width=params.sampwidth,
-                    channels=params.nchannels,
-                    audio=frames[offset:offset+chunk_size]
-                )
-                await client.write_event(chunk.event())
-                offset += chunk_size
+        async with admission.stages["stt"].admit(request.client.host):
+            started = metrics.begin("whisper")
+            failed = True
+            try:
+                text = await transcribe(frames, rate, width, channels)
+                failed = False
+            finally:
+                metrics.end("whisper", started, failed)
+
+        result = {"success": True, "transcription": text, "trimmed_bytes": trimmed["trimmed_bytes"], "trimmed_ms": trimmed["trimmed_ms"]}
+        transcript_cache.put(cache_key, result)
+        return {**result, "cached": False}
+
+    except admission.AdmissionRejected as e:
+        return admission.rejection_response(e)
+    except upstreams.CircuitOpen as e:
+        return upstreams.unavailable_response(e)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
 
-            await client.write_event(AudioStop().event())
+async def transcribe(frames: bytes, rate: int, width: int, channels: int) -> str:
+    """
+    Streams PCM audio to a Faster-Whisper (Wyoming) server and waits for its transcript.
+    The request goes to the Whisper endpoint with the fewest outstanding requests.
+
+    Args:
+        frames (bytes): Raw PCM audio.
+        rate (int): Sample rate in Hz.
+        width (int): Sample width in bytes.
+        channels (int): Number of interleaved channels.
+
+    Returns:
+        str: The transcribed text.
+
+    Raises:
+        CircuitOpen: If Whisper's circuit breaker is open.
+    """
+    from wyoming.client import AsyncTcpClient
+    from wyoming.audio import AudioChunk, AudioStop
+    from wyoming.asr import Transcribe, Transcript
+
+    # Transcription time grows with the recording, so Whisper is only considered slow relative to its length (at least 1 s)
+    audio_seconds = max(1.0, len(frames) / (rate * width * channels))
+    async with stt_pool.breaker.guard(size=audio_seconds), stt_pool.request() as endpoint, AsyncTcpClient(endpoint.host, endpoint.port) as client:
+        await client.write_event(Transcribe(language=STT_LANGUAGE).event())
+
+        chunk_size = 4096
+        offset = 0
+        while offset < len(frames):
+            chunk = AudioChunk(
+                rate=rate,
+                width=width,
+                channels=channels,
+                audio=frames[offset:offset+chunk_size]
+            )
+            await client.write_event(chunk.event())
+            offset += chunk_size
+
+        await client.write_event(AudioStop().event())
+
+        while True:
+            event = await client.read_event()
+            if event is None:
+                raise RuntimeError("No response from STT server")
+
+            transcript = Transcript.from_event(event)
+            if transcript:
+                return transcript.text
+
+@app.websocket("/ws/stt")
+async def stream_voice(websocket: WebSocket):
+    """
+    Streams the user's voice prompt to Faster-Whisper while they are still speaking,
+    then submits the final transcript as a prompt.
+
+    Protocol:
+        - Client sends a JSON 'start' message: {"type": "start", "rate": 16000, "width": 2, "channels": 1}.
+        - Client sends raw PCM audio as binary frames, followed by a JSON {"type": "stop"} message.
+        - Server replies with 'partial' messages as interim transcripts arrive, a 'final' message with the
+          complete transcript, then a 'submitted' message with the result of forwarding it to the webhook.
+        - Errors are reported as {"type": "error", "error": ...} messages, with a 'retry_after' if the STT
+          admission queue is full or Whisper is unavailable.
+
+    Args:
+        websocket (WebSocket): WebSocket connection instance. The client must also hold an active '/ws' connection.
+    """
+    await websocket.accept()
+    client_ip = websocket.client.host
+
+    try:
+        if not state.backend.is_registered(client_ip):
+            await websocket.send_json({"type": "error", "error": "Unauthorized: WebSocket connection required."})
+            return
+        stt_pool.breaker.check()
+
+        start = await websocket.receive_json()
+        rate = int(start.get("rate", 16000))
+        width = int(start.get("width", 2))
+        channels = int(start.get("channels", 1))
+
+        async with admission.stages["stt"].admit(client_ip):
+            started = metrics.begin("whisper")
+            failed = True
+            try:
+                text = await stream_transcribe(websocket, rate, width, channels)
+                failed = False
+            finally:
+                metrics.end("whisper", started, failed)
+
+        text = text.strip()
+        await websocket.send_json({"type": "final", "text": text})
+
+        if not text:
+            await websocket.send_json({"type": "submitted", "success": False, "error": "No speech detected"})
+            return
+
+        try:
+            result = await forward_prompt(text, client_ip)
+        except (admission.AdmissionRejected, upstreams.CircuitOpen) as e:
+            result = {"success": False, "error": str(e), "retry_after": e.retry_after}
+        await websocket.send_json({"type": "submitted", **result})
+
+    except (admission.AdmissionRejected, upstreams.CircuitOpen) as e:
+        await websocket.send_json({"type": "error", "error": str(e), "retry_after": e.retry_after})
+    except WebSocketDisconnect:
+        logger.info(f"Voice stream from {client_ip} disconnected")
+    except Exception as e:
+        logger.error(f"Voice stream error for {client_ip}: {e}")
+        try:
+            await websocket.send_json({"type": "error", "error": str(e)})
+        except Exception:
+            pass
+    finally:
+        try:
+            await websocket.close()
+        except Exception:
+            pass
 
+async def stream_transcribe(websocket: WebSocket, rate: int, width: int, channels: int) -> str:
+    """
+    Forwards audio frames from a client WebSocket to Faster-Whisper as they arrive,
+    relaying interim transcripts back to the client until the final transcript is received.
+    Leading silence is held back (up to 'backend.vad.padding_ms') until speech is detected.
+
+    Args:
+        websocket (WebSocket): Client WebSocket sending binary PCM frames and a JSON 'stop' message.
+        rate (int): Sample rate in Hz.
+        width (int): Sample width in bytes.
+        channels (int): Number of interleaved channels.
+
+    Returns:
+        str: The final transcript.
+    """
+    from wyoming.client import AsyncTcpClient
+    from wyoming.audio import AudioChunk, AudioStart, AudioStop
+    from wyoming.asr import Transcribe, Transcript, TranscriptChunk
+    from routes import audio as audio_utils
+
+    async with stt_pool.breaker.guard(record_latency=False, ignore=(WebSocketDisconnect,)), \
+            stt_pool.request(record_latency=False) as endpoint, AsyncTcpClient(endpoint.host, endpoint.port) as client:
+        await client.write_event(Transcribe(language=STT_LANGUAGE).event())
+        await client.write_event(AudioStart(rate=rate, width=width, channels=channels).event())
+
+        async def read_transcript():
+            partial = ""
             while True:
                 event = await client.read_event()
                 if event is None:
                     raise RuntimeError("No response from STT server")
 
-                transcript = Transcript.from_event(event)
-                if transcript:
-                    text = transcript.text
-                    break
+                if TranscriptChunk.is_type(event.type):
+                    partial += TranscriptChunk.from_event(event).text
+                    await websocket.send_json({"type": "partial", "text": partial})
+                elif Transcript.is_type(event.type):
+                    return Transcript.from_event(event).text
 
-        return {"success": True, "transcription": text}
+        reader = asyncio.create_task(read_transcript())
+        try:
+            speech_started = not VAD_ENABLED
+            preroll = deque()
+            preroll_limit = rate * width * channels * audio_utils.VAD_CONFIG.get("padding_ms", 200) // 1000
 
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(message.get("code", 1000))
+
+                if message.get("bytes"):
+                    chunk = message["bytes"]
+                    if not speech_started:
+                        preroll.append(chunk)
+                        if not audio_utils.is_speech(chunk, rate, width, channels):
+                            while len(preroll) > 1 and sum(map(len, preroll)) - len(preroll[0]) >= preroll_limit:
+                                preroll.popleft()
+                            continue
+                        speech_started = True
+                        chunk = b"".join(preroll)
+                        preroll.clear()
+                    await client.write_event(AudioChunk(rate=rate, width=width, channels=channels, audio=chunk).event())
+
+                elif message.get("text"):
+                    break  # 'stop' message
+
+                if reader.done():
+                    break  # STT server finished (or failed) early
+
+            if preroll:
+                await client.write_event(AudioChunk(rate=rate, width=width, channels=channels, audio=b"".join(preroll)).event())
+            await client.write_event(AudioStop().event())
+            return await reader
+        finally:
+            reader.cancel()
 
 # Monitor shared notification file to detect if a new TTS output is generated from Piper Docker
 async def monitor_notifications():
@@ -171,24 +569,57 @@ async def monitor_notifications():
     Monitors the notification file and sends updates to clients.
 
     Continuously checks for new TTS output and forwards the data to active WebSocket clients.
+    Every worker watches the file, but only the one claiming a notification processes it and publishes
+    it to the clients of all workers; it also keeps the response's trace and pending deletion.
+    The response's audio is loudness-normalised and trimmed, and its lip sync envelope computed, once here.
     """
     while True:
         if os.path.exists(notification_file):
             try:
+                stat = os.stat(notification_file)
+                written_at = stat.st_mtime
+                if not await state.backend.claim(f"notification:{stat.st_mtime_ns}", NOTIFICATION_CLAIM_TTL):
+                    await asyncio.sleep(1)
+                    continue
                 with open(notification_file, "r", encoding="utf-8") as f:
                     data = json.load(f)
                 audio_path = data.get("audio_file", "").strip()
                 text_path = audio_path.replace(".wav", ".txt") if audio_path.endswith(".wav") else ""
-                await send_to_clients(json.dumps(data))
+                file_id = os.path.splitext(os.path.basename(audio_path))[0] if audio_path else None
+
+                # Correlate the response with its prompt, including the hops recorded by the Piper handler
+                trace_id = tracing.attach_response(file_id, data.get("trace_id"))
+                for hop in data.pop("hops", []):
+                    tracing.record(trace_id, hop.get("hop", "piper"), hop.get("timestamp"), source="piper")
+                tracing.record(trace_id, "notification_written", written_at)
+                tracing.record(trace_id, "notification_read")
+                data["trace_id"] = trace_id
+
+                if TTS_POSTPROCESS and audio_path:
+                    try:
+                        report = await asyncio.to_thread(postprocess_tts, os.path.join("output", os.path.basename(audio_path)))
+                        # Recorded here rather than in the worker thread, as metrics are only updated from the event loop
+                        metrics.stages["tts_postprocess"].observe(report["processing_ms"] / 1000)
+                        metrics.count_tts(report["original_ms"] / 1000, report["trimmed_ms"] / 1000)
+                        tracing.record(trace_id, "tts_postprocessed", **report)
+                    except Exception as e:
+                        logger.warning(f"Unable to post-process {audio_path}: {e}")
+
+                if LIPSYNC_ENABLED and audio_path:
+                    try:
+                        data["mouth_envelope"] = await asyncio.to_thread(compute_mouth_envelope, os.path.join("output", os.path.basename(audio_path)))
+                        tracing.record(trace_id, "lipsync_computed")
+                    except Exception as e:
+                        logger.warning(f"Unable to compute the lip sync envelope of {audio_path}: {e}")
+
+                expected_clients = state.backend.client_ips()
+                await state.backend.publish("broadcast", data)
                 os.remove(notification_file)
+                metrics.stages["notification"].observe(max(0.0, time.time() - written_at))
+                tracing.record(trace_id, "broadcast_sent", clients=state.backend.client_count())
 
                 if not SAVE_CHAT_HISTORY:
-                    file_id = os.path.splitext(os.path.basename(audio_path))[0] if audio_path else None
-                    pending_deletions[file_id] = {
-                        "audio": audio_path,
-                        "text": text_path,
-                        "acknowledged_clients": set()
-                    }
+                    await chatHistory.delete_responses(pending_deletions.add(file_id, [audio_path, text_path], expected_clients))
             except json.JSONDecodeError:
                 logger.error("Error decoding JSON from notification file")
             except Exception as e:
@@ -196,29 +627,125 @@ async def monitor_notifications():
 
         await asyncio.sleep(1)
 
-# Send output to frontend
-async def send_to_clients(message: str):
+def postprocess_tts(wav_path: str) -> dict:
     """
-    Sends message to all connected WebSocket clients.
-    Simultaneously updates the list of active WebSocket clients.
+    Normalises the loudness of a TTS response and trims its leading and trailing silence, rewriting its '.wav' file
+    before clients are notified, so that every client and the chat history get the processed audio.
+    The response's viseme timeline, if the Piper handler published one, is shifted to match the trimmed audio.
+    Runs in a worker thread, so the caller records the report in the metrics.
 
     Args:
-        message (str): JSON message to be sent.
+        wav_path (str): Path of the response's '.wav' file.
+
+    Returns:
+        dict: The processing report ('input_lufs', 'gain_db', 'trimmed_ms', 'trimmed_start_ms', 'original_ms' and 'processing_ms').
     """
-    disconnected_clients = set()
-    
-    for client_tuple in connected_clients:
-        websocket, ip = client_tuple
+    from routes import audio as audio_utils
+
+    started = time.perf_counter()
+    with wave.open(wav_path, "rb") as wav_file:
+        params = wav_file.getparams()
+        frames = wav_file.readframes(params.nframes)
+    processed, report = audio_utils.normalize_loudness(frames, params.framerate, params.sampwidth, params.nchannels)
+
+    if report["input_lufs"] is not None:
+        temp_path = wav_path + ".tmp"
+        with wave.open(temp_path, "wb") as wav_file:
+            wav_file.setparams(params)
+            wav_file.writeframes(processed)
+        os.replace(temp_path, wav_path)
+
+        visemes_path = wav_path.replace(".wav", ".visemes.json")
+        if report["trimmed_start_ms"] and os.path.exists(visemes_path):
+            offset = report["trimmed_start_ms"] / 1000
+            with open(visemes_path, "r", encoding="utf-8") as f:
+                timeline = json.load(f)
+            timeline["phonemes"] = [
+                {**phoneme, "start": round(max(0.0, phoneme["start"] - offset), 3), "end": round(phoneme["end"] - offset, 3)}
+                for phoneme in timeline.get("phonemes", []) if phoneme["end"] > offset
+            ]
+            timeline["duration"] = round((report["original_ms"] - report["trimmed_ms"]) / 1000, 3)
+            with open(visemes_path, "w", encoding="utf-8") as f:
+                json.dump(timeline, f, separators=(",", ":"))
+
+    elapsed = time.perf_counter() - started
+    report["processing_ms"] = round(elapsed * 1000, 1)
+    logger.debug(
+        f"Post-processed {os.path.basename(wav_path)}: {report['input_lufs']} LUFS, {report['gain_db']:+.1f} dB, "
+        f"{report['trimmed_ms']:.0f} ms of silence trimmed, in {report['processing_ms']:.1f} ms"
+    )
+    return report
+
+def compute_mouth_envelope(wav_path: str) -> dict:
+    """
+    Computes the lip sync envelope of a TTS response, sent along with its notification
+    so that clients can animate the model's mouth without analysing the audio themselves.
+
+    Args:
+        wav_path (str): Path of the response's '.wav' file.
+
+    Returns:
+        dict: The envelope's frame rate ('fps') and mouth openness of each frame ('values', 0-255).
+    """
+    from routes import audio as audio_utils
+
+    with wave.open(wav_path, "rb") as wav_file:
+        rate, width, channels = wav_file.getframerate(), wav_file.getsampwidth(), wav_file.getnchannels()
+        frames = wav_file.readframes(wav_file.getnframes())
+    fps = audio_utils.LIPSYNC_CONFIG.get("fps", 30)
+    return {"fps": fps, "values": audio_utils.mouth_envelope(frames, rate, width, channels, fps=fps)}
 
+# Delete private mode responses that were never acknowledged by every client
+async def sweep_pending_deletions():
+    """
+    Periodically deletes the files of pending deletions whose TTL has expired,
+    so that responses are not kept forever when a client never acknowledges them.
+    """
+    while True:
+        await asyncio.sleep(DELETION_SWEEP_INTERVAL)
         try:
-            await websocket.send_text(message)
-        except (WebSocketDisconnect, ConnectionResetError):
-            disconnected_clients.add(client_tuple)
+            expired = pending_deletions.expired()
+            if expired:
+                logger.info(f"Deleting {len(expired)} expired unacknowledged responses")
+                await chatHistory.delete_responses(expired)
         except Exception as e:
-            logger.error(f"Error sending WebSocket message: {e}")
-            disconnected_clients.add(client_tuple)
+            logger.error(f"Error sweeping pending deletions: {e}")
 
-    connected_clients.difference_update(disconnected_clients)
+# Package Live2D models, and pick up models extracted into 'live2d_models' while the app is running
+async def watch_live2d_models():
+    """
+    Packages every Live2D model in model_dict.json on startup, then periodically rescans 'live2d_models'
+    and adds new models to model_dict.json (packaging them too). Models whose files were edited are repackaged
+    under new content-hashed URLs. Unchanged models are skipped, so each scan only costs a few stat calls;
+    /api/get_models serves the updated list as soon as model_dict.json or a bundle changes.
+    With several workers, only the one holding the 'live2d_models' claim writes model_dict.json and the bundles;
+    the others serve the bundles it recorded in the bundle index.
+    """
+    interval = MODEL_WATCH_INTERVAL or 10
+    while True:
+        leader = False
+        try:
+            leader = await state.backend.claim("live2d_models", interval * 3)
+            added = await asyncio.to_thread(generate_model_dict, LIVE2D_DIR) if MODEL_WATCH_INTERVAL and leader else []
+            for model in added:
+                logger.info(f"Added Live2D model {model['name']} to model_dict.json")
+
+            if MODEL_BUNDLE:
+                previous = set(models.bundle_files)
+                if leader:
+                    file_paths = [m["file_path"] for m in settings.load_model_dict(settings.model_dict_file)]
+                    await asyncio.to_thread(models.build_bundles, file_paths, models.BUNDLE_DIR, MODEL_TEXTURE_VARIANTS)
+                else:
+                    await asyncio.to_thread(models.load_index, models.BUNDLE_DIR)
+                if set(models.bundle_files) != previous:
+                    settings.models_response.invalidate()  # Include the new bundle URLs
+        except Exception as e:
+            logger.error(f"Error scanning Live2D models: {e}")
+
+        # Without watching, stop once the models are packaged (or, on other workers, their bundles found)
+        if not MODEL_WATCH_INTERVAL and (leader or not MODEL_BUNDLE or models.bundle_files):
+            return
+        await asyncio.sleep(interval)
 
 # Suppress asyncio ConnectionResetError
 def suppress_asyncio_error():
@@ -244,10 +771,65 @@ def suppress_asyncio_error():
     except Exception as e:
         print("Error: Failed to patch asyncio ConnectionResetError due to", e)
 
+# Server runtime options (event loop, HTTP parser, workers, connection limits)
+def server_options(server_config: dict, websocket_config: dict = None) -> dict:
+    """
+    Builds the uvicorn options configured under 'backend.server' and 'backend.websocket' in settings.yaml.
+    'auto' uses uvloop and httptools when they are installed (and otherwise the stock asyncio loop and h11).
+    Explicitly requesting one that is not installed falls back to the stock implementation with a warning,
+    rather than failing to start.
+
+    WebSocket keep-alive uses protocol-level ping frames, answered by browsers automatically: a connection
+    whose pong does not arrive within the timeout is closed, which evicts the client from 'connected_clients'.
+
+    Args:
+        server_config (dict): The 'backend.server' settings.
+        websocket_config (dict): The 'backend.websocket' settings.
+
+    Returns:
+        dict: Keyword arguments for 'uvicorn.run'.
+    """
+    implementations = {"loop": ("uvloop", "asyncio"), "http": ("httptools", "h11")}
+    options = {}
+    for option, (fast, stock) in implementations.items():
+        choice = str(server_config.get(option, "auto")).lower()
+        if choice == fast and importlib.util.find_spec(fast) is None:
+            logger.warning(f"backend.server.{option} is '{fast}' but it is not installed (pip install {fast}), using '{stock}'")
+            choice = stock
+        elif choice not in ("auto", fast, stock):
+            logger.warning(f"Invalid backend.server.{option} '{choice}', using 'auto'")
+            choice = "auto"
+        options[option] = choice
+
+    options["workers"] = max(1, int(server_config.get("workers", 1)))
+    options["timeout_keep_alive"] = int(server_config.get("keep_alive", 5))
+    options["backlog"] = int(server_config.get("backlog", 2048))
+
+    websocket_config = websocket_config or {}
+    options["ws_ping_interval"] = float(websocket_config.get("ping_interval", 20)) or None  # 0 disables pings
+    options["ws_ping_timeout"] = float(websocket_config.get("ping_timeout", 20)) or None
+    options["ws_per_message_deflate"] = bool(websocket_config.get("compression", True))
+    return options
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="vCHAOS backend")
+    parser.add_argument("--profile-startup", action="store_true", help="Report import/initialization time per module and the time to first request, then exit.")
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        from startup_profile import profile_startup
+        profile_startup()
+        raise SystemExit
+
+    import uvicorn
+    options = server_options(SERVER_CONFIG, WEBSOCKET_CONFIG)
+    if options["workers"] > 1 and STATE_CONFIG.get("backend", "memory") != "broker":
+        logger.warning("Running several workers without backend.state.backend 'broker': clients connected to one worker are unknown to the others")
+    target = "app:app" if options["workers"] > 1 else app  # Workers import the app themselves
+
     if PROTOCOL == "https":
         logger.info(f"Starting app on {PROTOCOL}://{HOST}:{PORT}")
-        uvicorn.run(app, host=HOST, port=PORT, log_level=LOG_LEVEL.lower(), ssl_keyfile="key.pem", ssl_certfile="cert.pem")
+        uvicorn.run(target, host=HOST, port=PORT, log_level=LOG_LEVEL.lower(), ssl_keyfile="key.pem", ssl_certfile="cert.pem", **options)
     else:
         logger.info(f"Starting app on {PROTOCOL}://{HOST}:{PORT}")
-        uvicorn.run(app, host=HOST, port=PORT, log_level=LOG_LEVEL.lower())
\ No newline at end of file
+        uvicorn.run(target, host=HOST, port=PORT, log_level=LOG_LEVEL.lower(), **options)
\ No newline at end of file
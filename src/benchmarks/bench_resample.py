@@ -0,0 +1,80 @@
+# benchmarks/bench_resample.py
+"""
+Benchmarks the conversion of voice prompts to Whisper's native 16 kHz mono 16-bit format.
+
+Usage (from the 'src' directory):
+    python benchmarks/bench_resample.py
+    python benchmarks/bench_resample.py --corpus path/to/wavs --whisper-host 127.0.0.1 --whisper-port 10300
+
+The first form times the conversion of synthetic long clips at common browser recording formats.
+With '--corpus', every .wav file in the directory is transcribed by a running Whisper server both as
+recorded and after conversion, and any transcript that differs is reported.
+"""
+import os
+import sys
+import time
+import wave
+import asyncio
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from routes.audio import to_whisper_format
+
+FORMATS = [(44100, 1), (44100, 2), (48000, 1), (48000, 2)]
+DURATIONS = [60, 300, 600]
+
+def synthetic_clip(seconds: int, rate: int, channels: int) -> bytes:
+    """Generates speech-like noise (band-limited, amplitude-modulated) as 16-bit PCM."""
+    rng = np.random.default_rng(0)
+    n = seconds * rate
+    noise = np.convolve(rng.standard_normal(n), np.ones(8) / 8, mode="same")
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * np.arange(n) / rate)
+    pcm = (np.clip(noise * envelope * 0.3, -1, 1) * 32767).astype("<i2")
+    return np.repeat(pcm, channels).tobytes()
+
+def bench_conversion():
+    print(f"{'format':>14} {'clip':>6} {'input':>10} {'output':>10} {'ratio':>6} {'time':>9} {'speed':>10}")
+    for seconds in DURATIONS:
+        for rate, channels in FORMATS:
+            frames = synthetic_clip(seconds, rate, channels)
+            started = time.perf_counter()
+            converted, _, _, _ = to_whisper_format(frames, rate, 2, channels)
+            elapsed = time.perf_counter() - started
+            print(
+                f"{rate:>8} Hz x{channels} {seconds:>5}s {len(frames) / 1e6:>8.1f}MB {len(converted) / 1e6:>8.1f}MB "
+                f"{len(frames) / len(converted):>5.1f}x {elapsed * 1000:>7.0f}ms {seconds / elapsed:>8.0f}x RT"
+            )
+
+async def check_corpus(corpus: str, host: str, port: int) -> int:
+    import app
+    from routes import upstreams
+    app.stt_pool.endpoints = upstreams.parse_tcp_endpoints([], host, port)  # Instead of the endpoints in settings.yaml
+
+    changed = 0
+    for name in sorted(os.listdir(corpus)):
+        if not name.endswith(".wav"):
+            continue
+        with wave.open(os.path.join(corpus, name), "rb") as wf:
+            frames = wf.readframes(wf.getnframes())
+            rate, width, channels = wf.getframerate(), wf.getsampwidth(), wf.getnchannels()
+
+        original = await app.transcribe(frames, rate, width, channels)
+        converted = await app.transcribe(*to_whisper_format(frames, rate, width, channels))
+        status = "same" if original.strip() == converted.strip() else "CHANGED"
+        changed += status != "same"
+        print(f"[{status}] {name}: {original!r}" + ("" if status == "same" else f" -> {converted!r}"))
+
+    print(f"{changed} transcript(s) changed")
+    return changed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Directory of .wav recordings to compare transcripts for")
+    parser.add_argument("--whisper-host", default="127.0.0.1")
+    parser.add_argument("--whisper-port", type=int, default=10300)
+    args = parser.parse_args()
+
+    if args.corpus:
+        sys.exit(1 if asyncio.run(check_corpus(args.corpus, args.whisper_host, args.whisper_port)) else 0)
+    bench_conversion()
@@ -0,0 +1,132 @@
+# benchmarks/bench_server.py
+"""
+Benchmarks the backend's server runtimes (event loop and HTTP parser, see 'backend.server' in settings.yaml).
+
+Usage (from the 'src' directory):
+    python benchmarks/bench_server.py [--connections 32] [--duration 5] [--workers 1]
+
+Each runtime in RUNTIMES is started in a fresh backend process (unavailable ones are skipped). Then:
+    - API path: keep-alive HTTP clients request '/api/client_count' and '/api/get_settings' (revalidated with
+      its ETag) back to back for '--duration' seconds.
+    - WebSocket path: clients repeatedly open '/ws', wait for the connection to be accepted and close it.
+Requests per second and p50/p99 latencies are reported for both paths.
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+import importlib.util
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from startup_profile import APP_DIR
+
+RUNTIMES = [("asyncio", "h11"), ("asyncio", "httptools"), ("uvloop", "h11"), ("uvloop", "httptools")]
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_backend(loop: str, http: str, workers: int, port: int, websocket: dict = None) -> subprocess.Popen:
+    """Starts the backend with the given runtime (and 'backend.websocket' settings) and waits until it accepts connections."""
+    script = (
+        "import logging, uvicorn, app; logging.disable(logging.CRITICAL); "
+        "app.MODEL_WATCH_INTERVAL, app.MODEL_BUNDLE = 0, False; "  # Keep model packaging out of the measurements
+        f"options = app.server_options({{'loop': '{loop}', 'http': '{http}', 'workers': {workers}}}, {websocket or {}!r}); "
+        f"uvicorn.run('app:app' if {workers} > 1 else app.app, host='127.0.0.1', port={port}, log_level='critical', **options)"
+    )
+    process = subprocess.Popen([sys.executable, "-c", script], cwd=APP_DIR)
+    deadline = time.perf_counter() + 30
+    while time.perf_counter() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            time.sleep(0.2 * workers)  # Let every worker finish starting
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.terminate()
+    raise TimeoutError("Backend did not start")
+
+async def http_client(port: int, requests: list, address: str, until: float, latencies: list):
+    """Sends requests over one keep-alive connection until 'until', recording each latency."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, local_addr=(address, 0))
+    try:
+        i = 0
+        while time.perf_counter() < until:
+            started = time.perf_counter()
+            writer.write(requests[i % len(requests)])
+            i += 1
+            headers = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in headers.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            if length:
+                await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+    finally:
+        writer.close()
+
+async def ws_client(port: int, address: str, until: float, latencies: list):
+    """Repeatedly opens and closes a '/ws' connection until 'until', recording each handshake latency."""
+    from websockets.asyncio.client import connect
+    while time.perf_counter() < until:
+        started = time.perf_counter()
+        async with connect(f"ws://127.0.0.1:{port}/ws", compression=None, local_addr=(address, 0)):
+            latencies.append(time.perf_counter() - started)
+
+def client_address(i: int) -> str:
+    """Returns a distinct loopback address per client, as the backend identifies clients by IP (Linux routes all of 127/8)."""
+    return f"127.0.{i // 250}.{i % 250 + 2}"
+
+async def run_load(client, connections: int, duration: float, *args) -> list:
+    latencies = []
+    until = time.perf_counter() + duration
+    await asyncio.gather(*(client(*args, client_address(i), until, latencies) for i in range(connections)))
+    return latencies
+
+def etag_for(port: int) -> str:
+    import urllib.request
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/get_settings") as response:
+        return response.headers["ETag"]
+
+def summarize(latencies: list, duration: float) -> str:
+    latencies = sorted(latencies)
+    if not latencies:
+        return f"{'-':>9} {'-':>8} {'-':>8}"
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    return f"{len(latencies) / duration:>9.0f} {p50:>7.2f}ms {p99:>7.2f}ms"
+
+def bench(connections: int, duration: float, workers: int):
+    print(f"{'loop':>8} {'http':>10} | {'API req/s':>9} {'p50':>9} {'p99':>9} | {'WS conn/s':>9} {'p50':>9} {'p99':>9}")
+    for loop, http in RUNTIMES:
+        if any(name in (loop, http) and importlib.util.find_spec(name) is None for name in ("uvloop", "httptools")):
+            print(f"{loop:>8} {http:>10} | not installed")
+            continue
+
+        port = free_port()
+        process = start_backend(loop, http, workers, port)
+        try:
+            etag = etag_for(port)
+            requests = [
+                b"GET /api/client_count HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n",
+                f"GET /api/get_settings HTTP/1.1\r\nHost: 127.0.0.1\r\nIf-None-Match: {etag}\r\n\r\n".encode()
+            ]
+            api = asyncio.run(run_load(http_client, connections, duration, port, requests))
+            ws = asyncio.run(run_load(ws_client, connections, duration, port))
+        finally:
+            process.terminate()
+            process.wait()
+        print(f"{loop:>8} {http:>10} | {summarize(api, duration)} | {summarize(ws, duration)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=32, help="Concurrent client connections")
+    parser.add_argument("--duration", type=float, default=5, help="Seconds each path is loaded for")
+    parser.add_argument("--workers", type=int, default=1, help="Backend worker processes")
+    args = parser.parse_args()
+    bench(args.connections, args.duration, args.workers)
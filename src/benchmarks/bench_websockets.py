@@ -0,0 +1,127 @@
+# benchmarks/bench_websockets.py
+"""
+Measures the backend's CPU and memory cost per idle '/ws' connection, with and without permessage-deflate.
+
+Usage (from the 'src' directory):
+    python benchmarks/bench_websockets.py [--clients 1000] [--idle 10] [--ping-interval 2] [--ping-timeout 2]
+
+For each configuration, a fresh backend is started with the given keep-alive settings (see 'backend.websocket'
+in settings.yaml) and '--clients' clients connect from distinct loopback addresses, then stay idle (answering
+pings) for '--idle' seconds. The backend's resident memory and CPU time are read from /proc (Linux only).
+A client that completes the handshake but never answers pings is also connected, to check it gets evicted.
+"""
+import os
+import sys
+import time
+import zlib
+import json
+import socket
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_server import free_port, start_backend, client_address
+
+CONFIGS = [("no compression", False), ("permessage-deflate", True)]
+SAMPLE_NOTIFICATION = {
+    "type": "new_audio", "audio_file": "output/1745000000000000000.wav", "text_file": "output/1745000000000000000.txt",
+    "text": "Good evening! The living room lights are now off and the thermostat is set to 20 degrees. " * 3,
+    "trace_id": "5f0c2a8e-3f7b-4c1d-9a55-0d7e9b1c2f44"
+}
+
+def process_stats(pid: int) -> tuple:
+    """Returns the resident memory (bytes) and CPU time (seconds) of a process."""
+    with open(f"/proc/{pid}/status") as f:
+        rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:"))
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    return rss, cpu
+
+def unresponsive_client(port: int) -> socket.socket:
+    """Opens '/ws' with a raw handshake; the socket is never read again, so pings go unanswered."""
+    sock = socket.create_connection(("127.0.0.1", port), source_address=("127.0.1.254", 0))
+    sock.sendall(
+        f"GET /ws HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+        "Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\nSec-WebSocket-Version: 13\r\n\r\n".encode()
+    )
+    return sock
+
+def evicted(sock: socket.socket) -> bool:
+    """Returns whether the server closed the connection (reading everything it sent until EOF)."""
+    sock.settimeout(0.5)
+    try:
+        while sock.recv(65536):
+            pass
+        return True
+    except (socket.timeout, BlockingIOError):
+        return False
+    except OSError:
+        return True
+
+async def hold_clients(port: int, clients: int, compression: bool, idle: float, pid: int) -> dict:
+    from websockets.asyncio.client import connect
+
+    async with connect(f"ws://127.0.0.1:{port}/ws", compression="deflate" if compression else None, local_addr=("127.0.1.253", 0)):
+        pass  # Warm up the WebSocket stack
+    await asyncio.sleep(0.5)
+
+    rss_before, _ = process_stats(pid)
+    connections = []
+    for batch in range(0, clients, 100):
+        connections += await asyncio.gather(*(
+            connect(f"ws://127.0.0.1:{port}/ws", compression="deflate" if compression else None, local_addr=(client_address(i), 0))
+            for i in range(batch, min(clients, batch + 100))
+        ))
+    negotiated = connections[0].response.headers.get("Sec-WebSocket-Extensions", "")
+    await asyncio.sleep(1)
+
+    rss_connected, cpu_start = process_stats(pid)
+    await asyncio.sleep(idle)
+    _, cpu_end = process_stats(pid)
+
+    open_connections = sum(1 for c in connections if c.state.name == "OPEN")
+    await asyncio.gather(*(c.close() for c in connections))
+    return {
+        "rss_per_client": (rss_connected - rss_before) / clients,
+        "cpu_per_client": (cpu_end - cpu_start) / idle / clients,
+        "open": open_connections,
+        "negotiated": negotiated
+    }
+
+def bench(clients: int, idle: float, ping_interval: float, ping_timeout: float):
+    payload = json.dumps(SAMPLE_NOTIFICATION).encode()
+    compressor = zlib.compressobj(wbits=-15)
+    compressed = compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    print(f"> Sample notification: {len(payload)} bytes, {len(compressed) - 4} bytes with permessage-deflate")
+
+    for name, compression in CONFIGS:
+        port = free_port()
+        websocket = {"ping_interval": ping_interval, "ping_timeout": ping_timeout, "compression": compression}
+        process = start_backend("auto", "auto", 1, port, websocket)
+        try:
+            dead = unresponsive_client(port)
+            result = asyncio.run(hold_clients(port, clients, compression, idle, process.pid))
+            deadline = time.perf_counter() + ping_interval + ping_timeout + 2
+            was_evicted = False
+            while not was_evicted and time.perf_counter() < deadline:
+                was_evicted = evicted(dead)
+            dead.close()
+        finally:
+            process.terminate()
+            process.wait()
+
+        print(
+            f"> {name:>20}: {result['rss_per_client'] / 1024:6.1f} KiB and {result['cpu_per_client'] * 1e6:6.1f} us CPU/s "
+            f"per idle client ({result['open']}/{clients} still open after {idle:.0f} s; "
+            f"negotiated '{result['negotiated'] or 'none'}'); unresponsive client evicted: {'yes' if was_evicted else 'NO'}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=1000, help="Number of simulated idle clients")
+    parser.add_argument("--idle", type=float, default=10, help="Seconds the clients stay idle while CPU time is measured")
+    parser.add_argument("--ping-interval", type=float, default=2, help="backend.websocket.ping_interval")
+    parser.add_argument("--ping-timeout", type=float, default=2, help="backend.websocket.ping_timeout")
+    args = parser.parse_args()
+    bench(args.clients, args.idle, args.ping_interval, args.ping_timeout)
@@ -1,55 +1,199 @@
 import os
 import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 LIVE2D_DIR = './live2d_models'
+MODEL_DICT_FILE = "model_dict.json"
+MANIFEST_FILE = "model_manifest.json"
+MODEL_SUFFIXES = (".model.json", ".model3.json")
 
-def generate_model_dict(base_dir):
+def read_json(file_path, default):
+    """
+    Reads a JSON file, returning 'default' if it is missing, invalid or of a different type.
+    """
+    if not os.path.exists(file_path):
+        return default
+    try:
+        with open(file_path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+    except json.JSONDecodeError:
+        print(f"> {file_path} is empty or invalid. Initializing a new one.")
+        return default
+    return data if isinstance(data, type(default)) else default
+
+def write_json(file_path, data):
+    """
+    Writes JSON to a temporary file and atomically swaps it in, so readers never see a partial file.
+    """
+    temp_path = f"{file_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file, ensure_ascii=False, indent=4)
+    os.replace(temp_path, file_path)
+
+def scan_model_dir(model_dir):
+    """
+    Walks a single model directory (e.g. ./live2d_models/haru).
+
+    Returns:
+        dict: The directory's manifest entry; its stamp (latest mtime of its subdirectories and model files, in ns),
+        its subdirectories and the paths of the model files it contains.
+    """
+    stamp = 0
+    subdirs = []
+    model_files = []
+    for root, dirs, files in os.walk(model_dir):
+        subdirs.append(root)
+        stamp = max(stamp, os.stat(root).st_mtime_ns)
+        for file in sorted(files):
+            if file.endswith(MODEL_SUFFIXES):
+                file_path = os.path.join(root, file)
+                stamp = max(stamp, os.stat(file_path).st_mtime_ns)
+                model_files.append(file_path.replace(os.sep, '/'))
+    return {"stamp": stamp, "dirs": subdirs, "files": model_files}
+
+def check_model_dir(model_dir, previous=None):
+    """
+    Returns the manifest entry of a model directory, only walking it again if it changed.
+    Adding, removing or renaming a file updates the mtime of its parent directory, so statting the
+    recorded directories and model files is enough to tell, without listing textures or motions.
+    """
+    if previous:
+        try:
+            if all(os.stat(path).st_mtime_ns <= previous["stamp"] for path in previous["dirs"] + previous["files"]):
+                return previous
+        except (OSError, KeyError, TypeError):
+            pass
+    return scan_model_dir(model_dir)
+
+def pick_motion(groups, preferred):
+    """
+    Chooses the motion group to use for idle or tap motions.
+    Prefers a group named exactly 'preferred' (case-insensitively), then one starting with it
+    (e.g. 'Tap@Body'), then the unnamed group '' used by many models, then the first group.
+
+    Returns:
+        tuple: The group name (case-sensitive, as in the model file) and its number of motions.
+    """
+    names = list(groups)
+    if not names:
+        return preferred, 1
+
+    name = next((n for n in names if n.casefold() == preferred), None)
+    if name is None:
+        name = next((n for n in names if n.casefold().startswith(preferred)), None)
+    if name is None:
+        name = "" if "" in groups else names[0]
+    motions = groups[name]
+    return name, max(1, len(motions) if isinstance(motions, list) else 1)
+
+def parse_model(file_path):
+    """
+    Builds the model_dict.json entry of a Live2D model file, reading its real motion groups.
+    Cubism 3+ (*.model3.json) list motions under 'FileReferences.Motions', Cubism 2 (*.model.json) under 'motions'.
+    """
+    root, file = os.path.split(file_path)
+    model_name = os.path.basename(root)
+
+    if file.endswith(".model3.json"):
+        file_prefix = file.split('.')[0]
+
+        if model_name != file_prefix:
+            model_name = file_prefix
+
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            model = json.load(f)
+        if file.endswith(".model3.json"):
+            groups = model.get("FileReferences", {}).get("Motions", {})
+        else:
+            groups = model.get("motions", {})
+        if not isinstance(groups, dict):
+            groups = {}
+    except (OSError, json.JSONDecodeError, AttributeError) as e:
+        print(f"> Could not read motions from {file_path} ({e}), using defaults.")
+        groups = {}
+
+    idle_motion, idle_motion_count = pick_motion(groups, "idle")
+    tap_motion, tap_motion_count = pick_motion(groups, "tap")
+
+    return {
+        "name": model_name,
+        "file_path": file_path,
+        "kScale": 0.2,
+        "xOffset": 0,
+        "yOffset": 0,
+        "idleMotion": idle_motion,
+        "idleMotionCount": idle_motion_count,
+        "tapMotion": tap_motion,
+        "tapMotionCount": tap_motion_count
+    }
+
+def generate_model_dict(base_dir, model_dict_file=MODEL_DICT_FILE, manifest_file=MANIFEST_FILE, workers=None):
     """
     Generate/Update model_dict.json according to the latest Live2D models available in ./live2d_models.
+    Model directories whose stamp matches the manifest are skipped; the others are rescanned, and the
+    model files of new models are parsed in parallel. Existing entries (including any manually tuned
+    scale, offsets and motions) are kept as they are.
     NOTE: idleMotion and tapMotion names are case-sensitive (has to be exactly same as the values in *.model3.json)!
+
+    Args:
+        base_dir (str): Directory containing one subdirectory per Live2D model.
+        model_dict_file (str): Path of the model dictionary to update.
+        manifest_file (str): Path of the manifest recording each model directory's stamp and model files.
+        workers (int): Maximum number of threads used to scan and parse models (defaults to the executor's default).
+
+    Returns:
+        list: The newly added model entries.
     """
-    model_dict = []
+    model_dict = read_json(model_dict_file, [])
+    manifest = read_json(manifest_file, {})
+    known_paths = {model.get("file_path") for model in model_dict if isinstance(model, dict)}
 
-    if os.path.exists("model_dict.json"):
-        try:
-            with open("model_dict.json", "r", encoding="utf-8") as file:
-                model_dict = json.load(file)
-        except json.JSONDecodeError:
-            print("> model_dict.json is empty or invalid. Initializing a new list.")
+    model_dirs = sorted(
+        os.path.join(base_dir, entry.name) for entry in os.scandir(base_dir) if entry.is_dir()
+    ) if os.path.isdir(base_dir) else []
 
-    for root, dirs, files in os.walk(base_dir):
-        if root == base_dir:
-            continue
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        previous = [manifest.get(model_dir) for model_dir in model_dirs]
+        new_manifest = dict(zip(model_dirs, executor.map(check_model_dir, model_dirs, previous)))
 
-        for file in files:
-            if file.endswith(".model.json") or file.endswith(".model3.json"):
-                model_name = os.path.basename(root)
+        # Dictionary keys dedupe (in order) in O(1) per file, unlike scanning model_dict for each one
+        new_files = dict.fromkeys(
+            path for entry in new_manifest.values() for path in entry["files"] if path not in known_paths
+        )
+        added = list(executor.map(parse_model, new_files))
 
-                if file.endswith(".model3.json"):
-                    file_prefix = file.split('.')[0]
-                    
-                    if model_name != file_prefix:
-                        model_name = file_prefix
+    if added:
+        model_dict.extend(added)
+        write_json(model_dict_file, model_dict)
+    if added or new_manifest != manifest:
+        write_json(manifest_file, new_manifest)
+    return added
 
-                file_path = os.path.join(root, file)
-                file_path = file_path.replace(os.sep, '/')
-
-                if not any(model['file_path'] == file_path for model in model_dict):
-                    model_dict.append({
-                        "name": model_name,
-                        "file_path": file_path,
-                        "kScale": 0.2,
-                        "xOffset": 0,
-                        "yOffset": 0,
-                        "idleMotion": "idle",
-                        "idleMotionCount": 1,
-                        "tapMotion": "tap",
-                        "tapMotionCount": 1
-                    })
-
-    with open("model_dict.json", "w", encoding="utf-8") as file:
-        json.dump(model_dict, file, ensure_ascii=False, indent=4)
+def watch_model_dict(base_dir, interval=5.0):
+    """
+    Keeps model_dict.json up to date by rescanning 'base_dir' every 'interval' seconds.
+    The backend serves model_dict.json fresh whenever it changes, so new models show up without a restart.
+    """
+    print(f"> Watching {base_dir} for new Live2D models (Ctrl+C to stop).")
+    try:
+        while True:
+            for model in generate_model_dict(base_dir):
+                print(f"> Added {model['name']} to model_dict.json.")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
 
 if __name__ == "__main__":
-    generate_model_dict(LIVE2D_DIR)
-    print("> model_dict.json has been updated.")
+    parser = argparse.ArgumentParser(description="Generate/Update model_dict.json from the Live2D models in ./live2d_models.")
+    parser.add_argument("--watch", action="store_true", help="Keep running and add new models as they appear.")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between scans in watch mode. // Default: 5")
+    args = parser.parse_args()
+
+    if args.watch:
+        watch_model_dict(LIVE2D_DIR, args.interval)
+    else:
+        generate_model_dict(LIVE2D_DIR)
+        print("> model_dict.json has been updated.")
@@ -4,10 +4,13 @@ import json
 import logging
 import math
 import os
+import time
 import wave
 import shutil
 import http.client
 import ssl
+import re
+from array import array
 from typing import Any, Dict, Optional
 
 from wyoming.audio import AudioChunk, AudioStart, AudioStop
@@ -22,6 +25,90 @@ _LOGGER = logging.getLogger(__name__)
 _cached_settings = None
 _last_mtime = None
 
+# Mouth shapes (visemes) of the letters and letter groups of the synthesized text, matched longest first.
+# Piper only returns the path of the synthesized wav, so phonemes are approximated from the spelling
+# and timed against the voiced parts of the audio.
+VISEMES = ("rest", "A", "E", "I", "O", "U", "MBP", "FV", "TH", "L", "S")
+GRAPHEME_VISEMES = {
+    "ee": "I", "ea": "I", "ie": "I", "ai": "E", "ay": "E", "ei": "E", "oo": "U", "ou": "O", "ow": "O",
+    "oa": "O", "oi": "O", "oy": "O", "au": "O", "aw": "O", "th": "TH", "sh": "S", "ch": "S", "ph": "FV",
+    "wh": "U", "ng": "S", "ck": "S",
+    "a": "A", "e": "E", "i": "I", "y": "I", "o": "O", "u": "U", "w": "U", "q": "U",
+    "m": "MBP", "b": "MBP", "p": "MBP", "f": "FV", "v": "FV", "l": "L", "t": "L", "d": "L", "n": "L",
+    "s": "S", "z": "S", "c": "S", "x": "S", "j": "S", "g": "S", "k": "S", "h": "S", "r": "S"
+}
+VISEME_FRAME_MS = 10       # Length of each analysed audio frame
+VISEME_SILENCE_DB = -45.0  # Frames quieter than this (in dBFS) are pauses
+VISEME_MIN_PAUSE_MS = 150  # Shorter silences (e.g. stop consonants) are kept within speech
+
+def text_to_phonemes(text: str) -> list:
+    """Splits text into (grapheme, viseme) pairs; digits count as one syllable each, and silent final 'e's are dropped."""
+    phonemes = []
+    for word in re.findall(r"[a-z]+|\d", text.lower()):
+        if word.isdigit():
+            phonemes.append((word, "E"))
+            continue
+        if len(word) > 2 and word.endswith("e") and word[-2] not in "aeiouy":
+            word = word[:-1]
+        i = 0
+        while i < len(word):
+            grapheme = word[i:i + 2] if word[i:i + 2] in GRAPHEME_VISEMES else word[i]
+            phonemes.append((grapheme, GRAPHEME_VISEMES.get(grapheme, "S")))
+            i += len(grapheme)
+    return phonemes
+
+def speech_segments(audio_bytes: bytes, rate: int, width: int, channels: int) -> list:
+    """Returns the (start, end) times in seconds of the voiced parts of 16-bit PCM audio."""
+    if width != 2 or not rate:
+        return []
+    samples = array("h", audio_bytes[:len(audio_bytes) - len(audio_bytes) % 2])
+    frame_len = max(1, rate * VISEME_FRAME_MS // 1000) * channels
+    threshold = (32768 * 10 ** (VISEME_SILENCE_DB / 20)) ** 2 * frame_len
+
+    segments = []
+    for index, start in enumerate(range(0, len(samples), frame_len)):
+        frame = samples[start:start + frame_len]
+        if sum(map(int.__mul__, frame, frame)) > threshold:
+            t = index * VISEME_FRAME_MS / 1000
+            if segments and t - segments[-1][1] < VISEME_MIN_PAUSE_MS / 1000:
+                segments[-1][1] = t + VISEME_FRAME_MS / 1000
+            else:
+                segments.append([t, t + VISEME_FRAME_MS / 1000])
+    return [tuple(segment) for segment in segments]
+
+def viseme_timeline(text: str, audio_bytes: bytes, rate: int, width: int, channels: int) -> Optional[dict]:
+    """
+    Times the phonemes of an utterance against its audio, spreading them evenly over the voiced parts;
+    the pauses in between are 'rest'. Returns None when the audio format is not supported or has no speech.
+    """
+    phonemes = text_to_phonemes(text)
+    segments = speech_segments(audio_bytes, rate, width, channels)
+    if not phonemes or not segments:
+        return None
+
+    speech_time = sum(end - start for start, end in segments)
+    step = speech_time / len(phonemes)
+
+    def to_audio_time(t: float) -> tuple:
+        # Maps a position within the concatenated voiced parts onto the audio, and the voiced part it falls in
+        elapsed = 0.0
+        for index, (start, end) in enumerate(segments):
+            if t < elapsed + (end - start):
+                return start + t - elapsed, index
+            elapsed += end - start
+        return segments[-1][1], len(segments) - 1
+
+    timeline = []
+    for i, (grapheme, viseme) in enumerate(phonemes):
+        (start, index), (end, _) = to_audio_time(i * step), to_audio_time((i + 1) * step - 1e-9)
+        end = min(end, segments[index][1])  # Phonemes do not straddle pauses
+        if timeline and round(start, 3) > timeline[-1]["end"]:
+            timeline.append({"start": timeline[-1]["end"], "end": round(start, 3), "phoneme": "", "viseme": "rest"})
+        timeline.append({"start": round(start, 3), "end": round(end, 3), "phoneme": grapheme, "viseme": viseme})
+
+    duration = len(audio_bytes) // (width * channels) / rate
+    return {"version": 1, "duration": round(duration, 3), "visemes": list(VISEMES), "phonemes": timeline}
+
 def load_backend_app_settings(filepath="/settings.yaml"):
     global _cached_settings, _last_mtime
 
@@ -117,6 +204,7 @@ class PiperEventHandler(AsyncEventHandler):
 
         synthesize = Synthesize.from_event(event)
         _LOGGER.debug(synthesize)
+        hops = [{"hop": "synthesize_received", "timestamp": time.time()}]
 
         raw_text = synthesize.text
         text = " ".join(raw_text.strip().splitlines())
@@ -151,6 +239,7 @@ class PiperEventHandler(AsyncEventHandler):
 
             output_path = (await piper_proc.proc.stdout.readline()).decode().strip()
             _LOGGER.debug(output_path)
+            hops.append({"hop": "synthesize_completed", "timestamp": time.time()})
 
         client_count = 0
         backend_settings = load_backend_app_settings()
@@ -197,8 +286,11 @@ class PiperEventHandler(AsyncEventHandler):
                 shutil.move(output_path, destination_path)
                 _LOGGER.info(f"Moved .wav file to {destination_path}")
 
+            visemes_path = self.write_visemes(text, destination_path)
+
             # Notify FastAPI backend
-            self.notify_backend(destination_path)
+            hops.append({"hop": "output_published", "timestamp": time.time()})
+            self.notify_backend(destination_path, hops, visemes_path)
 
             # Generate an empty placeholder `.wav` file
             if not multicast:
@@ -233,10 +325,39 @@ class PiperEventHandler(AsyncEventHandler):
         os.unlink(output_path)
         return True
 
-    def notify_backend(self, audio_path: str):
-        """Writes a notification file to signal the FastAPI backend."""
+    def write_visemes(self, text: str, audio_path: str) -> Optional[str]:
+        """Writes the viseme timeline of a published utterance next to its .txt, returning its path (None if not written)."""
+        started = time.perf_counter()
+        visemes_path = audio_path.replace(".wav", ".visemes.json")
+        try:
+            with wave.open(audio_path, "rb") as wav_file:
+                timeline = viseme_timeline(
+                    text, wav_file.readframes(wav_file.getnframes()),
+                    wav_file.getframerate(), wav_file.getsampwidth(), wav_file.getnchannels()
+                )
+            if timeline is None:
+                return None
+            with open(visemes_path, "w", encoding="utf-8") as f:
+                json.dump(timeline, f, separators=(",", ":"))
+        except Exception as e:
+            _LOGGER.warning(f"Failed to write viseme timeline: {e}")
+            return None
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        _LOGGER.info(
+            f"Saved viseme timeline to {visemes_path} ({len(timeline['phonemes'])} phonemes "
+            f"for {timeline['duration']:.1f} s of audio in {elapsed_ms:.1f} ms)"
+        )
+        return visemes_path
+
+    def notify_backend(self, audio_path: str, hops: Optional[list] = None, visemes_path: Optional[str] = None):
+        """Writes a notification file to signal the FastAPI backend, along with the trace hops recorded here."""
         notification_file = "/output/new_audio.json"
         message = {"type": "new_audio", "audio_file": f"/output/{os.path.basename(audio_path)}"}
+        if visemes_path:
+            message["visemes_file"] = f"/output/{os.path.basename(visemes_path)}"
+        if hops:
+            message["hops"] = hops
         
         try:
             with open(notification_file, "w", encoding="utf-8") as f:
@@ -0,0 +1,204 @@
+# routes/admission.py
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from routes.settings import get_config
+from routes.globals import connected_clients
+from routes import events, state
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+config = get_config()
+ADMISSION_CONFIG = config.get("backend", {}).get("admission", {})
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a stage is saturated and its waiting queue is full.
+
+    Args:
+        stage (str): Name of the saturated pipeline stage.
+        retry_after (int): Suggested number of seconds before the client retries.
+    """
+    def __init__(self, stage: str, retry_after: int):
+        super().__init__(f"The {stage.upper()} pipeline is busy, please retry in {retry_after} seconds")
+        self.stage = stage
+        self.retry_after = retry_after
+
+class AdmissionStage:
+    """
+    Bounded admission queue for a single pipeline stage (e.g. LLM or STT).
+    At most 'concurrency' requests run at once, at most 'max_queue' requests wait in FIFO order,
+    and anything beyond that is rejected immediately with a retry-after estimate.
+    With several workers, each admitted request also takes one of the stage's 'concurrency' slots
+    shared through the state backend, so the limit applies across all workers; the queue is per worker.
+
+    Args:
+        name (str): Name of the stage, broadcast to clients in 'queue_status' messages.
+        concurrency (int): Number of requests allowed to run simultaneously.
+        max_queue (int): Number of requests allowed to wait for a free slot.
+        retry_after (int): Minimum retry-after (in seconds) returned to rejected requests.
+    """
+    def __init__(self, name: str, concurrency: int = 1, max_queue: int = 8, retry_after: int = 5):
+        self.name = name
+        self.concurrency = max(1, int(concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.min_retry_after = max(1, int(retry_after))
+        self.active = 0
+        self.waiters = deque()  # (future, client_ip) in arrival order
+        self.avg_duration = float(self.min_retry_after)
+
+    @property
+    def waiting(self) -> int:
+        return len(self.waiters)
+
+    def retry_after(self) -> int:
+        """
+        Estimates how long a rejected client should wait, based on the average service time.
+
+        Returns:
+            int: Number of seconds until a slot is likely to become available.
+        """
+        estimate = self.avg_duration * (self.waiting + 1) / self.concurrency
+        return max(self.min_retry_after, math.ceil(estimate))
+
+    def positions(self) -> dict:
+        """
+        Returns the 1-based queue position of each waiting client IP (first occurrence only).
+        """
+        positions = {}
+        for index, (_, client_ip) in enumerate(self.waiters, start=1):
+            positions.setdefault(client_ip, index)
+        return positions
+
+    def status(self) -> dict:
+        return {
+            "stage": self.name,
+            "active": self.active,
+            "waiting": self.waiting,
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue
+        }
+
+    @asynccontextmanager
+    async def admit(self, client_ip: str = None):
+        """
+        Waits for a free slot in this stage, releasing it (and waking the next waiter) on exit.
+
+        Args:
+            client_ip (str): IP of the requesting client, used to report its queue position.
+
+        Raises:
+            AdmissionRejected: If every slot is busy and the waiting queue is full.
+        """
+        if self.active < self.concurrency and not self.waiters:
+            self.active += 1
+        else:
+            if self.waiting >= self.max_queue:
+                raise AdmissionRejected(self.name, self.retry_after())
+
+            future = asyncio.get_running_loop().create_future()
+            entry = (future, client_ip)
+            self.waiters.append(entry)
+            await broadcast_queue_status(self)
+
+            try:
+                await future
+            except asyncio.CancelledError:
+                if entry in self.waiters:
+                    self.waiters.remove(entry)
+                elif future.done() and not future.cancelled():
+                    self._release()  # Slot was handed over just before cancellation
+                await broadcast_queue_status(self)
+                raise
+
+        started = time.monotonic()
+        slot = None
+        try:
+            slot = await state.backend.acquire(f"admission:{self.name}", self.concurrency)
+            started = time.monotonic()
+            yield
+        finally:
+            await state.backend.release(f"admission:{self.name}", slot)
+            self.avg_duration = 0.8 * self.avg_duration + 0.2 * (time.monotonic() - started)
+            had_waiters = bool(self.waiters)
+            self._release()
+            if had_waiters:
+                await broadcast_queue_status(self)
+
+    def _release(self):
+        """Hands the freed slot directly to the next live waiter, or returns it to the pool."""
+        while self.waiters:
+            future, _ = self.waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+def _stage_from_config(name: str) -> AdmissionStage:
+    return AdmissionStage(
+        name,
+        concurrency=ADMISSION_CONFIG.get(f"{name}_concurrency", 1),
+        max_queue=ADMISSION_CONFIG.get("max_queue", 8),
+        retry_after=ADMISSION_CONFIG.get("retry_after", 5)
+    )
+
+stages = {
+    "llm": _stage_from_config("llm"),
+    "stt": _stage_from_config("stt")
+}
+
+async def broadcast_queue_status(stage: AdmissionStage):
+    """
+    Sends the queue depth of a stage to every WebSocket client (through every worker),
+    together with that client's own position in the queue (None if not queued).
+
+    Args:
+        stage (AdmissionStage): The stage whose status changed.
+    """
+    await state.backend.publish("queue_status", {"status": stage.status(), "positions": stage.positions()})
+
+async def send_queue_status(payload: dict):
+    """Sends a stage's queue status published by any worker to the WebSocket clients of this worker."""
+    status, positions = payload["status"], payload["positions"]
+
+    for websocket, client_ip in list(connected_clients):
+        if websocket is None:
+            continue
+        try:
+            await events.send(websocket, {"type": "queue_status", **status, "position": positions.get(client_ip)})
+        except Exception as e:
+            logger.debug(f"Unable to send queue status to {client_ip}: {e}")
+
+def rejection_response(e: AdmissionRejected) -> JSONResponse:
+    """
+    Builds the 429 response returned to requests rejected by admission control.
+
+    Args:
+        e (AdmissionRejected): The rejection raised by 'AdmissionStage.admit'.
+
+    Returns:
+        JSONResponse: Error message with a 'Retry-After' header.
+    """
+    return JSONResponse(
+        {"success": False, "error": str(e), "retry_after": e.retry_after},
+        status_code=429,
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+state.subscribe("queue_status", send_queue_status)
+
+@router.get("/api/queue_status")
+async def get_queue_status():
+    """
+    Retrieve the current load of every admission-controlled pipeline stage.
+
+    Returns:
+        JSONResponse: Active and waiting request counts per stage.
+    """
+    return JSONResponse({name: stage.status() for name, stage in stages.items()})
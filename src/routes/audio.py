@@ -0,0 +1,374 @@
+# routes/audio.py
+import numpy as np
+from routes.settings import get_config
+
+config = get_config()
+VAD_CONFIG = config.get("backend", {}).get("vad", {})
+LIPSYNC_CONFIG = config.get("backend", {}).get("lipsync", {})
+TTS_CONFIG = config.get("backend", {}).get("tts", {})
+
+# Sample formats for the supported PCM widths (8-bit wav audio is unsigned, wider widths are signed)
+SAMPLE_FORMATS = {1: (np.uint8, 128.0, 128.0), 2: (np.int16, 0.0, 32768.0), 4: (np.int32, 0.0, 2147483648.0)}
+
+def pcm_to_float(frames: bytes, width: int, channels: int) -> np.ndarray:
+    """
+    Decodes raw little-endian PCM into float samples in the range [-1, 1).
+
+    Args:
+        frames (bytes): Raw PCM audio.
+        width (int): Sample width in bytes (1, 2 or 4).
+        channels (int): Number of interleaved channels.
+
+    Returns:
+        np.ndarray: Array of shape (samples, channels) with dtype float32.
+    """
+    dtype, offset, scale = SAMPLE_FORMATS[width]
+    usable = len(frames) - len(frames) % (width * channels)
+    samples = np.frombuffer(frames[:usable], dtype=np.dtype(dtype).newbyteorder("<"))
+    return ((samples.astype(np.float32) - offset) / scale).reshape(-1, channels)
+
+def frame_energy_db(samples: np.ndarray, frame_len: int) -> np.ndarray:
+    """
+    Computes the RMS energy (in dBFS) of consecutive analysis frames, downmixing channels first.
+
+    Args:
+        samples (np.ndarray): Float samples of shape (samples, channels).
+        frame_len (int): Number of samples per analysis frame; a trailing partial frame is zero-padded.
+
+    Returns:
+        np.ndarray: Energy of each frame in dBFS.
+    """
+    mono = samples.mean(axis=1)
+    pad = -len(mono) % frame_len
+    if pad:
+        mono = np.concatenate([mono, np.zeros(pad, dtype=mono.dtype)])
+    frames = mono.reshape(-1, frame_len)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+def is_speech(frames: bytes, rate: int, width: int, channels: int, threshold_db: float = None, frame_ms: int = None) -> bool:
+    """
+    Checks whether any analysis frame of a short PCM chunk is louder than the silence threshold.
+    Unset arguments fall back to 'backend.vad' in settings.yaml.
+
+    Args:
+        frames (bytes): Raw PCM audio.
+        rate (int): Sample rate in Hz.
+        width (int): Sample width in bytes.
+        channels (int): Number of interleaved channels.
+        threshold_db (float): Energy (in dBFS) below which a frame is considered silent.
+        frame_ms (int): Length of each analysis frame in milliseconds.
+
+    Returns:
+        bool: True if speech (or any sound above the threshold) is present, or if the format is unsupported.
+    """
+    threshold_db = VAD_CONFIG.get("threshold_db", -45) if threshold_db is None else threshold_db
+    frame_ms = VAD_CONFIG.get("frame_ms", 20) if frame_ms is None else frame_ms
+    if width not in SAMPLE_FORMATS or not rate:
+        return True
+    if len(frames) < width * channels:
+        return False
+
+    frame_len = max(1, rate * frame_ms // 1000)
+    return bool((frame_energy_db(pcm_to_float(frames, width, channels), frame_len) > threshold_db).any())
+
+def _runs(mask: np.ndarray):
+    """Returns the start and end (exclusive) indices of each run of True values in a boolean array."""
+    edges = np.diff(np.concatenate(([0], mask.view(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+def trim_silence(frames: bytes, rate: int, width: int, channels: int,
+                 threshold_db: float = None, frame_ms: int = None, padding_ms: int = None, max_pause_ms: int = None):
+    """
+    Removes leading and trailing silence from PCM audio, and optionally shortens long internal pauses.
+    Frames quieter than 'threshold_db' are treated as silence; 'padding_ms' of audio is kept around
+    speech so that word onsets and tails are not clipped. Unset arguments fall back to 'backend.vad' in settings.yaml.
+
+    Args:
+        frames (bytes): Raw PCM audio.
+        rate (int): Sample rate in Hz.
+        width (int): Sample width in bytes.
+        channels (int): Number of interleaved channels.
+        threshold_db (float): Energy (in dBFS) below which a frame is considered silent.
+        frame_ms (int): Length of each analysis frame in milliseconds.
+        padding_ms (int): Audio kept before and after speech in milliseconds.
+        max_pause_ms (int): Internal pauses longer than this are shortened to this length (0 disables).
+
+    Returns:
+        tuple: The trimmed PCM audio, and a dict with 'trimmed_bytes', 'trimmed_ms' and 'original_ms'.
+    """
+    threshold_db = VAD_CONFIG.get("threshold_db", -45) if threshold_db is None else threshold_db
+    frame_ms = VAD_CONFIG.get("frame_ms", 20) if frame_ms is None else frame_ms
+    padding_ms = VAD_CONFIG.get("padding_ms", 200) if padding_ms is None else padding_ms
+    max_pause_ms = VAD_CONFIG.get("max_pause_ms", 1000) if max_pause_ms is None else max_pause_ms
+
+    bytes_per_sample = width * channels
+    original_ms = len(frames) // bytes_per_sample * 1000 / rate if rate else 0.0
+    report = {"trimmed_bytes": 0, "trimmed_ms": 0.0, "original_ms": round(original_ms, 1)}
+    if width not in SAMPLE_FORMATS or not frames or not rate:
+        return frames, report
+
+    frame_len = max(1, rate * frame_ms // 1000)
+    speech = frame_energy_db(pcm_to_float(frames, width, channels), frame_len) > threshold_db
+    if not speech.any():
+        return frames, report  # Nothing above the threshold; leave it to Whisper rather than dropping the prompt
+
+    # Dilate speech frames by the padding, so that quiet onsets and tails are kept
+    pad_frames = int(np.ceil(padding_ms / frame_ms))
+    if pad_frames:
+        speech = np.convolve(speech, np.ones(2 * pad_frames + 1), mode="same") > 0
+
+    keep = np.zeros_like(speech)
+    starts, ends = _runs(speech)
+    keep[starts[0]:ends[-1]] = True
+
+    # Shorten internal pauses, keeping half of 'max_pause_ms' on each side of the gap
+    if max_pause_ms:
+        max_pause_frames = max(1, max_pause_ms // frame_ms)
+        gap_starts, gap_ends = ends[:-1], starts[1:]
+        long_gaps = (gap_ends - gap_starts) > max_pause_frames
+        half = max_pause_frames // 2
+        for gap_start, gap_end in zip(gap_starts[long_gaps] + half, gap_ends[long_gaps] - (max_pause_frames - half)):
+            keep[gap_start:gap_end] = False
+
+    # Expand the frame mask to byte ranges, clamped to the original length
+    frame_bytes = frame_len * bytes_per_sample
+    keep_starts, keep_ends = _runs(keep)
+    trimmed = b"".join(frames[s * frame_bytes:e * frame_bytes] for s, e in zip(keep_starts, keep_ends))
+
+    trimmed_bytes = len(frames) - len(trimmed)
+    report["trimmed_bytes"] = trimmed_bytes
+    report["trimmed_ms"] = round(trimmed_bytes // bytes_per_sample * 1000 / rate, 1)
+    return trimmed, report
+
+def _fir_lowpass(cutoff: float, taps: int) -> np.ndarray:
+    """
+    Designs a Blackman-windowed sinc low-pass filter.
+
+    Args:
+        cutoff (float): Cutoff frequency as a fraction of the sample rate (0 < cutoff < 0.5).
+        taps (int): Number of filter taps (odd, so that the filter delay is a whole sample).
+
+    Returns:
+        np.ndarray: Filter coefficients normalised to unity gain at DC.
+    """
+    n = np.arange(taps) - (taps - 1) / 2
+    h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.blackman(taps)
+    return h / h.sum()
+
+def resample(mono: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """
+    Resamples mono float audio. When downsampling, an anti-aliasing low-pass filter is applied
+    before interpolating, so content above the new Nyquist frequency does not fold back into speech.
+    Upsampling (e.g. from 8 kHz telephony audio) uses band-limited Fourier interpolation.
+
+    Args:
+        mono (np.ndarray): 1-D array of float samples.
+        src_rate (int): Sample rate of 'mono' in Hz.
+        dst_rate (int): Target sample rate in Hz.
+
+    Returns:
+        np.ndarray: The resampled float samples.
+    """
+    if src_rate == dst_rate or not len(mono):
+        return mono
+
+    out_len = int(len(mono) * dst_rate // src_rate)
+    if dst_rate > src_rate:
+        # Band-limited (Fourier) interpolation; the source has no content above the new Nyquist frequency
+        spectrum = np.fft.rfft(mono)
+        return np.fft.irfft(spectrum, out_len) * (out_len / len(mono))
+
+    ratio = src_rate / dst_rate
+    taps = 32 * int(np.ceil(ratio)) + 1
+    mono = np.convolve(mono, _fir_lowpass(0.45 / ratio, taps), mode="same")  # Odd taps, so 'same' cancels the filter delay
+    positions = np.arange(out_len) * (src_rate / dst_rate)
+    return np.interp(positions, np.arange(len(mono)), mono)
+
+def to_whisper_format(frames: bytes, rate: int, width: int, channels: int, target_rate: int = 16000):
+    """
+    Converts PCM audio to the 16 kHz mono 16-bit format Whisper works in,
+    so that less data crosses the socket and the STT server does not resample it again.
+
+    Args:
+        frames (bytes): Raw PCM audio.
+        rate (int): Sample rate in Hz.
+        width (int): Sample width in bytes.
+        channels (int): Number of interleaved channels.
+        target_rate (int): Output sample rate in Hz.
+
+    Returns:
+        tuple: The converted PCM audio, and its sample rate, width and channel count.
+    """
+    if (rate, width, channels) == (target_rate, 2, 1) or width not in SAMPLE_FORMATS:
+        return frames, rate, width, channels
+
+    mono = pcm_to_float(frames, width, channels).mean(axis=1)
+    converted = resample(mono, rate, target_rate)
+    pcm = np.clip(np.rint(converted * 32768.0), -32768, 32767).astype("<i2")
+    return pcm.tobytes(), target_rate, 2, 1
+
+def mouth_envelope(frames: bytes, rate: int, width: int, channels: int,
+                   fps: int = None, band_hz: tuple = None, threshold_db: float = None) -> list:
+    """
+    Computes how far the mouth should be open for each video frame of a TTS response, so that clients
+    can animate lip sync from it instead of analysing the audio themselves. Each frame combines its RMS
+    level with the energy in the speech band (the geometric mean of both, each normalised to the
+    response's 95th percentile), and frames quieter than the silence threshold are closed.
+    Unset arguments fall back to 'backend.lipsync' (and 'backend.vad' for the threshold) in settings.yaml.
+
+    Args:
+        frames (bytes): Raw PCM audio.
+        rate (int): Sample rate in Hz.
+        width (int): Sample width in bytes.
+        channels (int): Number of interleaved channels.
+        fps (int): Envelope values per second of audio.
+        band_hz (tuple): Lower and upper frequency (in Hz) of the speech band.
+        threshold_db (float): Energy (in dBFS) below which a frame is considered silent.
+
+    Returns:
+        list: Mouth openness of each frame, from 0 (closed) to 255 (fully open).
+    """
+    fps = LIPSYNC_CONFIG.get("fps", 30) if fps is None else fps
+    band_hz = (LIPSYNC_CONFIG.get("band_low_hz", 300), LIPSYNC_CONFIG.get("band_high_hz", 3000)) if band_hz is None else band_hz
+    threshold_db = VAD_CONFIG.get("threshold_db", -45) if threshold_db is None else threshold_db
+    if width not in SAMPLE_FORMATS or not rate or not fps or len(frames) < width * channels:
+        return []
+
+    mono = pcm_to_float(frames, width, channels).mean(axis=1)
+    frame_len = max(1, rate // fps)
+    pad = -len(mono) % frame_len
+    if pad:
+        mono = np.concatenate([mono, np.zeros(pad, dtype=mono.dtype)])
+    windows = mono.reshape(-1, frame_len)
+
+    rms = np.sqrt(np.mean(np.square(windows, dtype=np.float64), axis=1))
+    spectrum = np.abs(np.fft.rfft(windows * np.hanning(frame_len), axis=1)) ** 2
+    freqs = np.fft.rfftfreq(frame_len, 1 / rate)
+    band = np.sqrt(spectrum[:, (freqs >= band_hz[0]) & (freqs <= band_hz[1])].sum(axis=1))
+
+    voiced = 20 * np.log10(np.maximum(rms, 1e-10)) > threshold_db
+    if not voiced.any():
+        return [0] * len(windows)
+
+    def normalised(values):
+        reference = np.percentile(values[voiced], 95)
+        return np.clip(values / reference, 0, 1) if reference > 0 else np.zeros_like(values)
+
+    openness = np.sqrt(normalised(rms) * normalised(band)) * voiced
+    return np.rint(openness * 255).astype(np.uint8).tolist()
+
+def _biquad_gain(freqs: np.ndarray, rate: int, kind: str, fc: float, q: float, gain_db: float = 0.0) -> np.ndarray:
+    """Evaluates the magnitude response of an RBJ high-shelf or high-pass biquad at the given frequencies."""
+    w0 = 2 * np.pi * fc / rate
+    alpha = np.sin(w0) / (2 * q)
+    if kind == "high_shelf":
+        a = 10 ** (gain_db / 40)
+        b = (a * ((a + 1) + (a - 1) * np.cos(w0) + 2 * np.sqrt(a) * alpha), -2 * a * ((a - 1) + (a + 1) * np.cos(w0)),
+             a * ((a + 1) + (a - 1) * np.cos(w0) - 2 * np.sqrt(a) * alpha))
+        den = ((a + 1) - (a - 1) * np.cos(w0) + 2 * np.sqrt(a) * alpha, 2 * ((a - 1) - (a + 1) * np.cos(w0)),
+               (a + 1) - (a - 1) * np.cos(w0) - 2 * np.sqrt(a) * alpha)
+    else:
+        b = ((1 + np.cos(w0)) / 2, -(1 + np.cos(w0)), (1 + np.cos(w0)) / 2)
+        den = (1 + alpha, -2 * np.cos(w0), 1 - alpha)
+
+    # |c0 + c1 z^-1 + c2 z^-2|^2 on the unit circle, without complex arithmetic
+    cos_w, cos_2w = np.cos(2 * np.pi * freqs / rate), np.cos(4 * np.pi * freqs / rate)
+    power = lambda c: c[0] ** 2 + c[1] ** 2 + c[2] ** 2 + 2 * (c[0] * c[1] + c[1] * c[2]) * cos_w + 2 * c[0] * c[2] * cos_2w
+    return np.sqrt(np.maximum(power(b), 0) / power(den))
+
+def k_weighting(samples: np.ndarray, rate: int) -> np.ndarray:
+    """
+    Applies the ITU-R BS.1770 K-weighting filter (a high shelf boosting presence, and a high-pass
+    removing rumble), designed for the given sample rate. It is applied to all channels at once in the frequency domain,
+    with zero phase; only the energy of the result is used, which the filter's phase does not change.
+
+    Args:
+        samples (np.ndarray): Float samples of shape (samples, channels).
+        rate (int): Sample rate in Hz.
+
+    Returns:
+        np.ndarray: The K-weighted samples, with the same shape.
+    """
+    n = 1 << int(len(samples) + rate // 10 - 1).bit_length()  # Padded, so the filter's response does not wrap around
+    freqs = np.fft.rfftfreq(n, 1 / rate)
+    gain = _biquad_gain(freqs, rate, "high_shelf", 1500.0, 1 / np.sqrt(2), 4.0) * _biquad_gain(freqs, rate, "high_pass", 38.0, 0.5)
+    return np.fft.irfft(np.fft.rfft(samples, n, axis=0) * gain[:, None], n, axis=0)[:len(samples)]
+
+def normalize_loudness(frames: bytes, rate: int, width: int, channels: int, target_lufs: float = None, peak_db: float = None,
+                       max_gain_db: float = None, silence_db: float = None, padding_ms: int = None):
+    """
+    Normalises TTS audio to a target integrated loudness (ITU-R BS.1770, gated) and trims leading and trailing silence.
+    Both are derived from the same 10 ms frame energies of the K-weighted signal: 400 ms loudness blocks are sums of
+    40 frames, and frames quieter than 'silence_db' at either end are silence. The gain is limited so that peaks stay
+    below 'peak_db'. Unset arguments fall back to 'backend.tts' in settings.yaml.
+
+    Args:
+        frames (bytes): Raw PCM audio.
+        rate (int): Sample rate in Hz.
+        width (int): Sample width in bytes.
+        channels (int): Number of interleaved channels.
+        target_lufs (float): Target integrated loudness in LUFS.
+        peak_db (float): Maximum sample peak after normalisation, in dBFS.
+        max_gain_db (float): Maximum gain applied to quiet audio, in dB.
+        silence_db (float): Frame loudness below which leading and trailing audio is trimmed (in LUFS).
+        padding_ms (int): Audio kept before and after the trimmed silence in milliseconds.
+
+    Returns:
+        tuple: The processed PCM audio, and a dict with 'input_lufs', 'gain_db', 'trimmed_ms' (of which
+            'trimmed_start_ms' at the start) and 'original_ms'.
+    """
+    target_lufs = TTS_CONFIG.get("target_lufs", -16) if target_lufs is None else target_lufs
+    peak_db = TTS_CONFIG.get("peak_db", -1) if peak_db is None else peak_db
+    max_gain_db = TTS_CONFIG.get("max_gain_db", 20) if max_gain_db is None else max_gain_db
+    silence_db = TTS_CONFIG.get("silence_db", -60) if silence_db is None else silence_db
+    padding_ms = TTS_CONFIG.get("padding_ms", 100) if padding_ms is None else padding_ms
+
+    bytes_per_sample = width * channels
+    original_ms = len(frames) // bytes_per_sample * 1000 / rate if rate else 0.0
+    report = {"input_lufs": None, "gain_db": 0.0, "trimmed_ms": 0.0, "trimmed_start_ms": 0.0, "original_ms": round(original_ms, 1)}
+    if width not in SAMPLE_FORMATS or not rate or len(frames) < bytes_per_sample:
+        return frames, report
+
+    samples = pcm_to_float(frames, width, channels)
+    frame_len = max(1, rate // 100)
+    pad = -len(samples) % frame_len
+    weighted = k_weighting(samples, rate)
+    if pad:
+        weighted = np.concatenate([weighted, np.zeros((pad, channels))])
+    # Mean square of each 10 ms frame, summed over channels (BS.1770 weights front channels equally)
+    energy = np.square(weighted).reshape(-1, frame_len, channels).mean(axis=1).sum(axis=1)
+
+    # Gated integrated loudness over 400 ms blocks with 75% overlap
+    cumulative = np.concatenate(([0.0], np.cumsum(energy)))
+    block_frames, hop_frames = 40, 10
+    starts = np.arange(0, max(1, len(energy) - block_frames + 1), hop_frames)
+    blocks = (cumulative[np.minimum(starts + block_frames, len(energy))] - cumulative[starts]) / block_frames
+    loudness = -0.691 + 10 * np.log10(np.maximum(blocks, 1e-12))
+    gated = blocks[loudness > -70]
+    if len(gated):
+        gated = gated[loudness[loudness > -70] > -0.691 + 10 * np.log10(gated.mean()) - 10]
+    if not len(gated):
+        return frames, report  # Silent; nothing to normalise or trim
+    input_lufs = -0.691 + 10 * np.log10(gated.mean())
+
+    # Trim silent frames at either end, keeping some padding
+    audible = np.flatnonzero(-0.691 + 10 * np.log10(np.maximum(energy, 1e-12)) > silence_db)
+    pad_frames = padding_ms // 10
+    first = max(0, audible[0] - pad_frames) * frame_len if len(audible) else 0
+    last = min(len(samples), (audible[-1] + 1 + pad_frames) * frame_len) if len(audible) else len(samples)
+    samples = samples[first:last]
+
+    peak = np.abs(samples).max() if len(samples) else 0.0
+    gain_db = min(target_lufs - input_lufs, max_gain_db, peak_db - 20 * np.log10(max(peak, 1e-10)))
+    dtype, offset, scale = SAMPLE_FORMATS[width]
+    info = np.iinfo(dtype)
+    pcm = np.clip(np.rint(samples * (10 ** (gain_db / 20)) * scale + offset), info.min, info.max).astype(np.dtype(dtype).newbyteorder("<"))
+
+    report.update({
+        "input_lufs": round(float(input_lufs), 1),
+        "gain_db": round(float(gain_db), 1),
+        "trimmed_ms": round((len(frames) // bytes_per_sample - len(samples)) * 1000 / rate, 1),
+        "trimmed_start_ms": round(first * 1000 / rate, 1)
+    })
+    return pcm.tobytes(), report
@@ -4,9 +4,11 @@ import re
 import shutil
 from fastapi import APIRouter, Query, Depends, Body, HTTPException
 from fastapi.responses import JSONResponse
-from routes.utils import validate_connection, secure_delete
+from routes.utils import validate_connection, secure_delete_files
+from routes import metrics
 
 router = APIRouter()
+SIDECAR_SUFFIXES = (".visemes.json",)  # Files published by the Piper handler alongside a response's .txt
 
 @router.get("/api/get_history")
 async def get_chat_history(search: str = Query(default=None, description="Search query for filtering history"), _: None = Depends(validate_connection)):
@@ -21,6 +23,8 @@ async def get_chat_history(search: str = Query(default=None, description="Search
         JSONResponse: List of chat history entries, including relevant text and audio files.
         500 error for further exceptions.
     """
+    started = metrics.begin("history")
+    failed = False
     try:
         files = os.listdir("output")
         history = []
@@ -66,7 +70,10 @@ async def get_chat_history(search: str = Query(default=None, description="Search
         return JSONResponse(history)
 
     except Exception as e:
+        failed = True
         return JSONResponse({"error": str(e)}, status_code=500)
+    finally:
+        metrics.end("history", started, failed)
 
 @router.post("/api/archive_chat_history")
 async def archive_chat_history(body=Body(default=None), _: None = Depends(validate_connection)):
@@ -101,6 +108,7 @@ async def delete_chat_history(body=Body(default=None), _: None = Depends(validat
 async def process_chat_history(action: str, filenames: list[str] = None):
     """
     Handle the archiving or deletion of chat history files.
+    The sidecar files of a response (e.g. its viseme timeline) are processed along with its .txt file, but not counted.
 
     Args:
         action (str): Either "archive" or "delete" to determine the intended file operation.
@@ -122,6 +130,8 @@ async def process_chat_history(action: str, filenames: list[str] = None):
         if entry.is_file() and re.fullmatch(filename_pattern, entry.name)
     ]
 
+    to_delete = {}
+
     for name in files_to_process:
         if not is_valid_file(name):
             continue
@@ -131,11 +141,18 @@ async def process_chat_history(action: str, filenames: list[str] = None):
             continue
 
         path = os.path.join("output", name)
+        sidecars = [name[:-len(".txt")] + suffix for suffix in SIDECAR_SUFFIXES] if ext == "txt" else []
+        sidecars = [sidecar for sidecar in sidecars if os.path.isfile(os.path.join("output", sidecar))]
+        if action == "delete":
+            to_delete[path] = (name, ext)  # Deleted together below, off the event loop
+            to_delete.update({os.path.join("output", sidecar): (sidecar, "sidecar") for sidecar in sidecars})
+            continue
+
         try:
             if action == "archive":
                 shutil.move(path, os.path.join("archived", name))
-            elif action == "delete":
-                secure_delete(path)
+                for sidecar in sidecars:
+                    shutil.move(os.path.join("output", sidecar), os.path.join("archived", sidecar))
 
             if ext == "wav":
                 wav_count += 1
@@ -147,6 +164,20 @@ async def process_chat_history(action: str, filenames: list[str] = None):
                 "error": f"Failed to {action} {name}: {str(e)}"
             }
 
+    if to_delete:
+        errors = await secure_delete_files(list(to_delete))
+        for path, (name, ext) in to_delete.items():
+            if path not in errors:
+                wav_count += ext == "wav"
+                txt_count += ext == "txt"
+
+        if errors:
+            path, e = next(iter(errors.items()))
+            return {
+                "success": False,
+                "error": f"Failed to {action} {to_delete[path][0]}: {str(e)}"
+            }
+
     total = wav_count + txt_count
     return {
         "success": total > 0,
@@ -155,4 +186,15 @@ async def process_chat_history(action: str, filenames: list[str] = None):
             f"({wav_count} .wav, {txt_count} .txt)."
             if total else f"No valid chat history files to {action}."
         )
-    }
\ No newline at end of file
+    }
+
+async def delete_responses(due: list[tuple]):
+    """
+    Securely deletes the files of responses released by the pending deletion ledger (private mode).
+
+    Args:
+        due (list[tuple]): (file_id, files) pairs returned by 'DeletionLedger'.
+    """
+    filenames = [os.path.basename(name) for _, files in due for name in files if name]
+    if filenames:
+        await process_chat_history("delete", filenames)
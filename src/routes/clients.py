@@ -1,24 +1,75 @@
 # routes/clients.py
 import asyncio
-import os
 import logging
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Request, Depends
 from fastapi.responses import JSONResponse
-from routes.settings import load_settings
-from routes.chatHistory import process_chat_history
+from routes.settings import get_config
+from routes.chatHistory import delete_responses
 from routes.globals import connected_clients, pending_deletions
 from routes.utils import validate_connection
+from routes import tracing, state, events, upstreams
 
 router = APIRouter()
 
-config = load_settings()
-LOG_LEVEL = config.get("backend", {}).get("logging", {}).get("level", "ERROR").upper()
+config = get_config()
 SAVE_CHAT_HISTORY = bool(config.get("frontend", {}).get("save-chat-history", True))
+BATCH_WINDOW = config.get("backend", {}).get("websocket", {}).get("batch_window_ms", 10) / 1000
 
-# Initialize logging framework
-logging.basicConfig(level=LOG_LEVEL, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
 
+async def close_clients(client_ip: str, event: dict = None):
+    """
+    Closes this worker's WebSocket connections from a client, optionally sending it an event first.
+
+    Args:
+        client_ip (str): IP of the client.
+        event (dict): Event sent before closing (e.g. 'disconnect'), or None.
+
+    Returns:
+        int: Number of connections closed.
+    """
+    matching = {client for client in connected_clients if client[1] == client_ip}
+    for client in matching:
+        try:
+            if event:
+                await events.send(client[0], event, flush=True)
+            await client[0].close()
+        except Exception:
+            pass
+        connected_clients.discard(client)
+    return len(matching)
+
+async def handle_kick(payload: dict):
+    """Closes stale connections of a client that reconnected to another worker."""
+    if payload["origin"] != state.WORKER_ID:
+        await close_clients(payload["ip"])
+
+async def handle_ack(payload: dict):
+    """Records a playback acknowledgement; only the worker that broadcast the response holds its trace and pending deletion."""
+    file_id, client_ip = payload["file_id"], payload["ip"]
+    trace_id = tracing.trace_for_response(file_id)
+    if trace_id:
+        tracing.record(trace_id, "client_ack", client=client_ip)
+
+    if not SAVE_CHAT_HISTORY:
+        files_to_delete = pending_deletions.acknowledge(file_id, client_ip)
+        if files_to_delete:
+            await delete_responses([(file_id, files_to_delete)])
+
+async def handle_forget(payload: dict):
+    """Stops waiting for the acknowledgements of a client that no longer has any connection."""
+    if not SAVE_CHAT_HISTORY:
+        await delete_responses(pending_deletions.forget_client(payload["ip"]))
+
+async def handle_disconnect(payload: dict):
+    """Disconnects a client on behalf of '/api/disconnect_client' called on another worker."""
+    await close_clients(payload["ip"], {"type": "disconnect"})
+
+state.subscribe("kick", handle_kick)
+state.subscribe("ack", handle_ack)
+state.subscribe("forget", handle_forget)
+state.subscribe("disconnect", handle_disconnect)
+
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """
@@ -28,49 +79,49 @@ async def websocket_endpoint(websocket: WebSocket):
     Args:
         websocket (WebSocket): WebSocket connection instance.
 
+    Protocol:
+        - Clients offering the 'vchaos.v1.msgpack' or 'vchaos.v1.json' subprotocol exchange versioned, typed events
+          ({"v": 1, "events": [{"type": ...}, ...]}) as MessagePack binary or JSON text frames, with events
+          produced within 'backend.websocket.batch_window_ms' of each other batched into one frame.
+        - Other clients use the legacy text protocol: JSON messages, 'disconnect_client', and 'ack:<id>' from the client.
+
     Behavior:
-        - Initiates WebSocket connection.
-        - Tracks active clients and removes stale connections.
-        - Handles incoming messages and processes chat history deletions.
-        - Sends a keep-alive 'ping' message every 60 seconds.
-        - Cleans up disconnected clients upon connection loss.
+        - Initiates WebSocket connection, negotiating the protocol, and registers it with the shared state backend.
+        - Tells the client which upstream services (Whisper, the Ollama webhook) are currently unavailable.
+        - Tracks active clients and removes stale connections (also those held by other workers).
+        - Handles incoming messages, publishing playback acknowledgements to the worker that broadcast the response.
+        - Keep-alive pings and eviction of unresponsive clients are handled by the server at the protocol level
+          (see 'backend.websocket' in settings.yaml).
+        - Cleans up disconnected clients upon connection loss, releasing any deletions awaiting their acknowledgement.
     """
-    await websocket.accept()
+    subprotocol = events.negotiate(websocket.scope.get("subprotocols", []))
+    await websocket.accept(subprotocol=subprotocol)
     client_ip = websocket.client.host
 
-    stale_clients = {client for client in connected_clients if client[1] == client_ip}
-    for client in stale_clients:
-        try:
-            await client[0].close()
-        except Exception:
-            pass
-        connected_clients.discard(client)
-
+    await close_clients(client_ip)
+    session = None
+    if subprotocol:
+        session = events.sessions[websocket] = events.Session(websocket, client_ip, events.SUBPROTOCOLS[subprotocol], BATCH_WINDOW)
     connected_clients.add((websocket, client_ip))
-    logger.info(f"Client {client_ip} connected")
+    await state.backend.register(client_ip)
+    await state.backend.publish("kick", {"ip": client_ip, "origin": state.WORKER_ID})
+    logger.info(f"Client {client_ip} connected ({subprotocol or 'legacy protocol'})")
+    for pool in list(upstreams.pools.values()):
+        if pool.breaker.state != pool.breaker.CLOSED:
+            await events.send(websocket, pool.breaker.event())
 
     try:
         while True:
-            try:
-                message = await asyncio.wait_for(websocket.receive_text(), timeout=60)
-                logger.info(f"Received WebSocket message from {client_ip}: {message}")
-
-                if not SAVE_CHAT_HISTORY:
-                    if message.startswith("ack:"):
-                        file_id = message.split("ack:")[1].strip()
-                        logger.debug(f"Received acknowledgment for file ID: {file_id}")
-
-                        if file_id in pending_deletions:
-                            pending_deletions[file_id]["acknowledged_clients"].add(client_ip)
-                            logger.debug(f"Acknowledged clients: {pending_deletions[file_id]['acknowledged_clients']}")
-
-                            if len(pending_deletions[file_id]["acknowledged_clients"]) >= len(connected_clients):
-                                files_to_delete = {k: v for k, v in pending_deletions.pop(file_id, {}).items() if k != "acknowledged_clients"}
-                                filelist = [os.path.basename(v) for v in files_to_delete.values()]
-                                deletion_result = await process_chat_history("delete", filelist)
-
-            except asyncio.TimeoutError:
-                await websocket.send_text("ping") # Keep-alive ping
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            logger.info(f"Received WebSocket message from {client_ip}: {message.get('text') or message.get('bytes')}")
+
+            for event in events.decode(message, session.encoding if session else None):
+                if event["type"] == "ack":
+                    file_id = str(event["id"]).strip()
+                    logger.debug(f"Received acknowledgment for file ID: {file_id}")
+                    await state.backend.publish("ack", {"file_id": file_id, "ip": client_ip})
     except (WebSocketDisconnect, ConnectionResetError):
         logger.info(f"Client {client_ip} disconnected")
     except asyncio.CancelledError:
@@ -79,8 +130,16 @@ async def websocket_endpoint(websocket: WebSocket):
         logger.error(f"Unexpected WebSocket error for {client_ip}: {e}")
     finally:
         connected_clients.discard((websocket, client_ip))
+        if session:
+            session.close()
+            events.sessions.pop(websocket, None)
+        remaining = await state.backend.unregister(client_ip)
         logger.info(f"Cleaned up WebSocket connection for {client_ip}")
 
+        # Stop waiting for this client's acknowledgements, unless it is still connected on another socket
+        if not SAVE_CHAT_HISTORY and not remaining:
+            await state.backend.publish("forget", {"ip": client_ip})
+
 @router.get("/api/clients")
 async def get_connected_clients(_: None = Depends(validate_connection)):
     """
@@ -92,7 +151,7 @@ async def get_connected_clients(_: None = Depends(validate_connection)):
     Returns:
         JSONResponse: A JSON response containing client IP addresses.
     """
-    return JSONResponse({"clients": [{"ip": ip} for _, ip in connected_clients]})
+    return JSONResponse({"clients": [{"ip": ip} for ip in state.backend.client_ips()]})
 
 @router.get("/api/client_count")
 async def get_client_count():
@@ -102,12 +161,13 @@ async def get_client_count():
     Returns:
         JSONResponse: A JSON response containing the total number of connected clients.
     """
-    return JSONResponse({"count": len(connected_clients)})
+    return JSONResponse({"count": state.backend.client_count()})
 
 @router.post("/api/disconnect_client")
 async def disconnect_client(request: Request, _: None = Depends(validate_connection)):
     """
-    Remotely/manually disconnect a specific WebSocket client by sending a 'disconnect_client' message.
+    Remotely/manually disconnect a specific WebSocket client by sending a 'disconnect' event.
+    Clients connected to another worker are disconnected by that worker.
     Clients disconnected through this function must refresh the web page to reconnect to the WebSocket.
 
     Args:
@@ -125,11 +185,15 @@ async def disconnect_client(request: Request, _: None = Depends(validate_connect
 
         for client in connected_clients:
             if client[1] == client_ip:
-                await client[0].send_text("disconnect_client")
+                await events.send(client[0], {"type": "disconnect"}, flush=True)
                 await client[0].close()
                 connected_clients.remove(client)
                 return JSONResponse({"success": True, "message": f"Client {client_ip} disconnected."})
 
+        if state.backend.is_registered(client_ip):
+            await state.backend.publish("disconnect", {"ip": client_ip})
+            return JSONResponse({"success": True, "message": f"Client {client_ip} disconnected."})
+
         return JSONResponse({"success": False, "error": "Client not found."}, status_code=404)
 
     except Exception as e:
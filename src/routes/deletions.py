@@ -0,0 +1,105 @@
+# routes/deletions.py
+import time
+
+class DeletionLedger:
+    """
+    Tracks chat history files awaiting deletion in private mode ('save-chat-history: false').
+    Each response records the set of clients expected to acknowledge playback; it becomes due for
+    deletion once all of them have acknowledged or disconnected, or when its TTL expires.
+    The number of entries is capped, so memory and disk stay bounded even if acknowledgements never arrive.
+
+    Args:
+        ttl (float): Seconds after which an unacknowledged entry is deleted anyway.
+        max_entries (int): Maximum number of pending entries; the oldest is evicted (and deleted) beyond this.
+    """
+    def __init__(self, ttl: float = 300, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = {}  # file_id -> {"files", "expected", "acknowledged", "expires_at"}, oldest first
+
+    def __contains__(self, file_id) -> bool:
+        return file_id in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, file_id: str, files: list[str], expected_clients: set[str]) -> list[tuple]:
+        """
+        Registers a response whose files should be deleted once played back.
+
+        Args:
+            file_id (str): ID of the response (the base name of its .wav file).
+            files (list[str]): Filenames (within 'output') belonging to the response.
+            expected_clients (set[str]): IPs of the clients the response was broadcast to.
+
+        Returns:
+            list[tuple]: (file_id, files) pairs that are due for deletion immediately, either because
+            no client is expected to acknowledge this response or because older entries were evicted.
+        """
+        due = []
+        self.entries[file_id] = {
+            "files": list(files),
+            "expected": set(expected_clients),
+            "acknowledged": set(),
+            "expires_at": time.monotonic() + self.ttl
+        }
+
+        while len(self.entries) > self.max_entries:
+            oldest = next(iter(self.entries))
+            due.append((oldest, self.entries.pop(oldest)["files"]))
+
+        if not expected_clients:
+            due.append((file_id, self.entries.pop(file_id)["files"]))
+        return due
+
+    def acknowledge(self, file_id: str, client_ip: str) -> list[str]:
+        """
+        Records a client's playback acknowledgement. Acknowledgements from clients that were not
+        connected when the response was broadcast are ignored.
+
+        Args:
+            file_id (str): ID of the acknowledged response.
+            client_ip (str): IP of the acknowledging client.
+
+        Returns:
+            list[str]: The response's files if every expected client has now acknowledged, otherwise None.
+        """
+        entry = self.entries.get(file_id)
+        if entry is None or client_ip not in entry["expected"]:
+            return None
+
+        entry["acknowledged"].add(client_ip)
+        if entry["expected"] <= entry["acknowledged"]:
+            return self.entries.pop(file_id)["files"]
+        return None
+
+    def forget_client(self, client_ip: str) -> list[tuple]:
+        """
+        Stops waiting for a disconnected client's acknowledgements.
+
+        Args:
+            client_ip (str): IP of the disconnected client.
+
+        Returns:
+            list[tuple]: (file_id, files) pairs whose remaining expected clients have all acknowledged.
+        """
+        due = []
+        for file_id, entry in list(self.entries.items()):
+            entry["expected"].discard(client_ip)
+            if entry["expected"] <= entry["acknowledged"]:
+                due.append((file_id, self.entries.pop(file_id)["files"]))
+        return due
+
+    def expired(self, now: float = None) -> list[tuple]:
+        """
+        Removes and returns all entries whose TTL has passed.
+
+        Args:
+            now (float): Current time on the 'time.monotonic' clock; defaults to now.
+
+        Returns:
+            list[tuple]: (file_id, files) pairs that are due for deletion.
+        """
+        now = time.monotonic() if now is None else now
+        due = [file_id for file_id, entry in self.entries.items() if entry["expires_at"] <= now]
+        return [(file_id, self.entries.pop(file_id)["files"]) for file_id in due]
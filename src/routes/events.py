@@ -0,0 +1,173 @@
+# routes/events.py
+import json
+import asyncio
+import logging
+import importlib.util
+from routes.globals import connected_clients
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = 1
+# WebSocket subprotocols offered by clients, in the server's order of preference
+SUBPROTOCOLS = {f"vchaos.v{PROTOCOL_VERSION}.msgpack": "msgpack", f"vchaos.v{PROTOCOL_VERSION}.json": "json"}
+BATCH_WINDOW = 0.01
+# msgpack is imported when a client first uses it, keeping it off the startup path.
+# Without it, clients negotiate the JSON encoding of the protocol instead.
+MSGPACK_AVAILABLE = importlib.util.find_spec("msgpack") is not None
+
+# Event types and their required fields. Events received from clients with an unknown type or missing fields are dropped.
+EVENT_FIELDS = {
+    # Server -> client
+    "new_audio": ("audio_file",),
+    "queue_status": ("stage", "position"),
+    "upstream_status": ("upstream", "state"),
+    "disconnect": (),
+    # Client -> server
+    "ack": ("id",)
+}
+
+sessions = {}  # WebSocket -> Session, for clients that negotiated the event protocol
+
+def negotiate(offered: list) -> str:
+    """
+    Picks the subprotocol to accept from those offered by a connecting client.
+
+    Args:
+        offered (list): Subprotocols listed in the client's 'Sec-WebSocket-Protocol' header.
+
+    Returns:
+        str: The accepted subprotocol, or None for clients speaking the legacy text protocol.
+    """
+    for subprotocol, encoding in SUBPROTOCOLS.items():
+        if subprotocol in offered and (encoding != "msgpack" or MSGPACK_AVAILABLE):
+            return subprotocol
+    return None
+
+def encode(events: list, encoding: str):
+    """
+    Encodes events into a single frame: {"v": <version>, "events": [...]}.
+
+    Returns:
+        bytes | str: A binary MessagePack frame, or a JSON text frame.
+    """
+    frame = {"v": PROTOCOL_VERSION, "events": events}
+    if encoding == "msgpack":
+        import msgpack
+        return msgpack.packb(frame, use_bin_type=True)
+    return json.dumps(frame, separators=(",", ":"))
+
+def encode_legacy(event: dict) -> str:
+    """Encodes an event as the text message understood by clients that did not negotiate the event protocol."""
+    if event["type"] == "disconnect":
+        return "disconnect_client"
+    return json.dumps(event)
+
+def decode(message: dict, encoding: str) -> list:
+    """
+    Decodes a frame received from a client into its valid events.
+
+    Args:
+        message (dict): The ASGI 'websocket.receive' message, carrying 'text' or 'bytes'.
+        encoding (str): The client's negotiated encoding, or None for the legacy text protocol ('ack:<id>').
+
+    Returns:
+        list: The events, without unknown or malformed ones.
+    """
+    text, data = message.get("text"), message.get("bytes")
+    try:
+        if encoding is None:
+            return [{"type": "ack", "id": text.split("ack:", 1)[1].strip()}] if text and text.startswith("ack:") else []
+        if encoding == "msgpack" and data is not None:
+            import msgpack
+            frame = msgpack.unpackb(data, raw=False)
+        else:
+            frame = json.loads(text if text is not None else data)
+        events = frame["events"] if isinstance(frame, dict) and frame.get("v") == PROTOCOL_VERSION else []
+    except (ValueError, TypeError, KeyError) as e:
+        logger.warning(f"Dropping malformed WebSocket frame: {e}")
+        return []
+
+    return [
+        event for event in events
+        if isinstance(event, dict) and event.get("type") in EVENT_FIELDS
+        and all(field in event for field in EVENT_FIELDS[event["type"]])
+    ]
+
+class Session:
+    """
+    A client connection using the event protocol. Events sent within 'batch_window' seconds of each other
+    are batched into a single frame, so bursts of notifications and queue updates cost one frame each.
+
+    Args:
+        websocket (WebSocket): The client's WebSocket.
+        client_ip (str): The client's IP.
+        encoding (str): 'msgpack' or 'json'.
+        batch_window (float): Seconds to wait for further events before sending a frame.
+    """
+    def __init__(self, websocket, client_ip: str, encoding: str, batch_window: float = BATCH_WINDOW):
+        self.websocket = websocket
+        self.client_ip = client_ip
+        self.encoding = encoding
+        self.batch_window = batch_window
+        self.pending = []
+        self._flusher = None
+
+    def send(self, event: dict):
+        """Queues an event, sending it with any others queued within the batch window."""
+        self.pending.append(event)
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.batch_window)
+        self._flusher = None
+        await self.flush()
+
+    async def flush(self):
+        """Sends all queued events now. A client that cannot be sent to is dropped from 'connected_clients'."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        events, self.pending = self.pending, []
+        if not events:
+            return
+
+        frame = encode(events, self.encoding)
+        try:
+            if isinstance(frame, bytes):
+                await self.websocket.send_bytes(frame)
+            else:
+                await self.websocket.send_text(frame)
+        except Exception as e:
+            logger.debug(f"Unable to send events to {self.client_ip}: {e}")
+            connected_clients.discard((self.websocket, self.client_ip))
+            sessions.pop(self.websocket, None)
+
+    def close(self):
+        """Discards queued events once the connection is closed."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        self.pending.clear()
+
+async def send(websocket, event: dict, legacy_text: str = None, flush: bool = False):
+    """
+    Sends an event to a client in the protocol it negotiated.
+    Clients using the event protocol receive it batched with other events; others receive it as a text message at once.
+
+    Args:
+        websocket (WebSocket): The client's WebSocket.
+        event (dict): The event, with its 'type'.
+        legacy_text (str): The event's legacy text encoding, if already computed (e.g. once for a whole broadcast).
+        flush (bool): Whether to send the event (and any queued ones) immediately, e.g. before closing the connection.
+
+    Raises:
+        Exception: If sending a legacy text message fails.
+    """
+    session = sessions.get(websocket)
+    if session is not None:
+        session.send(event)
+        if flush:
+            await session.flush()
+    else:
+        await websocket.send_text(legacy_text if legacy_text is not None else encode_legacy(event))
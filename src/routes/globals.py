@@ -1,3 +1,7 @@
 # routes/globals.py
+from routes.deletions import DeletionLedger
+from routes.transcripts import TranscriptCache
+
 connected_clients = set()
-pending_deletions = {}  # Track files pending deletion
\ No newline at end of file
+pending_deletions = DeletionLedger()  # Track files pending deletion
+transcript_cache = TranscriptCache()  # Transcripts of recent voice prompts
@@ -0,0 +1,192 @@
+# routes/metrics.py
+import time
+from bisect import bisect_left
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from routes.globals import connected_clients, transcript_cache
+
+router = APIRouter()
+
+# Latency bucket upper bounds (in seconds), sized to cover sub-millisecond fan-outs up to the maximum pipeline timeout
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+class StageMetrics:
+    """
+    Latency histogram, in-flight gauge and error counter for a single pipeline stage.
+    All storage is preallocated, so recording an observation only increments existing slots.
+
+    Args:
+        name (str): Name of the stage, used as the 'stage' label.
+        description (str): Human-readable description, used as the metric help text.
+    """
+    __slots__ = ("name", "description", "bucket_counts", "total", "count", "in_flight", "errors")
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.bucket_counts = [0] * (len(BUCKETS) + 1)  # Last slot is the +Inf bucket
+        self.total = 0.0
+        self.count = 0
+        self.in_flight = 0
+        self.errors = 0
+
+    def observe(self, seconds: float):
+        self.bucket_counts[bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+stages = {
+    "webhook": StageMetrics("webhook", "Round trip of a text prompt to the LLM webhook"),
+    "whisper": StageMetrics("whisper", "Round trip of a voice prompt to the Whisper STT server"),
+    "notification": StageMetrics("notification", "Delay between a TTS notification being written and broadcast"),
+    "broadcast": StageMetrics("broadcast", "Fan-out of a message to all WebSocket clients"),
+    "history": StageMetrics("history", "Listing of chat history files"),
+    "tts_postprocess": StageMetrics("tts_postprocess", "Loudness normalisation and silence trimming of a TTS response"),
+}
+
+bundle_bytes = {}        # texture variant -> bytes of Live2D model bundles served
+bundle_bytes_saved = {}  # texture variant -> bytes saved compared to the original textures
+
+def count_bundle(variant: str, size: int, saved: int):
+    """
+    Counts a Live2D model bundle being served.
+
+    Args:
+        variant (str): Texture variant of the bundle.
+        size (int): Bytes served.
+        saved (int): Bytes saved compared to the bundle with the original textures.
+    """
+    bundle_bytes[variant] = bundle_bytes.get(variant, 0) + size
+    bundle_bytes_saved[variant] = bundle_bytes_saved.get(variant, 0) + saved
+
+def begin(stage: str) -> float:
+    """
+    Marks the start of a stage, incrementing its in-flight gauge.
+
+    Args:
+        stage (str): Name of the stage in 'stages'.
+
+    Returns:
+        float: Start timestamp, to be passed back to 'end'.
+    """
+    stages[stage].in_flight += 1
+    return time.perf_counter()
+
+def end(stage: str, started: float, failed: bool = False):
+    """
+    Marks the end of a stage, recording its latency and (optionally) an error.
+
+    Args:
+        stage (str): Name of the stage in 'stages'.
+        started (float): Start timestamp returned by 'begin'.
+        failed (bool): Whether the stage ended in an error.
+    """
+    metrics = stages[stage]
+    metrics.in_flight -= 1
+    metrics.observe(time.perf_counter() - started)
+    if failed:
+        metrics.errors += 1
+
+tts_audio_seconds = 0.0    # Seconds of TTS audio post-processed
+tts_trimmed_seconds = 0.0  # Seconds of silence trimmed from TTS audio, i.e. playback time saved
+
+def count_tts(audio_seconds: float, trimmed_seconds: float):
+    """
+    Counts a TTS response being post-processed.
+
+    Args:
+        audio_seconds (float): Duration of the response before processing.
+        trimmed_seconds (float): Duration of the silence trimmed from it.
+    """
+    global tts_audio_seconds, tts_trimmed_seconds
+    tts_audio_seconds += audio_seconds
+    tts_trimmed_seconds += trimmed_seconds
+
+def render() -> str:
+    """
+    Renders all metrics in the Prometheus text exposition format.
+
+    Returns:
+        str: The exposition body.
+    """
+    # Imported here to avoid a circular import (routes.utils -> routes.metrics -> routes.admission -> routes.utils)
+    from routes.admission import stages as admission_stages
+
+    lines = [
+        "# HELP vchaos_stage_duration_seconds Latency of each pipeline stage.",
+        "# TYPE vchaos_stage_duration_seconds histogram",
+    ]
+    for name, metrics in stages.items():
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS, metrics.bucket_counts):
+            cumulative += bucket_count
+            lines.append(f'vchaos_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'vchaos_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {metrics.count}')
+        lines.append(f'vchaos_stage_duration_seconds_sum{{stage="{name}"}} {metrics.total}')
+        lines.append(f'vchaos_stage_duration_seconds_count{{stage="{name}"}} {metrics.count}')
+
+    lines += ["# HELP vchaos_stage_in_flight Requests currently being processed by each pipeline stage.", "# TYPE vchaos_stage_in_flight gauge"]
+    lines += [f'vchaos_stage_in_flight{{stage="{name}"}} {metrics.in_flight}' for name, metrics in stages.items()]
+
+    lines += ["# HELP vchaos_stage_errors_total Errors raised by each pipeline stage.", "# TYPE vchaos_stage_errors_total counter"]
+    lines += [f'vchaos_stage_errors_total{{stage="{name}"}} {metrics.errors}' for name, metrics in stages.items()]
+
+    lines += ["# HELP vchaos_admission_waiting Requests waiting in each admission queue.", "# TYPE vchaos_admission_waiting gauge"]
+    lines += [f'vchaos_admission_waiting{{stage="{name}"}} {stage.waiting}' for name, stage in admission_stages.items()]
+
+    lines += ["# HELP vchaos_model_bundle_bytes_total Bytes of Live2D model bundles served, by texture variant.", "# TYPE vchaos_model_bundle_bytes_total counter"]
+    lines += [f'vchaos_model_bundle_bytes_total{{variant="{variant}"}} {size}' for variant, size in bundle_bytes.items()]
+
+    lines += ["# HELP vchaos_model_bundle_bytes_saved_total Bytes saved by serving texture variants instead of the original textures.", "# TYPE vchaos_model_bundle_bytes_saved_total counter"]
+    lines += [f'vchaos_model_bundle_bytes_saved_total{{variant="{variant}"}} {saved}' for variant, saved in bundle_bytes_saved.items()]
+
+    lines += ["# HELP vchaos_tts_audio_seconds_total Seconds of TTS audio post-processed.", "# TYPE vchaos_tts_audio_seconds_total counter"]
+    lines.append(f"vchaos_tts_audio_seconds_total {tts_audio_seconds}")
+
+    lines += ["# HELP vchaos_tts_trimmed_seconds_total Seconds of silence trimmed from TTS audio.", "# TYPE vchaos_tts_trimmed_seconds_total counter"]
+    lines.append(f"vchaos_tts_trimmed_seconds_total {tts_trimmed_seconds}")
+
+    lines += ["# HELP vchaos_transcript_cache_lookups_total Voice prompt transcript cache lookups, by result.", "# TYPE vchaos_transcript_cache_lookups_total counter"]
+    lines.append(f'vchaos_transcript_cache_lookups_total{{result="hit"}} {transcript_cache.hits}')
+    lines.append(f'vchaos_transcript_cache_lookups_total{{result="miss"}} {transcript_cache.misses}')
+    lines += ["# HELP vchaos_transcript_cache_entries Cached voice prompt transcripts.", "# TYPE vchaos_transcript_cache_entries gauge"]
+    lines.append(f"vchaos_transcript_cache_entries {len(transcript_cache)}")
+
+    # Imported here, as for admission stages; the pools are registered by the app
+    from routes.upstreams import pools
+    endpoint_stats = [(name, stats) for name, pool in pools.items() for stats in pool.stats()]
+    lines += ["# HELP vchaos_upstream_latency_seconds Recent request latency of each upstream endpoint.", "# TYPE vchaos_upstream_latency_seconds summary"]
+    for name, stats in endpoint_stats:
+        for quantile in ("50", "95"):
+            lines.append(f'vchaos_upstream_latency_seconds{{upstream="{name}",endpoint="{stats["label"]}",quantile="0.{quantile}"}} {stats["latency_p" + quantile]}')
+    lines += ["# HELP vchaos_upstream_outstanding Requests in flight to each upstream endpoint.", "# TYPE vchaos_upstream_outstanding gauge"]
+    lines += [f'vchaos_upstream_outstanding{{upstream="{name}",endpoint="{stats["label"]}"}} {stats["outstanding"]}' for name, stats in endpoint_stats]
+    lines += ["# HELP vchaos_upstream_healthy Whether each upstream endpoint is in rotation.", "# TYPE vchaos_upstream_healthy gauge"]
+    lines += [f'vchaos_upstream_healthy{{upstream="{name}",endpoint="{stats["label"]}"}} {int(stats["healthy"])}' for name, stats in endpoint_stats]
+    lines += ["# HELP vchaos_upstream_requests_total Requests sent to each upstream endpoint, by outcome.", "# TYPE vchaos_upstream_requests_total counter"]
+    for name, stats in endpoint_stats:
+        lines.append(f'vchaos_upstream_requests_total{{upstream="{name}",endpoint="{stats["label"]}",outcome="success"}} {stats["requests"] - stats["errors"] - stats["outstanding"]}')
+        lines.append(f'vchaos_upstream_requests_total{{upstream="{name}",endpoint="{stats["label"]}",outcome="error"}} {stats["errors"]}')
+
+    breakers = [pool.breaker for pool in pools.values()]
+    lines += ["# HELP vchaos_upstream_circuit_state Circuit breaker state of each upstream service.", "# TYPE vchaos_upstream_circuit_state gauge"]
+    for breaker in breakers:
+        for breaker_state in (breaker.CLOSED, breaker.OPEN, breaker.HALF_OPEN):
+            lines.append(f'vchaos_upstream_circuit_state{{upstream="{breaker.name}",state="{breaker_state}"}} {int(breaker.state == breaker_state)}')
+    lines += ["# HELP vchaos_upstream_circuit_rejected_total Requests failed fast by the circuit breaker of each upstream service.", "# TYPE vchaos_upstream_circuit_rejected_total counter"]
+    lines += [f'vchaos_upstream_circuit_rejected_total{{upstream="{breaker.name}"}} {breaker.rejected}' for breaker in breakers]
+
+    lines += ["# HELP vchaos_connected_clients Active WebSocket clients.", "# TYPE vchaos_connected_clients gauge"]
+    lines.append(f"vchaos_connected_clients {len(connected_clients)}")
+
+    return "\n".join(lines) + "\n"
+
+@router.get("/metrics")
+async def get_metrics():
+    """
+    Expose pipeline latency histograms, in-flight gauges, error counters and client counts.
+
+    Returns:
+        PlainTextResponse: Metrics in the Prometheus text exposition format.
+    """
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,360 @@
+# routes/models.py
+import os
+import gzip
+import asyncio
+import json
+import struct
+import hashlib
+import logging
+import tempfile
+import posixpath
+from fastapi import APIRouter, Request
+from fastapi.responses import FileResponse, JSONResponse, Response
+from routes import metrics, textures
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+BUNDLE_DIR = "live2d_bundles"
+BUNDLE_ROUTE = "/live2d_bundles"
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+INDEX_FILE = "index.json"  # Built bundles, for workers serving bundles built by another worker
+DEFAULT_VARIANT = "webp"  # For clients known to decode WebP; others get the original textures
+
+bundles = {}       # model file_path -> {"stamp", "variants": {variant: filename}}
+bundle_files = {}  # bundle filename -> {"path", "variant", "size", "original_size"}
+
+def _model_files(model_dir: str) -> list[tuple]:
+    """
+    Lists the files of a model directory, with their paths relative to it and a (size, mtime) stamp.
+    Hidden files are skipped.
+    """
+    files = []
+    for root, dirs, names in os.walk(model_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(names):
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            files.append((os.path.relpath(path, model_dir).replace(os.sep, "/"), path, (stat.st_size, stat.st_mtime_ns)))
+    return files
+
+def pack(files: list[tuple]) -> bytes:
+    """
+    Packs files into a single uncompressed bundle. The layout is a 4-byte little-endian index length,
+    a JSON index of '{"path", "offset", "length"}' entries, then the concatenated file contents (offsets
+    are relative to the end of the index).
+
+    Args:
+        files (list[tuple]): (relative path, bytes) pairs.
+
+    Returns:
+        bytes: The bundle.
+    """
+    index = []
+    offset = 0
+    for path, content in files:
+        index.append({"path": path, "offset": offset, "length": len(content)})
+        offset += len(content)
+
+    header = json.dumps(index, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return b"".join([struct.pack("<I", len(header)), header, *(content for _, content in files)])
+
+def unpack(bundle: bytes) -> dict:
+    """
+    Reads a bundle created by 'pack'.
+
+    Returns:
+        dict: Relative path -> file contents.
+    """
+    (header_length,) = struct.unpack_from("<I", bundle)
+    start = 4 + header_length
+    index = json.loads(bundle[4:start])
+    return {entry["path"]: bundle[start + entry["offset"]:start + entry["offset"] + entry["length"]] for entry in index}
+
+def _texture_paths(settings: dict, settings_name: str) -> list[str]:
+    """
+    Returns the texture paths referenced by a model settings file, relative to its directory.
+    Cubism 3+ (*.model3.json) list them under 'FileReferences.Textures', Cubism 2 (*.model.json) under 'textures'.
+    """
+    if settings_name.endswith(".model3.json"):
+        references = settings.get("FileReferences", {}).get("Textures", [])
+    else:
+        references = settings.get("textures", [])
+    return [posixpath.normpath(r) for r in references if isinstance(r, str)] if isinstance(references, list) else []
+
+def _texture_variant(contents: dict, settings_name: str, variant: str, cache_dir: str) -> dict:
+    """
+    Derives the files of a texture variant: each referenced texture is replaced by its WebP version
+    and the model settings are rewritten to point at it.
+
+    Args:
+        contents (dict): Relative path -> bytes of the original model files.
+        settings_name (str): Relative path of the model settings file.
+        variant (str): Name of the variant in 'textures.VARIANTS'.
+        cache_dir (str): Directory transcoded textures are cached in.
+
+    Returns:
+        dict: Relative path -> bytes of the variant's files.
+    """
+    settings = json.loads(contents[settings_name])
+    references = settings["FileReferences"]["Textures"] if settings_name.endswith(".model3.json") else settings["textures"]
+
+    files = dict(contents)
+    for index, reference in enumerate(references):
+        path = posixpath.normpath(reference)
+        if path not in files:
+            continue
+        renamed = textures.variant_name(path, variant)
+        files[renamed] = textures.transcode(files.pop(path), variant, cache_dir)
+        references[index] = renamed
+
+    files[settings_name] = json.dumps(settings, ensure_ascii=False, indent=1).encode("utf-8")
+    return files
+
+def _write_bundle(contents: dict, name: str, bundle_dir: str) -> tuple:
+    """
+    Packs and compresses files into 'bundle_dir', named after the hash of their content.
+
+    Returns:
+        tuple: The bundle's filename and compressed size in bytes.
+    """
+    bundle = pack(sorted(contents.items()))
+    filename = f"{name}.{hashlib.sha256(bundle).hexdigest()[:16]}.bundle"
+    path = os.path.join(bundle_dir, filename)
+
+    if not os.path.exists(path):
+        os.makedirs(bundle_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=".bundle-", dir=bundle_dir)
+        with os.fdopen(fd, "wb") as f:
+            f.write(gzip.compress(bundle, compresslevel=6, mtime=0))
+        os.replace(temp_path, path)
+    return filename, os.path.getsize(path)
+
+def build_bundle(file_path: str, bundle_dir: str = BUNDLE_DIR, texture_variants: bool = True) -> dict:
+    """
+    Packs the directory of a Live2D model file (settings, moc, physics, textures, motions...) into
+    gzip-compressed bundles named after their content hash, so URLs change whenever the model does.
+    Besides the original, a bundle is built per texture variant (WebP at full size, 1024 and 512 px) for
+    devices that cannot use, or do not need, the full-size PNG textures.
+    Rebuilding is skipped while the size and mtime of every file are unchanged.
+
+    Args:
+        file_path (str): Path of the *.model3.json/*.model.json file, as listed in model_dict.json.
+        bundle_dir (str): Directory the bundles are written to.
+        texture_variants (bool): Whether to build the texture variants (requires Pillow).
+
+    Returns:
+        dict: Variant name ('original', 'webp', '1024', '512') -> bundle filename.
+    """
+    model_dir = os.path.dirname(file_path)
+    files = _model_files(model_dir)
+    stamp = [[rel_path, list(file_stamp)] for rel_path, _, file_stamp in files]  # JSON-compatible, see 'save_index'
+
+    cached = bundles.get(file_path)
+    if cached and cached["stamp"] == stamp and all(filename in bundle_files for filename in cached["variants"].values()):
+        return cached["variants"]
+
+    contents = {}
+    for rel_path, path, _ in files:
+        with open(path, "rb") as f:
+            contents[rel_path] = f.read()
+
+    stem = os.path.basename(file_path).split(".")[0]
+    settings_name = os.path.basename(file_path)
+    filename, original_size = _write_bundle(contents, stem, bundle_dir)
+    variants = {"original": filename}
+    sizes = {"original": original_size}
+
+    if texture_variants and textures.available():
+        if _texture_paths(json.loads(contents[settings_name]), settings_name):
+            for variant in textures.VARIANTS:
+                variant_files = _texture_variant(contents, settings_name, variant, os.path.join(bundle_dir, "textures"))
+                variants[variant], sizes[variant] = _write_bundle(variant_files, f"{stem}.{variant}", bundle_dir)
+
+    for variant, filename in variants.items():
+        bundle_files[filename] = {
+            "path": os.path.join(bundle_dir, filename),
+            "variant": variant,
+            "size": sizes[variant],
+            "original_size": original_size
+        }
+    bundles[file_path] = {"stamp": stamp, "variants": variants}
+
+    summary = ", ".join(f"{v} {sizes[v] / 1024:.0f} KB ({(original_size - sizes[v]) / 1024:.0f} KB saved)" for v in variants)
+    logger.info(f"Packaged Live2D model {stem}: {summary}")
+    return variants
+
+def build_bundles(file_paths: list[str], bundle_dir: str = BUNDLE_DIR, texture_variants: bool = True) -> int:
+    """
+    Builds the bundles of all listed models and removes bundles that no longer belong to any of them.
+
+    Args:
+        file_paths (list[str]): Paths of the model files listed in model_dict.json.
+        bundle_dir (str): Directory the bundles are written to.
+        texture_variants (bool): Whether to build the texture variants (requires Pillow).
+
+    Returns:
+        int: Number of models with a bundle.
+    """
+    current = set()
+    packaged = 0
+    for file_path in file_paths:
+        try:
+            current.update(build_bundle(file_path, bundle_dir, texture_variants).values())
+            packaged += 1
+        except Exception as e:
+            bundles.pop(file_path, None)
+            logger.error(f"Error bundling Live2D model {file_path}: {e}")
+
+    for filename in set(bundle_files) - current:
+        bundle_files.pop(filename)
+    if os.path.isdir(bundle_dir):
+        for filename in os.listdir(bundle_dir):
+            if filename.endswith(".bundle") and filename not in current:
+                os.remove(os.path.join(bundle_dir, filename))
+    save_index(bundle_dir)
+    return packaged
+
+def save_index(bundle_dir: str = BUNDLE_DIR):
+    """Writes the built bundles to the bundle index, atomically."""
+    os.makedirs(bundle_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=".index-", dir=bundle_dir)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"bundles": bundles, "bundle_files": bundle_files}, f)
+    os.replace(temp_path, os.path.join(bundle_dir, INDEX_FILE))
+
+def load_index(bundle_dir: str = BUNDLE_DIR) -> bool:
+    """
+    Serves the bundles recorded in the bundle index by the worker that built them.
+
+    Returns:
+        bool: Whether the index could be read.
+    """
+    try:
+        with open(os.path.join(bundle_dir, INDEX_FILE), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        loaded_bundles, loaded_files = dict(index["bundles"]), dict(index["bundle_files"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+
+    bundles.clear()
+    bundles.update(loaded_bundles)
+    bundle_files.clear()
+    bundle_files.update(loaded_files)
+    return True
+
+def bundle_urls(file_path: str) -> dict:
+    """
+    Returns the content-hashed URLs of a model's bundles by variant, or an empty dict if none have been built.
+    """
+    cached = bundles.get(file_path)
+    return {variant: f"{BUNDLE_ROUTE}/{filename}" for variant, filename in cached["variants"].items()} if cached else {}
+
+def bundle_url(file_path: str) -> str:
+    """
+    Returns the URL of a model's bundle with its original textures, which every client can decode,
+    or None if it has not been built.
+    """
+    return bundle_urls(file_path).get("original")
+
+def _parse_hint(value: str) -> list[float]:
+    """
+    Parses the 'device-hint' cookie set by the frontend:
+    '<screen px>_<memory GB>_<max texture px>_<WebP support (1/0)>' (0 if unknown).
+    """
+    try:
+        values = [float(part) for part in value.split("_")[:4]] if value else []
+    except ValueError:
+        values = []
+    return values + [0.0] * (4 - len(values))
+
+def choose_variant(request: Request) -> str:
+    """
+    Chooses the texture variant for a client from its device hint.
+    The 'device-hint' cookie (screen size in physical pixels, device memory, maximum WebGL texture size and
+    WebP support, measured by the frontend) takes precedence; on a first visit, the equivalent Client Hints
+    and 'Accept' headers are used. Variants are WebP-encoded, so clients not known to decode WebP (e.g. iOS
+    Safari before 14) get the original textures. Small or low-memory devices get downscaled textures,
+    and 'Save-Data' requests go one size smaller.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        str: '512', '1024', 'webp' or 'original'.
+    """
+    headers = request.headers
+    screen_px, memory_gb, max_texture, webp = _parse_hint(request.cookies.get("device-hint", ""))
+    if not webp and "image/webp" not in headers.get("accept", ""):
+        return "original"
+
+    if not screen_px:
+        try:
+            width = float(headers.get("sec-ch-viewport-width") or headers.get("viewport-width") or 0)
+            dpr = float(headers.get("sec-ch-dpr") or headers.get("dpr") or 1)
+            screen_px = width * dpr
+        except ValueError:
+            screen_px = 0
+    if not memory_gb:
+        try:
+            memory_gb = float(headers.get("sec-ch-device-memory") or headers.get("device-memory") or 0)
+        except ValueError:
+            memory_gb = 0
+
+    limit = float("inf")
+    if max_texture:
+        limit = min(limit, max_texture)
+    if memory_gb:
+        limit = min(limit, 512 if memory_gb <= 1 else 1024 if memory_gb <= 2 else limit)
+    if screen_px:
+        limit = min(limit, 512 if screen_px <= 800 else 1024 if screen_px <= 1600 else limit)
+    if headers.get("save-data", "").lower() == "on":
+        limit = min(limit, 1024 if limit > 1024 else 512)
+
+    return "512" if limit < 1024 else "1024" if limit < 2048 else DEFAULT_VARIANT
+
+def preload_links(model: dict, variant: str = None) -> str:
+    """
+    Builds a 'Link' header value asking the browser to start downloading a model while the page loads.
+
+    Args:
+        model (dict): The model's entry from /api/get_models.
+        variant (str): The texture variant chosen for the client.
+
+    Returns:
+        str: The header value, or an empty string if the model has no bundle.
+    """
+    if not model:
+        return ""
+    url = (model.get("bundleUrls") or {}).get(variant) or model.get("bundleUrl")
+    return f"<{url}>; rel=preload; as=fetch; crossorigin=anonymous" if url else ""
+
+def _decompress(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return gzip.decompress(f.read())
+
+@router.get(BUNDLE_ROUTE + "/{filename}")
+async def get_bundle(filename: str, request: Request):
+    """
+    Serve a packaged Live2D model. Bundle URLs contain a hash of their content, so they can be cached forever.
+    The bytes saved compared to the original textures are counted in /metrics.
+
+    Args:
+        filename (str): Bundle filename, as found in the model's 'bundleUrls'.
+        request (Request): The incoming request, checked for gzip support.
+
+    Returns:
+        FileResponse: The gzip-encoded bundle (decoded for clients that do not accept gzip).
+        404 error if no current bundle has this name.
+    """
+    bundle = bundle_files.get(filename)
+    if bundle is None or not os.path.exists(bundle["path"]):
+        return JSONResponse({"error": "Bundle not found"}, status_code=404)
+
+    metrics.count_bundle(bundle["variant"], bundle["size"], bundle["original_size"] - bundle["size"])
+    headers = {"Cache-Control": IMMUTABLE_CACHE, "Vary": "Accept-Encoding"}
+    if "gzip" not in request.headers.get("accept-encoding", ""):
+        return Response(await asyncio.to_thread(_decompress, bundle["path"]), media_type="application/octet-stream", headers=headers)
+    return FileResponse(bundle["path"], media_type="application/octet-stream", headers={**headers, "Content-Encoding": "gzip"})
@@ -1,36 +1,166 @@
 # routes/presets.py
 import os
 import json
+import logging
+import tempfile
 from fastapi import APIRouter, Request, Depends, Query, Body, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from routes.utils import validate_connection
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 preset_file = "presets.json"
 
+def sanitize(value: str) -> str:
+    """Escapes characters that could be used to inject markup into the preset list."""
+    return value.replace("<", "&lt;").replace(">", "&gt;").replace("=", "&#x3D;")
+
+class PresetStore:
+    """
+    In-memory index of the presets in a JSON file, keyed by name.
+    The file is parsed once and only reparsed if it is modified outside of the store (detected by its mtime),
+    so lookups and reads do not depend on the number of presets. Writes go to a temporary file
+    that atomically replaces the original (keeping its permissions), so a crash mid-write never leaves
+    a truncated preset file.
+
+    Args:
+        path (str): Path of the preset file.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.presets = {}  # name -> {"name", "prompt"}, in file order
+        self.exists = False
+        self._mtime = None
+        self._loaded = False
+        self._body = None  # Serialized preset list, rebuilt lazily after changes
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def load(self, strict: bool = False):
+        """
+        Loads the preset file into memory, unless the cached copy is still current.
+
+        Args:
+            strict (bool): Whether to raise 'json.JSONDecodeError' for an invalid file instead of treating it as empty.
+        """
+        mtime = self._stat()
+        if self._loaded and mtime == self._mtime:
+            return
+
+        presets = []
+        if mtime is not None:
+            with open(self.path, "r", encoding="utf-8") as f:
+                try:
+                    presets = json.load(f)
+                except json.JSONDecodeError:
+                    if strict:
+                        raise
+                    presets = []
+            if not isinstance(presets, list):
+                presets = []
+
+        self.presets = {}
+        for preset in presets:
+            if not isinstance(preset, dict) or not isinstance(preset.get("name"), str):
+                continue
+            if preset["name"] in self.presets:
+                # Only the first is kept (and updated by 'save'), as before the store; it is dropped from the file on the next write
+                logger.warning(f"Duplicate preset '{preset['name']}' in {self.path}, keeping the first")
+                continue
+            self.presets[preset["name"]] = preset
+        self.exists = mtime is not None
+        self._mtime = mtime
+        self._loaded = True
+        self._body = None
+
+    def body(self) -> bytes:
+        """
+        Returns the preset list serialized as JSON, reusing the previous serialization if nothing changed.
+        """
+        self.load(strict=True)
+        if self._body is None:
+            self._body = json.dumps(list(self.presets.values())).encode("utf-8")
+        return self._body
+
+    def save(self, name: str, prompt: str):
+        """
+        Adds a preset, or updates the preset with the same name.
+        """
+        self.load()
+        self.presets[name] = {"name": name, "prompt": prompt}
+        self._persist()
+
+    def delete(self, names: list[str] = None) -> int:
+        """
+        Deletes presets by (case-insensitive) name, or all presets if no names are given.
+        Every preset whose name differs only in case from a given name is deleted.
+
+        Returns:
+            int: Number of presets deleted; the file is left untouched if this is 0.
+        """
+        self.load()
+        if not names:
+            total = len(self.presets)
+            self.presets = {}
+        else:
+            folded = {name.casefold() for name in names}
+            removed = [key for key in self.presets if key.casefold() in folded]
+            for key in removed:
+                del self.presets[key]
+            total = len(removed)
+
+        if total:
+            self._persist()
+        return total
+
+    def _persist(self):
+        """Writes the presets to a temporary file in the same directory and atomically swaps it in."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(prefix=".presets-", suffix=".tmp", dir=directory)
+        try:
+            try:
+                mode = os.stat(self.path).st_mode & 0o777
+            except FileNotFoundError:
+                mode = 0o644
+            os.chmod(temp_path, mode)  # mkstemp creates the file as 0600
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(list(self.presets.values()), f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            self._loaded = False  # Memory no longer matches the file; reload on next access
+            raise
+
+        self.exists = True
+        self._mtime = self._stat()
+        self._body = None
+
+store = PresetStore(preset_file)
+
 @router.get("/api/get_presets")
 async def get_presets(_: None = Depends(validate_connection)):
     """
     Retrieve list of presets from the 'preset_file' defined above.
+    The list is served from the in-memory preset store.
 
     Args:
         _: None: Validates whether request originates from an active WebSocket client.
 
     Returns:
-        JSONResponse: List of presets in JSON format.
+        Response: List of presets in JSON format.
         500 error if JSON file is invalid, missing, or any further exceptions.
     """
     try:
-        if not os.path.exists(preset_file):
-            return JSONResponse([], status_code=200)
-
-        with open(preset_file, "r", encoding="utf-8") as f:
-            presets = json.load(f)
-
-        if not isinstance(presets, list):
-            return JSONResponse([], status_code=200)
-
-        return JSONResponse(presets)
+        return Response(content=store.body(), media_type="application/json")
 
     except json.JSONDecodeError:
         return JSONResponse({"error": "Invalid JSON format"}, status_code=500)
@@ -40,7 +170,7 @@ async def get_presets(_: None = Depends(validate_connection)):
 @router.post("/api/save_preset")
 async def save_preset(request: Request, _: None = Depends(validate_connection)):
     """
-    Save a new preset or update an existing preset.
+    Save a new preset or update an existing preset with the same name.
 
     Args:
         request (Request): JSON request body containing preset details.
@@ -60,30 +190,7 @@ async def save_preset(request: Request, _: None = Depends(validate_connection)):
             return JSONResponse({"success": False, "error": "Both name and prompt are required."}, status_code=400)
 
         # Input sanitization
-        name = name.replace("<", "&lt;").replace(">", "&gt;").replace("=", "&#x3D;")
-        prompt = prompt.replace("<", "&lt;").replace(">", "&gt;").replace("=", "&#x3D;")
-
-        if not os.path.exists(preset_file):
-            with open(preset_file, "w", encoding="utf-8") as f:
-                json.dump([], f)
-
-        with open(preset_file, "r", encoding="utf-8") as f:
-            try:
-                presets = json.load(f)
-                if not isinstance(presets, list):
-                    presets = []
-            except json.JSONDecodeError:
-                presets = []
-
-        existing_preset = next((p for p in presets if p["name"] == name), None)
-
-        if existing_preset:
-            existing_preset["prompt"] = prompt
-        else:
-            presets.append({"name": name, "prompt": prompt})
-
-        with open(preset_file, "w", encoding="utf-8") as f:
-            json.dump(presets, f, indent=4)
+        store.save(sanitize(name), sanitize(prompt))
 
         return {"success": True, "message": "Preset saved successfully"}
 
@@ -108,37 +215,17 @@ async def delete_presets(request: Request, _: None = Depends(validate_connection
         data = await request.json()
         names_to_delete = data.get("names", [])
 
-        if not os.path.exists(preset_file):
+        store.load()
+        if not store.exists:
             return JSONResponse({"success": False, "error": "Preset file not found"}, status_code=404)
 
-        with open(preset_file, "r", encoding="utf-8") as f:
-            try:
-                presets = json.load(f)
-                if not isinstance(presets, list):
-                    presets = []
-            except json.JSONDecodeError:
-                presets = []
-
-        if not names_to_delete:
-            filtered_presets = []
-        else:
-            sanitized_names_to_delete = [name.replace("<", "&lt;").replace(">", "&gt;").replace("=", "&#x3D;") for name in names_to_delete]
-
-            filtered_presets = [
-                preset for preset in presets
-                if preset["name"].lower() not in [n.lower() for n in sanitized_names_to_delete]
-            ]
-
-        if len(filtered_presets) == len(presets):
+        total = store.delete([sanitize(name) for name in names_to_delete])
+        if not total:
             return JSONResponse({"success": False, "error": "No matching presets found."}, status_code=404)
 
-        with open(preset_file, "w", encoding="utf-8") as f:
-            json.dump(filtered_presets, f, indent=4)
-
-        total = len(presets) - len(filtered_presets)
         total_suffix = "preset" if total == 1 else "presets"
 
         return {"success": True, "message": f"Deleted {total} {total_suffix} successfully."}
 
     except Exception as e:
-        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
\ No newline at end of file
+        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
@@ -2,7 +2,8 @@
 import json
 from fastapi import APIRouter, Request, Depends, HTTPException
 from fastapi.responses import JSONResponse
-from routes.utils import validate_connection
+from routes.utils import validate_connection, FileBackedResponse
+from routes import models
 from ruamel.yaml import YAML
 
 yaml = YAML()
@@ -31,6 +32,22 @@ def load_settings(file_path=settings_file):
         print("Error: settings.yaml not found, using defaults.")
         return {}
 
+startup_config = None
+
+def get_config():
+    """
+    Returns the settings loaded from settings.yaml when the app started.
+    Every backend module reads its constants from this single copy, so the file is only parsed once at startup.
+    Use 'load_settings' to read the file's current contents.
+
+    Returns:
+        dict: Dictionary containing the settings loaded from the YAML file.
+    """
+    global startup_config
+    if startup_config is None:
+        startup_config = load_settings()
+    return startup_config
+
 def validate_settings(data):
     """
     Validates received data when updating settings to ensure correct file structure and data type.
@@ -55,22 +72,75 @@ def validate_settings(data):
                 if not (30 <= value <= 600):
                     raise HTTPException(status_code=400, detail="Timeout value must be between 30 and 600")
 
+def load_frontend_settings(file_path: str) -> dict:
+    """
+    Loads the frontend section of the settings file.
+
+    Args:
+        file_path (str): Path to the YAML file containing configuration settings.
+
+    Returns:
+        dict: The frontend settings.
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        settings = yaml.load(f)
+    return settings.get("frontend", {})
+
+def load_model_dict(file_path: str) -> list:
+    """
+    Loads the list of Live2D models, keeping only entries with a name and file path
+    and filling in defaults for any missing properties. Models that have been packaged
+    also get the content-hashed URLs of their bundles (by texture variant).
+
+    Args:
+        file_path (str): Path to the JSON file containing the model dictionary.
+
+    Returns:
+        list: The filtered list of models.
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        all_models = json.load(f)
+
+    filtered_models = []
+    for m in all_models:
+        name = m.get("name")
+        path = m.get("file_path")
+        if name and path:
+            filtered_models.append({
+                "name": name,
+                "file_path": path,
+                "kScale": m.get("kScale", 0.2),
+                "xOffset": m.get("xOffset", 0),
+                "yOffset": m.get("yOffset", 0),
+                "idleMotion": m.get("idleMotion", "idle"),
+                "idleMotionCount": m.get("idleMotionCount", 1),
+                "tapMotion": m.get("tapMotion", "tap"),
+                "tapMotionCount": m.get("tapMotionCount", 1),
+                "bundleUrl": models.bundle_url(path),
+                "bundleUrls": models.bundle_urls(path)
+            })
+    return filtered_models
+
+# Serialized bodies of the read-only endpoints, rebuilt only when their source file changes
+settings_response = FileBackedResponse(settings_file, load_frontend_settings)
+models_response = FileBackedResponse(model_dict_file, load_model_dict)
+
 @router.get("/api/get_settings")
-async def get_settings():
+async def get_settings(request: Request):
     """
     Retrieve frontend settings from the 'settings_file' defined above.
-    For frontend purposes.
+    For frontend purposes. Supports conditional requests via 'If-None-Match'.
+
+    Args:
+        request (Request): The incoming request, checked for a cached ETag.
 
     Returns:
-        JSONResponse: The frontend settings in JSON format.
+        Response: The frontend settings in JSON format, or 304 if the client's copy is current.
         404 error if 'settings_file' is not found.
         500 error for further exceptions.
     """
     try:
-        with open(settings_file, "r", encoding="utf-8") as f:
-            settings = yaml.load(f)
-
-        return JSONResponse(settings.get("frontend", {}))
+        return settings_response.respond(request)
 
     except FileNotFoundError:
         return JSONResponse({"error": "settings_file not found"}, status_code=404)
@@ -102,6 +172,7 @@ async def update_settings(request: Request, _: None = Depends(validate_connectio
 
         with open(settings_file, "w", encoding="utf-8") as f:
             yaml.dump(yaml_data, f)
+        settings_response.invalidate()
 
         return {"success": True, "message": "Settings updated successfully"}
 
@@ -111,37 +182,21 @@ async def update_settings(request: Request, _: None = Depends(validate_connectio
         return {"success": False, "error": str(e)}
 
 @router.get("/api/get_models")
-async def get_model_dict():
+async def get_model_dict(request: Request):
     """
     Retrieve list of Live2D models from the 'model_dict_file' defined above.
+    Supports conditional requests via 'If-None-Match'.
+
+    Args:
+        request (Request): The incoming request, checked for a cached ETag.
 
     Returns:
-        JSONResponse: List of Live2D models and corresponding properties in JSON format.
+        Response: List of Live2D models and corresponding properties in JSON format, or 304 if the client's copy is current.
         404 error if 'model_dict_file' is not found.
         500 error for further exceptions.
     """
     try:
-        with open(model_dict_file, "r", encoding="utf-8") as f:
-            all_models = json.load(f)
-
-        filtered_models = []
-        for m in all_models:
-            name = m.get("name")
-            path = m.get("file_path")
-            if name and path:
-                filtered_models.append({
-                    "name": name,
-                    "file_path": path,
-                    "kScale": m.get("kScale", 0.2),
-                    "xOffset": m.get("xOffset", 0),
-                    "yOffset": m.get("yOffset", 0),
-                    "idleMotion": m.get("idleMotion", "idle"),
-                    "idleMotionCount": m.get("idleMotionCount", 1),
-                    "tapMotion": m.get("tapMotion", "tap"),
-                    "tapMotionCount": m.get("tapMotionCount", 1)
-                })
-
-        return JSONResponse(filtered_models)
+        return models_response.respond(request)
 
     except FileNotFoundError:
         return JSONResponse({"error": "model_dict.json not found"}, status_code=404)
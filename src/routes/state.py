@@ -0,0 +1,455 @@
+# routes/state.py
+import os
+import hmac
+import json
+import time
+import uuid
+import socket
+import asyncio
+import logging
+import itertools
+from collections import Counter
+from routes.globals import connected_clients
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+MAX_MESSAGE_SIZE = 2 ** 20
+REQUEST_TIMEOUT = 5.0
+SLOT_POLL_INTERVAL = 1.0  # Seconds between retries while waiting for a shared slot, should a 'released' message be missed
+
+handlers = {}  # channel -> list of async handlers, called with each published payload
+
+def subscribe(channel: str, handler):
+    """
+    Registers a handler for messages published on a channel (by any worker, including this one).
+
+    Args:
+        channel (str): Channel name, e.g. 'broadcast' or 'ack'.
+        handler (callable): Coroutine function called with the message payload.
+    """
+    handlers.setdefault(channel, []).append(handler)
+
+async def dispatch(channel: str, payload):
+    """
+    Delivers a published message to this worker's handlers. Handler errors are logged, not raised,
+    so one failing handler does not prevent delivery to the others.
+    """
+    for handler in handlers.get(channel, []):
+        try:
+            await handler(payload)
+        except Exception as e:
+            logger.error(f"Error handling '{channel}' message: {e}")
+
+class MemoryStateBackend:
+    """
+    Shared state for a single worker process (the default).
+    The registered clients are simply this process's WebSocket connections, published messages are
+    delivered directly to the local handlers, and every claim and slot is granted as there is no other consumer.
+    """
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def client_ips(self) -> set:
+        """Returns the IPs of all clients with an active WebSocket connection."""
+        return {ip for _, ip in connected_clients}
+
+    def client_count(self) -> int:
+        """Returns the number of active WebSocket connections."""
+        return len(connected_clients)
+
+    def is_registered(self, client_ip: str) -> bool:
+        """Returns whether a client has an active WebSocket connection."""
+        return any(ip == client_ip for _, ip in connected_clients)
+
+    async def register(self, client_ip: str):
+        """Records a new WebSocket connection of a client."""
+
+    async def unregister(self, client_ip: str) -> int:
+        """
+        Records a closed WebSocket connection of a client.
+
+        Returns:
+            int: Number of connections the client still has open (across all workers).
+        """
+        return sum(1 for _, ip in connected_clients if ip == client_ip)
+
+    async def publish(self, channel: str, payload):
+        """Publishes a message to the handlers of a channel in every worker."""
+        await dispatch(channel, payload)
+
+    async def claim(self, key: str, ttl: float) -> bool:
+        """
+        Claims a unit of work (e.g. a TTS notification), so that only one worker processes it.
+
+        Args:
+            key (str): Identifier of the unit of work.
+            ttl (float): Seconds after which the claim lapses, letting another worker retry if the claimant died.
+
+        Returns:
+            bool: Whether this worker obtained the claim.
+        """
+        return True
+
+    async def acquire(self, key: str, limit: int) -> str:
+        """
+        Takes one of 'limit' slots shared by every worker (e.g. the admission slots of a pipeline stage),
+        waiting until one is free.
+
+        Args:
+            key (str): Identifier of the slots.
+            limit (int): Number of slots.
+
+        Returns:
+            str: ID of the slot taken, to pass to 'release', or None if no shared slot is needed.
+        """
+        return None
+
+    async def release(self, key: str, slot: str):
+        """Frees a slot taken with 'acquire'."""
+
+class StateBroker:
+    """
+    Minimal broker that lets several vCHAOS workers (processes or hosts) share state.
+    Workers connect over TCP and exchange newline-delimited JSON messages. The broker keeps a count of
+    WebSocket connections per client IP for each worker (dropped when the worker disconnects), fans out
+    published messages to every worker, and arbitrates single-consumer claims and shared slots. A claim belongs
+    to the worker connection that took it, which may claim it again (e.g. to retry a notification it failed to read).
+    Slots are freed when released or when the worker holding them disconnects.
+    With a 'token', workers must present it in a 'hello' message before anything else, or are disconnected.
+    The protocol is not encrypted, so the broker must only be reachable from a trusted network.
+
+    Args:
+        token (str): Shared secret workers must present; empty to accept any worker (loopback only).
+    """
+    def __init__(self, token: str = ""):
+        self.token = token
+        self.connections = {}  # StreamWriter -> Counter of client IPs registered through it
+        self.claims = {}       # key -> (expiry (monotonic), StreamWriter of the claimant)
+        self.slots = {}        # key -> {slot ID: StreamWriter of the worker holding it}
+        self.server = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """
+        Starts listening for workers.
+
+        Returns:
+            int: The port the broker is listening on.
+        """
+        self.server = await asyncio.start_server(self._handle, host, port, limit=MAX_MESSAGE_SIZE)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            for writer in list(self.connections):
+                writer.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    def _snapshot(self) -> dict:
+        totals = Counter()
+        for registrations in self.connections.values():
+            totals.update(registrations)
+        return {"op": "clients", "ips": {ip: count for ip, count in totals.items() if count > 0}}
+
+    async def _send(self, writer, message: dict):
+        try:
+            writer.write(json.dumps(message).encode("utf-8") + b"\n")
+            await writer.drain()
+        except (ConnectionError, RuntimeError):
+            pass  # The worker's own handler cleans up after its disconnection
+
+    async def _fan_out(self, message: dict):
+        await asyncio.gather(*(self._send(writer, message) for writer in list(self.connections)))
+
+    def _claim(self, key: str, ttl: float, owner) -> bool:
+        now = time.monotonic()
+        if len(self.claims) > 1024:
+            self.claims = {k: claim for k, claim in self.claims.items() if claim[0] > now}
+        expiry, claimant = self.claims.get(key, (0, None))
+        if expiry > now and claimant is not owner:
+            return False
+        self.claims[key] = (now + ttl, owner)
+        return True
+
+    async def _authenticate(self, reader) -> bool:
+        """Checks that a connecting worker's first message is a 'hello' carrying the broker's token."""
+        try:
+            message = json.loads(await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT))
+            token = message.get("token") if isinstance(message, dict) and message.get("op") == "hello" else None
+            return isinstance(token, str) and hmac.compare_digest(token.encode(), self.token.encode())
+        except (ConnectionError, ValueError, asyncio.TimeoutError):
+            return False
+
+    async def _handle(self, reader, writer):
+        if self.token and not await self._authenticate(reader):
+            logger.warning(f"Rejected state broker connection from {writer.get_extra_info('peername')}: invalid token")
+            writer.close()
+            return
+
+        registrations = self.connections[writer] = Counter()
+        await self._send(writer, self._snapshot())
+        try:
+            async for line in reader:
+                message = json.loads(line)
+                op = message.get("op")
+
+                if op == "register":
+                    registrations[message["ip"]] += message.get("count", 1)
+                    await self._fan_out(self._snapshot())
+                elif op == "unregister":
+                    registrations[message["ip"]] -= 1
+                    if registrations[message["ip"]] <= 0:
+                        del registrations[message["ip"]]
+                    snapshot = self._snapshot()
+                    await self._send(writer, {"op": "reply", "id": message["id"], "count": snapshot["ips"].get(message["ip"], 0)})
+                    await self._fan_out(snapshot)
+                elif op == "publish":
+                    await self._fan_out({"op": "message", "channel": message["channel"], "payload": message["payload"]})
+                elif op == "claim":
+                    await self._send(writer, {"op": "reply", "id": message["id"], "ok": self._claim(message["key"], message["ttl"], writer)})
+                elif op == "acquire":
+                    held = self.slots.setdefault(message["key"], {})
+                    ok = len(held) < message["limit"]
+                    if ok:
+                        held[message["slot"]] = writer
+                    await self._send(writer, {"op": "reply", "id": message["id"], "ok": ok})
+                elif op == "release":
+                    if self.slots.get(message["key"], {}).pop(message["slot"], None):
+                        await self._fan_out({"op": "released", "key": message["key"]})
+        except (ConnectionError, ValueError, KeyError) as e:
+            logger.warning(f"Dropping worker connection to state broker: {e}")
+        finally:
+            self.connections.pop(writer, None)
+            writer.close()
+            await self._fan_out(self._snapshot())
+            for key, held in self.slots.items():
+                freed = [slot for slot, holder in held.items() if holder is writer]
+                for slot in freed:
+                    del held[slot]
+                if freed:
+                    await self._fan_out({"op": "released", "key": key})
+
+class BrokerStateBackend(MemoryStateBackend):
+    """
+    Shared state across workers through a 'StateBroker', for running vCHAOS with several uvicorn workers
+    or on several hosts behind a load balancer. Each worker mirrors the broker's client registry, so
+    'validate_connection' accepts requests from clients whose WebSocket is held by another worker.
+    If 'embedded' is set, the first worker able to bind the broker's port hosts the broker itself.
+    While the broker is unreachable the worker degrades to single-process behaviour (local delivery,
+    claims and slots always granted) and keeps reconnecting, replaying its registrations once connected.
+
+    Args:
+        host (str): Host of the broker.
+        port (int): Port of the broker.
+        embedded (bool): Whether this worker may host the broker.
+        reconnect_interval (float): Seconds between connection attempts.
+        token (str): Shared secret presented to (or required by, if hosted here) the broker.
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 11406, embedded: bool = True, reconnect_interval: float = 1.0, token: str = ""):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.embedded = embedded
+        self.reconnect_interval = reconnect_interval
+        self.registered = {}    # Client IP -> open connections across all workers, as last reported by the broker
+        self.local = Counter()  # Client IP -> open connections held by this worker
+        self.broker = None
+        self._writer = None
+        self._task = None
+        self._pending = {}      # Request ID -> future awaiting the broker's reply
+        self._released = {}     # Slot key -> event set when the broker reports one of its slots freed
+        self._dispatches = set()  # Tasks delivering published messages to the local handlers
+        self._ids = itertools.count()
+        self._connected = asyncio.Event()
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None
+
+    async def start(self, timeout: float = 2.0):
+        """Connects to (or hosts) the broker, waiting briefly so the first requests see the shared state."""
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"State broker at {self.host}:{self.port} unreachable, continuing with local state")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.broker:
+            await self.broker.stop()
+            self.broker = None
+
+    async def _run(self):
+        while True:
+            if self.embedded and self.broker is None:
+                broker = StateBroker(self.token)
+                try:
+                    await broker.start(self.host, self.port)
+                    self.broker = broker
+                    logger.info(f"Hosting state broker on {self.host}:{self.port}")
+                except OSError:
+                    pass  # Already hosted by another worker
+
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port, limit=MAX_MESSAGE_SIZE)
+            except OSError:
+                await asyncio.sleep(self.reconnect_interval)
+                continue
+
+            self._writer = writer
+            try:
+                await self._send({"op": "hello", "token": self.token})
+                for ip, count in self.local.items():
+                    await self._send({"op": "register", "ip": ip, "count": count})
+                self._connected.set()
+                async for line in reader:
+                    await self._receive(json.loads(line))
+            except (ConnectionError, ValueError) as e:
+                logger.warning(f"Lost connection to state broker: {e}")
+            finally:
+                self._writer = None
+                self._connected.clear()
+                self.registered = {}
+                writer.close()
+                for future in self._pending.values():
+                    if not future.done():
+                        future.set_exception(ConnectionError("State broker connection lost"))
+                self._pending.clear()
+
+            await asyncio.sleep(self.reconnect_interval)
+
+    async def _receive(self, message: dict):
+        op = message.get("op")
+        if op == "clients":
+            self.registered = message["ips"]
+        elif op == "reply":
+            future = self._pending.pop(message["id"], None)
+            if future and not future.done():
+                future.set_result(message)
+        elif op == "released":
+            if released := self._released.get(message["key"]):
+                released.set()
+        elif op == "message":
+            # Handlers run in their own task, so that a slow one (e.g. a broadcast) does not hold up replies
+            task = asyncio.create_task(dispatch(message["channel"], message["payload"]))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _send(self, message: dict):
+        self._writer.write(json.dumps(message).encode("utf-8") + b"\n")
+        await self._writer.drain()
+
+    async def _request(self, message: dict) -> dict:
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        await self._send({**message, "id": request_id})
+        return await asyncio.wait_for(future, REQUEST_TIMEOUT)
+
+    def client_ips(self) -> set:
+        return set(self.registered) | super().client_ips()
+
+    def client_count(self) -> int:
+        return sum(self.registered.values()) if self.connected else super().client_count()
+
+    def is_registered(self, client_ip: str) -> bool:
+        return client_ip in self.registered or super().is_registered(client_ip)
+
+    async def register(self, client_ip: str):
+        self.local[client_ip] += 1
+        if self.connected:
+            try:
+                await self._send({"op": "register", "ip": client_ip})
+            except ConnectionError:
+                pass  # Replayed on reconnection
+
+    async def unregister(self, client_ip: str) -> int:
+        self.local[client_ip] -= 1
+        if self.local[client_ip] <= 0:
+            del self.local[client_ip]
+        if self.connected:
+            try:
+                return (await self._request({"op": "unregister", "ip": client_ip}))["count"]
+            except (ConnectionError, asyncio.TimeoutError):
+                pass
+        return self.local.get(client_ip, 0)
+
+    async def publish(self, channel: str, payload):
+        if self.connected:
+            try:
+                await self._send({"op": "publish", "channel": channel, "payload": payload})
+                return
+            except ConnectionError:
+                pass
+        await dispatch(channel, payload)
+
+    async def claim(self, key: str, ttl: float) -> bool:
+        if self.connected:
+            try:
+                return (await self._request({"op": "claim", "key": key, "ttl": ttl}))["ok"]
+            except (ConnectionError, asyncio.TimeoutError):
+                pass
+        return True
+
+    async def acquire(self, key: str, limit: int) -> str:
+        slot = uuid.uuid4().hex
+        while self.connected:
+            released = self._released.setdefault(key, asyncio.Event())
+            released.clear()
+            try:
+                if (await self._request({"op": "acquire", "key": key, "limit": limit, "slot": slot}))["ok"]:
+                    return slot
+            except (ConnectionError, asyncio.TimeoutError):
+                break
+            except asyncio.CancelledError:
+                await self.release(key, slot)  # The broker may have granted it before the cancellation
+                raise
+            try:
+                await asyncio.wait_for(released.wait(), SLOT_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+        return None
+
+    async def release(self, key: str, slot: str):
+        if slot and self.connected:
+            try:
+                await self._send({"op": "release", "key": key, "slot": slot})
+            except ConnectionError:
+                pass  # Freed by the broker along with the connection
+
+def create_backend(state_config: dict):
+    """
+    Creates the shared-state backend selected by 'backend.state' in settings.yaml.
+
+    Args:
+        state_config (dict): The 'backend.state' settings.
+
+    Returns:
+        MemoryStateBackend | BrokerStateBackend: The backend.
+    """
+    if state_config.get("backend", "memory") == "broker":
+        host = state_config.get("broker_host", "127.0.0.1")
+        token = str(state_config.get("broker_token", "") or "")
+        if not token and host not in ("127.0.0.1", "localhost", "::1"):
+            logger.warning(f"State broker on {host} has no broker_token: anyone reaching it can register clients and publish events")
+        return BrokerStateBackend(
+            host=host,
+            port=int(state_config.get("broker_port", 11406)),
+            embedded=bool(state_config.get("embedded_broker", True)),
+            token=token
+        )
+    return MemoryStateBackend()
+
+backend = MemoryStateBackend()
@@ -0,0 +1,72 @@
+# routes/textures.py
+import io
+import os
+import hashlib
+import logging
+import tempfile
+import importlib.util
+
+logger = logging.getLogger(__name__)
+
+TEXTURE_CACHE_DIR = os.path.join("live2d_bundles", "textures")
+WEBP_QUALITY = 90
+# Pillow is imported when textures are first transcoded, keeping it off the startup path.
+# Without it, models are bundled with their original textures only.
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+# Texture variants, from largest to smallest, with the maximum texture size of each (None keeps the original size)
+VARIANTS = {"webp": None, "1024": 1024, "512": 512}
+
+def available() -> bool:
+    """Returns whether texture variants can be built (Pillow with WebP support is installed)."""
+    if not PILLOW_AVAILABLE:
+        return False
+    from PIL import features
+    return bool(features.check("webp"))
+
+def variant_name(texture_path: str, variant: str) -> str:
+    """
+    Returns the path a texture variant is stored under inside a bundle,
+    e.g. 'haru.2048/texture_00.png' -> 'haru.2048/texture_00.1024.webp'.
+    """
+    return f"{os.path.splitext(texture_path)[0]}.{variant}.webp"
+
+def transcode(image_bytes: bytes, variant: str, cache_dir: str = TEXTURE_CACHE_DIR) -> bytes:
+    """
+    Converts a texture to WebP, downscaling it if it is larger than the variant's maximum size.
+    Results are cached on disk by the hash of the source image, so each texture is only transcoded once.
+    Live2D texture coordinates are normalised, so downscaled textures map onto the model unchanged.
+
+    Args:
+        image_bytes (bytes): The source texture (typically a 2048 px PNG).
+        variant (str): Name of the variant in 'VARIANTS'.
+        cache_dir (str): Directory transcoded textures are cached in.
+
+    Returns:
+        bytes: The WebP-encoded texture.
+    """
+    max_size = VARIANTS[variant]
+    digest = hashlib.sha256(image_bytes).hexdigest()[:32]
+    cache_path = os.path.join(cache_dir, f"{digest}.{variant}.webp")
+    if os.path.exists(cache_path):
+        with open(cache_path, "rb") as f:
+            return f.read()
+
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image = image.convert("RGBA")
+        if max_size and max(image.size) > max_size:
+            scale = max_size / max(image.size)
+            image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+
+        output = io.BytesIO()
+        image.save(output, "WEBP", quality=WEBP_QUALITY, alpha_quality=100, method=4)
+    webp = output.getvalue()
+
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=".texture-", dir=cache_dir)
+    with os.fdopen(fd, "wb") as f:
+        f.write(webp)
+    os.replace(temp_path, cache_path)
+    return webp
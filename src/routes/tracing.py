@@ -0,0 +1,200 @@
+# routes/tracing.py
+import json
+import time
+import asyncio
+import uuid
+import logging
+from collections import OrderedDict, deque
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from routes.settings import get_config
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+config = get_config()
+TRACING_CONFIG = config.get("backend", {}).get("tracing", {})
+MAX_TRACES = int(TRACING_CONFIG.get("max_traces", 256))
+TRACE_LOG_FILE = TRACING_CONFIG.get("log_file", "")
+PENDING_TTL = config.get("frontend", {}).get("timeout", 180)
+LOG_FLUSH_INTERVAL = 1  # Seconds between writes of buffered hops to the trace log
+
+traces = OrderedDict()      # trace_id -> {"trace_id", "response_id", "hops"}, oldest first
+response_index = {}         # response_id -> trace_id
+pending_traces = deque()    # (trace_id, started_at) of prompts still waiting for a TTS response, in order sent
+log_buffer = []             # Trace log lines not yet written to TRACE_LOG_FILE
+
+def start_trace(trace_id: str = None, awaiting_response: bool = True) -> str:
+    """
+    Opens a new trace for a single prompt/response interaction.
+
+    Args:
+        trace_id (str): Correlation ID supplied by the caller, or None to generate one.
+        awaiting_response (bool): Whether the next unclaimed TTS response should be attributed to this trace.
+
+    Returns:
+        str: The correlation ID of the trace.
+    """
+    trace_id = trace_id or uuid.uuid4().hex
+    if trace_id not in traces:
+        traces[trace_id] = {"trace_id": trace_id, "response_id": None, "hops": []}
+        while len(traces) > MAX_TRACES:
+            _, evicted = traces.popitem(last=False)
+            response_index.pop(evicted["response_id"], None)
+
+    if awaiting_response:
+        pending_traces.append((trace_id, time.time()))
+    return trace_id
+
+def record(trace_id: str, hop: str, timestamp: float = None, **fields):
+    """
+    Records a timestamped hop in a trace, queueing it for the trace log if one is configured.
+
+    Args:
+        trace_id (str): Correlation ID of the trace.
+        hop (str): Name of the hop (e.g. 'webhook_sent', 'client_ack').
+        timestamp (float): UNIX timestamp of the hop; defaults to now.
+        **fields: Additional JSON-serializable details stored alongside the hop.
+    """
+    trace = traces.get(trace_id)
+    if trace is None:
+        return
+
+    entry = {"hop": hop, "timestamp": timestamp if timestamp is not None else time.time(), **fields}
+    trace["hops"].append(entry)
+    logger.debug(f"Trace {trace_id}: {hop}")
+
+    if TRACE_LOG_FILE:
+        log_buffer.append(json.dumps({"trace_id": trace_id, "response_id": trace["response_id"], **entry}) + "\n")
+
+def _append_log(lines: list):
+    try:
+        with open(TRACE_LOG_FILE, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+    except OSError as e:
+        logger.error(f"Failed to write trace log: {e}")
+
+async def flush_log():
+    """Appends the buffered hops to the trace log, off the event loop."""
+    if not log_buffer:
+        return
+    lines = log_buffer[:]
+    log_buffer.clear()
+    await asyncio.to_thread(_append_log, lines)
+
+async def write_log():
+    """Writes buffered hops to the trace log every 'LOG_FLUSH_INTERVAL' seconds, for as long as the app runs."""
+    if not TRACE_LOG_FILE:
+        return
+    while True:
+        await asyncio.sleep(LOG_FLUSH_INTERVAL)
+        await flush_log()
+
+def discard_pending(trace_id: str):
+    """
+    Stops a trace from claiming a TTS response, e.g. after its webhook request failed.
+
+    Args:
+        trace_id (str): Correlation ID of the trace.
+    """
+    for entry in list(pending_traces):
+        if entry[0] == trace_id:
+            pending_traces.remove(entry)
+
+def attach_response(response_id: str, trace_id: str = None) -> str:
+    """
+    Binds a TTS response to a trace.
+    Uses the correlation ID carried in the notification if present, otherwise the oldest prompt still
+    awaiting a response (Home Assistant processes webhook prompts in order). Responses that cannot be
+    matched, such as those triggered from a satellite device, get a trace of their own.
+
+    Args:
+        response_id (str): ID of the response (the base name of its .wav file).
+        trace_id (str): Correlation ID carried in the notification, if any.
+
+    Returns:
+        str: The correlation ID the response was bound to.
+    """
+    if trace_id:
+        discard_pending(trace_id)
+    else:
+        cutoff = time.time() - PENDING_TTL
+        while pending_traces:
+            candidate, started_at = pending_traces.popleft()
+            if started_at >= cutoff and candidate in traces:
+                trace_id = candidate
+                break
+
+    trace_id = start_trace(trace_id, awaiting_response=False)
+    traces[trace_id]["response_id"] = response_id
+    response_index[response_id] = trace_id
+    return trace_id
+
+def trace_for_response(response_id: str) -> str:
+    """
+    Returns the correlation ID bound to a response, or None if it is unknown.
+    """
+    return response_index.get(response_id)
+
+def timeline(trace_id: str) -> dict:
+    """
+    Builds the timeline of a trace, with the time elapsed at and between each hop.
+
+    Args:
+        trace_id (str): Correlation ID of the trace.
+
+    Returns:
+        dict: The trace with per-hop 'elapsed_ms'/'delta_ms' and its slowest hop, or None if unknown.
+    """
+    trace = traces.get(trace_id)
+    if trace is None:
+        return None
+
+    hops = sorted(trace["hops"], key=lambda h: h["timestamp"])
+    result = []
+    slowest = None
+    for index, hop in enumerate(hops):
+        delta = (hop["timestamp"] - hops[index - 1]["timestamp"]) * 1000 if index else 0.0
+        entry = {**hop, "elapsed_ms": round((hop["timestamp"] - hops[0]["timestamp"]) * 1000, 3), "delta_ms": round(delta, 3)}
+        result.append(entry)
+        if index and (slowest is None or delta > slowest["delta_ms"]):
+            slowest = entry
+
+    return {
+        "trace_id": trace_id,
+        "response_id": trace["response_id"],
+        "hops": result,
+        "total_ms": result[-1]["elapsed_ms"] if result else 0.0,
+        "slowest_hop": slowest["hop"] if slowest else None
+    }
+
+@router.get("/api/trace/{trace_ref}")
+async def get_trace(trace_ref: str):
+    """
+    Retrieve the hop-by-hop timeline of a single interaction.
+
+    Args:
+        trace_ref (str): Response ID (e.g. the 19-digit .wav base name) or correlation ID.
+
+    Returns:
+        JSONResponse: Timestamps of each hop with the elapsed time between them.
+        404 error if no trace is recorded for the given ID.
+    """
+    result = timeline(response_index.get(trace_ref, trace_ref))
+    if result is None:
+        return JSONResponse({"error": "Trace not found"}, status_code=404)
+    return JSONResponse(result)
+
+@router.get("/api/traces")
+async def get_traces():
+    """
+    Retrieve a summary of the most recent traces (latest first).
+
+    Returns:
+        JSONResponse: Correlation ID, response ID, total duration and slowest hop of each trace.
+    """
+    summaries = []
+    for trace_id in reversed(traces):
+        result = timeline(trace_id)
+        summaries.append({k: result[k] for k in ("trace_id", "response_id", "total_ms", "slowest_hop")})
+    return JSONResponse(summaries)
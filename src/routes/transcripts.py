@@ -0,0 +1,81 @@
+# routes/transcripts.py
+import time
+import hashlib
+
+class TranscriptCache:
+    """
+    Caches the transcripts of voice prompts, so that the same recording sent again skips Whisper entirely.
+    Entries are keyed by a hash of the decoded PCM audio, its format and the transcription language;
+    they expire after 'ttl' seconds, and the least recently used is evicted beyond 'max_entries'.
+
+    Args:
+        ttl (float): Seconds after which a cached transcript is no longer used.
+        max_entries (int): Maximum number of cached transcripts (0 disables the cache).
+    """
+    def __init__(self, ttl: float = 600, max_entries: int = 128):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = {}  # key -> (expires_at, result), least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def key(frames: bytes, rate: int, width: int, channels: int, language: str) -> str:
+        """
+        Computes the cache key of a recording.
+
+        Args:
+            frames (bytes): Raw PCM audio, as decoded from the uploaded file.
+            rate (int): Sample rate in Hz.
+            width (int): Sample width in bytes.
+            channels (int): Number of interleaved channels.
+            language (str): Transcription language.
+
+        Returns:
+            str: A 128-bit BLAKE2b digest, in hex.
+        """
+        digest = hashlib.blake2b(f"{rate}:{width}:{channels}:{language}:".encode(), digest_size=16)
+        digest.update(frames)
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        """
+        Looks up a transcript, counting the hit or miss.
+
+        Args:
+            key (str): Cache key from 'key()'.
+
+        Returns:
+            dict: The cached result, or None if absent or expired.
+        """
+        entry = self.entries.pop(key, None)
+        if entry is None or entry[0] <= time.monotonic():
+            self.misses += 1
+            return None
+
+        self.entries[key] = entry  # Most recently used
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: str, result: dict):
+        """
+        Caches a transcription result, evicting expired and least recently used entries beyond 'max_entries'.
+
+        Args:
+            key (str): Cache key from 'key()'.
+            result (dict): The transcription result.
+        """
+        if self.max_entries <= 0:
+            return
+
+        now = time.monotonic()
+        self.entries.pop(key, None)
+        self.entries[key] = (now + self.ttl, result)
+
+        for stale in [k for k, (expires_at, _) in self.entries.items() if expires_at <= now]:
+            del self.entries[stale]
+        while len(self.entries) > self.max_entries:
+            del self.entries[next(iter(self.entries))]
@@ -0,0 +1,532 @@
+# routes/upstreams.py
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from urllib.parse import urlsplit
+from contextlib import asynccontextmanager
+from fastapi.responses import JSONResponse
+from routes import state
+
+logger = logging.getLogger(__name__)
+
+pools = {}  # Name -> EndpointPool, for the metrics endpoint
+
+class LatencyWindow:
+    """
+    Rolling window of the most recent request latencies of an endpoint.
+
+    Args:
+        size (int): Number of latencies kept.
+    """
+    def __init__(self, size: int = 100):
+        self.samples = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def mean(self) -> float:
+        return sum(self.samples) / len(self.samples) if self.samples else 0.0
+
+    def percentile(self, q: float) -> float:
+        """Returns the q-th percentile (0-100) of the window, or 0 if it is empty."""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+class CircuitOpen(Exception):
+    """
+    Raised when a request is refused because the circuit breaker of its upstream service is open.
+
+    Args:
+        upstream (str): Name of the unavailable upstream service.
+        retry_after (int): Suggested number of seconds before the client retries.
+    """
+    def __init__(self, upstream: str, retry_after: int):
+        super().__init__(f"The {upstream.upper()} service is unavailable, please retry in {retry_after} seconds")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    Stops sending requests to an upstream service that keeps failing or answering slowly, so they fail fast
+    instead of each waiting for a timeout. The outcomes of the last 'window' calls are kept; once at least
+    'min_calls' were made, the breaker opens if the share of failed calls reaches 'failure_ratio', or the share
+    of calls slower than 'slow_seconds' reaches 'slow_ratio'. While open, requests are refused with 'CircuitOpen'.
+    After 'open_seconds' the breaker is half-open: up to 'probes' requests are let through, and it closes if
+    they succeed (in time) or opens again if one fails.
+
+    Args:
+        name (str): Name of the upstream service, used in logs, errors and 'upstream_status' events.
+        enabled (bool): Whether the breaker may open at all.
+        window (int): Number of recent calls considered.
+        min_calls (int): Calls needed in the window before the breaker may open.
+        failure_ratio (float): Share of failed calls opening the breaker.
+        slow_seconds (float): Duration from which a call counts as slow (0 disables the latency check), per unit of
+            work if calls pass their size to 'guard' (e.g. seconds of transcription per second of audio).
+        slow_ratio (float): Share of slow calls opening the breaker.
+        open_seconds (float): Seconds the breaker stays open before probing the service.
+        probes (int): Requests let through at once while half-open.
+        on_change (callable): Coroutine function called with the breaker whenever its state changes.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, enabled: bool = True, window: int = 20, min_calls: int = 5, failure_ratio: float = 0.5,
+                 slow_seconds: float = 0, slow_ratio: float = 0.8, open_seconds: float = 30, probes: int = 1, on_change=None):
+        self.name = name
+        self.enabled = enabled
+        self.outcomes = deque(maxlen=max(1, int(window)))  # (failed, slow) of recent calls
+        self.min_calls = max(1, int(min_calls))
+        self.failure_ratio = failure_ratio
+        self.slow_seconds = slow_seconds
+        self.slow_ratio = slow_ratio
+        self.open_seconds = open_seconds
+        self.probes = max(1, int(probes))
+        self.on_change = on_change
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.probing = 0
+        self.rejected = 0
+        self._changed = False
+
+    def retry_after(self) -> int:
+        """Returns the seconds left before the service is probed again (at least 1)."""
+        remaining = self.opened_at + self.open_seconds - time.monotonic() if self.state == self.OPEN else 0
+        return max(1, math.ceil(remaining))
+
+    def check(self):
+        """
+        Fails fast if a request could not be sent now, without admitting one
+        (e.g. before queueing for a pipeline stage).
+
+        Raises:
+            CircuitOpen: If the breaker is open, or half-open with every probe in flight.
+        """
+        if self.state == self.OPEN and time.monotonic() - self.opened_at < self.open_seconds \
+                or self.state == self.HALF_OPEN and self.probing >= self.probes:
+            self.rejected += 1
+            raise CircuitOpen(self.name, self.retry_after())
+
+    def acquire(self) -> bool:
+        """
+        Admits a request, as a probe if the breaker is (or just became) half-open.
+
+        Returns:
+            bool: Whether the request is a probe.
+
+        Raises:
+            CircuitOpen: If the request may not be sent now.
+        """
+        self.check()
+        if self.state == self.OPEN:
+            self._transition(self.HALF_OPEN)
+            logger.info(f"Probing {self.name} service")
+        if self.state == self.HALF_OPEN:
+            self.probing += 1
+            return True
+        return False
+
+    def record(self, failed: bool, seconds: float = None, probe: bool = False):
+        """
+        Records the outcome of a request, opening or closing the breaker as needed.
+
+        Args:
+            failed (bool): Whether the request failed.
+            seconds (float): Duration of the request per unit of work, or None if not representative of the service's latency.
+            probe (bool): Whether the request was admitted as a probe.
+        """
+        if not self.enabled:
+            return
+        slow = bool(self.slow_seconds) and seconds is not None and seconds >= self.slow_seconds
+
+        if self.state != self.CLOSED:
+            if probe and self.state == self.HALF_OPEN:  # Requests admitted before the breaker opened do not count
+                if failed or slow:
+                    self._open("probe " + ("failed" if failed else "was slow"))
+                else:
+                    self.outcomes.clear()
+                    self._transition(self.CLOSED)
+                    logger.info(f"{self.name} service recovered, closing circuit breaker")
+            return
+
+        self.outcomes.append((failed, slow))
+        if len(self.outcomes) < self.min_calls:
+            return
+        failures = sum(failed for failed, _ in self.outcomes) / len(self.outcomes)
+        slows = sum(slow for _, slow in self.outcomes) / len(self.outcomes)
+        if failures >= self.failure_ratio:
+            self._open(f"{failures:.0%} of the last {len(self.outcomes)} requests failed")
+        elif slows >= self.slow_ratio:
+            self._open(f"{slows:.0%} of the last {len(self.outcomes)} requests were slow")
+
+    def _open(self, reason: str):
+        self.opened_at = time.monotonic()
+        self._transition(self.OPEN)
+        logger.warning(f"{self.name} service unavailable ({reason}), failing requests for {self.open_seconds} s")
+
+    def _transition(self, state: str):
+        self.state = state
+        self.probing = 0
+        self._changed = True
+
+    async def _notify(self):
+        if self._changed:
+            self._changed = False
+            if self.on_change:
+                try:
+                    await self.on_change(self)
+                except Exception as e:
+                    logger.error(f"Unable to broadcast {self.name} service status: {e}")
+
+    @asynccontextmanager
+    async def guard(self, record_latency: bool = True, ignore: tuple = (), size: float = 1.0):
+        """
+        Sends a request through the breaker, recording its outcome and broadcasting any state change.
+
+        Args:
+            record_latency (bool): Whether the request's duration is representative of the service's latency.
+            ignore (tuple): Exception types that are not the service's fault (e.g. the client disconnecting).
+            size (float): Amount of work in the request (e.g. seconds of audio), by which its duration is divided
+                before being compared to 'slow_seconds', so that large requests are not mistaken for a slow service.
+
+        Raises:
+            CircuitOpen: If the request may not be sent now.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        probe = self.acquire()
+        await self._notify()
+        started = time.perf_counter()
+        outcome = None
+        try:
+            yield
+            outcome = False
+        except ignore:
+            raise
+        except Exception:
+            outcome = True
+            raise
+        finally:
+            if outcome is not None:
+                self.record(outcome, (time.perf_counter() - started) / max(size, 1e-3) if record_latency else None, probe)
+            elif probe:
+                self.probing = max(0, self.probing - 1)  # Cancelled: let another request probe
+            await self._notify()
+
+    def event(self) -> dict:
+        """Returns the 'upstream_status' event describing the breaker's state to clients."""
+        return {"type": "upstream_status", "upstream": self.name, "state": self.state,
+                "retry_after": self.retry_after() if self.state == self.OPEN else None}
+
+def unavailable_response(e: CircuitOpen) -> JSONResponse:
+    """
+    Builds the 503 response returned to requests refused by an open circuit breaker.
+
+    Args:
+        e (CircuitOpen): The refusal raised by 'CircuitBreaker.check' or 'CircuitBreaker.guard'.
+
+    Returns:
+        JSONResponse: Error message with a 'Retry-After' header.
+    """
+    return JSONResponse(
+        {"success": False, "error": str(e), "retry_after": e.retry_after},
+        status_code=503,
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+class Endpoint:
+    """
+    An upstream server and its routing state.
+
+    Args:
+        address (str): 'host:port' or URL identifying the endpoint.
+        host (str): Host to connect to (for TCP endpoints).
+        port (int): Port to connect to (for TCP endpoints).
+        label (str): Name of the endpoint in logs, metrics and traces, if the address must not be shown (e.g. a webhook
+            URL, whose ID is the credential triggering the automation); the address by default.
+    """
+    def __init__(self, address: str, host: str = None, port: int = None, label: str = None):
+        self.address = address
+        self.label = label or address
+        self.host = host
+        self.port = port
+        self.outstanding = 0
+        self.healthy = True
+        self.failed_checks = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.latency = LatencyWindow()
+
+    def stats(self) -> dict:
+        return {
+            "label": self.label,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_p50": round(self.latency.percentile(50), 4),
+            "latency_p95": round(self.latency.percentile(95), 4)
+        }
+
+def parse_tcp_endpoints(addresses: list, default_host: str, default_port: int) -> list:
+    """
+    Parses a list of 'host:port' (or 'host') strings into endpoints.
+
+    Args:
+        addresses (list): Endpoint addresses; if empty, the single default endpoint is used.
+        default_host (str): Host of the default endpoint.
+        default_port (int): Port of the default endpoint, and of addresses without one.
+
+    Returns:
+        list[Endpoint]: The endpoints, in the configured order.
+    """
+    endpoints = []
+    for address in addresses or [f"{default_host}:{default_port}"]:
+        host, _, port = str(address).strip().rpartition(":")
+        if not host or not port.isdigit():
+            host, port = str(address).strip(), default_port
+        endpoints.append(Endpoint(f"{host}:{port}", host, int(port)))
+    return endpoints
+
+def parse_url_endpoints(urls: list) -> list:
+    """
+    Creates endpoints for a list of URLs, labelled by scheme and host only (numbered if several share a host),
+    so that the paths and credentials they contain never appear in logs, metrics or traces.
+
+    Args:
+        urls (list): Endpoint URLs; duplicates are ignored.
+
+    Returns:
+        list[Endpoint]: The endpoints, in the configured order.
+    """
+    urls = list(dict.fromkeys(str(url).strip() for url in urls if url))
+    labels = []
+    for url in urls:
+        parsed = urlsplit(url)
+        labels.append(f"{parsed.scheme}://{parsed.hostname}" + (f":{parsed.port}" if parsed.port else ""))
+    return [
+        Endpoint(url, label=label if labels.count(label) == 1 else f"{label}#{index}")
+        for index, (url, label) in enumerate(zip(urls, labels), start=1)
+    ]
+
+class EndpointPool:
+    """
+    Routes requests across equivalent upstream endpoints: each request goes to the healthy endpoint with the
+    fewest outstanding requests (ties go to the lowest mean latency). Endpoints are taken out of rotation once
+    'unhealthy_after' consecutive health checks (or connection failures) fail, and return after one successful check.
+    If every endpoint is out of rotation, requests are still spread across all of them rather than refused.
+
+    Args:
+        name (str): Name of the pool, used in logs and metrics.
+        endpoints (list[Endpoint]): The endpoints.
+        health_check (callable): Async function checking an endpoint, raising (or returning False) if it is unhealthy.
+        interval (float): Seconds between health checks (0 disables them).
+        timeout (float): Seconds a health check may take.
+        unhealthy_after (int): Consecutive failures after which an endpoint is taken out of rotation.
+        breaker (CircuitBreaker): Circuit breaker of the service as a whole; disabled if not given.
+    """
+    def __init__(self, name: str, endpoints: list, health_check=None, interval: float = 10, timeout: float = 2, unhealthy_after: int = 2,
+                 breaker: CircuitBreaker = None):
+        self.name = name
+        self.endpoints = endpoints
+        self.breaker = breaker or CircuitBreaker(name, enabled=False)
+        self.health_check = health_check
+        self.interval = interval
+        self.timeout = timeout
+        self.unhealthy_after = max(1, int(unhealthy_after))
+
+    def available(self) -> list:
+        """Returns the endpoints in rotation, or all of them if none is."""
+        return [endpoint for endpoint in self.endpoints if endpoint.healthy] or self.endpoints
+
+    def choose(self) -> Endpoint:
+        """Returns the endpoint the next request should go to."""
+        return min(self.available(), key=lambda endpoint: (endpoint.outstanding, endpoint.latency.mean()))
+
+    def ranked(self) -> list:
+        """Returns the endpoints in the order they should be tried: those whose last request succeeded first, fastest first."""
+        return sorted(self.available(), key=lambda endpoint: (endpoint.consecutive_errors > 0, endpoint.latency.mean()))
+
+    @asynccontextmanager
+    async def request(self, endpoint: Endpoint = None, record_latency: bool = True):
+        """
+        Tracks a request to an endpoint, recording its latency and outcome.
+        A connection failure counts as a failed health check. A cancelled request (e.g. one that timed out,
+        or lost a hedge) records how long it had been waiting, so that an endpoint which never answers
+        is not ranked as if it were the fastest.
+
+        Args:
+            endpoint (Endpoint): The endpoint to use; chosen by the pool if not given.
+            record_latency (bool): Whether the request's duration is representative of the endpoint's latency
+                (e.g. not for streams whose length depends on the client).
+
+        Yields:
+            Endpoint: The endpoint the request is sent to.
+        """
+        endpoint = endpoint or self.choose()
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+        started = time.perf_counter()
+        try:
+            yield endpoint
+        except Exception as e:
+            endpoint.errors += 1
+            endpoint.consecutive_errors += 1
+            if isinstance(e, OSError):
+                self.record_check(endpoint, False, e)
+            raise
+        except asyncio.CancelledError:
+            if record_latency:
+                endpoint.latency.observe(time.perf_counter() - started)
+            raise
+        else:
+            endpoint.consecutive_errors = 0
+            if record_latency:
+                endpoint.latency.observe(time.perf_counter() - started)
+        finally:
+            endpoint.outstanding -= 1
+
+    def record_check(self, endpoint: Endpoint, healthy: bool, error: Exception = None):
+        """Updates an endpoint's rotation state with the result of a health check."""
+        if healthy:
+            if not endpoint.healthy:
+                logger.info(f"{self.name} endpoint {endpoint.label} is back in rotation")
+            endpoint.healthy, endpoint.failed_checks = True, 0
+            return
+
+        endpoint.failed_checks += 1
+        if endpoint.healthy and endpoint.failed_checks >= self.unhealthy_after:
+            endpoint.healthy = False
+            logger.warning(f"{self.name} endpoint {endpoint.label} taken out of rotation: {error}")
+
+    async def probe(self, endpoint: Endpoint) -> tuple:
+        """
+        Runs the health check of an endpoint.
+
+        Returns:
+            tuple: Whether the endpoint is healthy, and the reason if not.
+        """
+        try:
+            healthy = await asyncio.wait_for(self.health_check(endpoint), self.timeout)
+            return healthy is not False, "health check failed"
+        except Exception as e:
+            return False, repr(e)
+
+    async def check(self, endpoint: Endpoint):
+        """Runs the health check of an endpoint and updates its rotation state."""
+        self.record_check(endpoint, *await self.probe(endpoint))
+
+    async def run_health_checks(self):
+        """
+        Checks every endpoint each 'interval' seconds, for as long as the app runs. With several workers,
+        only the one holding the pool's 'health' claim runs the checks, publishing the results to every worker.
+        """
+        if not self.health_check or not self.interval:
+            return
+        while True:
+            try:
+                if await state.backend.claim(f"health:{self.name}", self.interval * 3):
+                    results = await asyncio.gather(*(self.probe(endpoint) for endpoint in self.endpoints))
+                    await state.backend.publish("upstream_health", {
+                        "upstream": self.name,
+                        "results": [[endpoint.address, healthy, error] for endpoint, (healthy, error) in zip(self.endpoints, results)]
+                    })
+            except Exception as e:
+                logger.error(f"Error health-checking {self.name} endpoints: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> list:
+        return [endpoint.stats() for endpoint in self.endpoints]
+
+async def handle_health(payload: dict):
+    """Applies the health check results published by the worker checking a pool's endpoints."""
+    pool = pools.get(payload["upstream"])
+    if pool is None:
+        return
+    endpoints = {endpoint.address: endpoint for endpoint in pool.endpoints}
+    for address, healthy, error in payload["results"]:
+        if address in endpoints:
+            pool.record_check(endpoints[address], healthy, error)
+
+state.subscribe("upstream_health", handle_health)
+
+def describe_error(error: Exception) -> str:
+    """
+    Describes a failed request by its error type and HTTP status, if any, for logs.
+    The error's message is left out, as it may contain the endpoint's URL (a credential for webhooks).
+    """
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return f"{type(error).__name__} {status}" if status is not None else type(error).__name__
+
+def hedge_delay(endpoint: Endpoint, percentile: float = 95, default: float = 2.0, min_samples: int = 20) -> float:
+    """
+    Returns how long to wait for an endpoint before hedging: its latency percentile once enough requests
+    have been observed, otherwise the configured default.
+    """
+    return endpoint.latency.percentile(percentile) if len(endpoint.latency) >= min_samples else default
+
+async def send_with_failover(pool: EndpointPool, send, hedge_after=None, attempt_timeout: float = None):
+    """
+    Sends a request to the endpoints of a pool in ranked order, failing over to the next endpoint when one fails.
+    With hedging, if the first endpoint has not answered within 'hedge_after(endpoint)' seconds, the request is
+    also sent to the next endpoint, and whichever succeeds first wins; the other request is cancelled.
+    At most two requests are in flight at once.
+
+    Args:
+        pool (EndpointPool): The endpoints.
+        send (callable): Async function sending the request to an endpoint, raising if it fails.
+        hedge_after (callable): Function returning the hedging delay for an endpoint, or None to disable hedging.
+        attempt_timeout (float): Seconds after which an endpoint that has not answered counts as failed, or None to wait.
+
+    Returns:
+        tuple: The endpoint that answered, and the result of 'send'.
+
+    Raises:
+        Exception: The last endpoint's error, if every endpoint failed.
+    """
+    candidates = deque(pool.ranked())
+    in_flight = {}  # Task -> endpoint
+    last_error = None
+
+    async def attempt(endpoint: Endpoint):
+        async with pool.request(endpoint):
+            return await asyncio.wait_for(send(endpoint), attempt_timeout)
+
+    def launch():
+        endpoint = candidates.popleft()
+        in_flight[asyncio.create_task(attempt(endpoint))] = endpoint
+
+    launch()
+    try:
+        while in_flight:
+            timeout = None
+            if hedge_after is not None and candidates and len(in_flight) == 1:
+                timeout = hedge_after(next(iter(in_flight.values())))
+            done, _ = await asyncio.wait(in_flight, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            if not done:
+                logger.info(f"No answer from {pool.name} endpoint {next(iter(in_flight.values())).label} after {timeout:.2f} s, hedging")
+                launch()
+                continue
+
+            for task in done:
+                endpoint = in_flight.pop(task)
+                if task.exception() is None:
+                    return endpoint, task.result()
+                last_error = task.exception()
+                logger.warning(f"{pool.name} endpoint {endpoint.label} failed: {describe_error(last_error)}")
+                if candidates:
+                    launch()  # Fail over
+        raise last_error
+    finally:
+        for task in in_flight:
+            task.cancel()
+        await asyncio.gather(*in_flight, return_exceptions=True)
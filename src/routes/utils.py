@@ -1,19 +1,209 @@
 # routes/utils.py
 import os
-from fastapi import Request, HTTPException
+import json
+import asyncio
+import hashlib
+import logging
+from fastapi import Request, Response, HTTPException, WebSocketDisconnect
 from routes.globals import connected_clients
+from routes import metrics, state, events
+
+logger = logging.getLogger(__name__)
 
 def validate_connection(request: Request):
     """
     Ensures only clients with an active WebSockets connection can make API POST requests.
+    The connection may be held by any worker sharing state with this one (see 'backend.state' in settings.yaml).
 
     Args:
         request (Request): The incoming FastAPI request instance.
     """
     client_ip = request.client.host
-    if not any(ip == client_ip for _, ip in connected_clients):
+    if not state.backend.is_registered(client_ip):
         raise HTTPException(status_code=403, detail="Unauthorized: WebSocket connection required.")
 
+async def send_to_clients(message):
+    """
+    Sends message to all WebSocket clients connected to this worker, in the protocol each client negotiated.
+    Simultaneously updates the list of active WebSocket clients.
+
+    Args:
+        message (dict | str): Event to be sent, or its JSON encoding.
+    """
+    disconnected_clients = set()
+    started = metrics.begin("broadcast")
+
+    # Encode once for all legacy clients; decode only if some client uses the event protocol
+    if isinstance(message, str):
+        legacy_text, event = message, (json.loads(message) if events.sessions else None)
+    else:
+        legacy_text, event = json.dumps(message), message
+
+    for client_tuple in connected_clients:
+        websocket, ip = client_tuple
+
+        try:
+            await events.send(websocket, event, legacy_text)
+        except (WebSocketDisconnect, ConnectionResetError):
+            disconnected_clients.add(client_tuple)
+        except Exception as e:
+            logger.error(f"Error sending WebSocket message: {e}")
+            disconnected_clients.add(client_tuple)
+
+    connected_clients.difference_update(disconnected_clients)
+    metrics.end("broadcast", started, failed=bool(disconnected_clients))
+
+class FileBackedResponse:
+    """
+    JSON response body precomputed from a file and rebuilt only when the file changes (by mtime or size).
+    Served with a strong ETag derived from the body, so clients revalidating an unchanged response
+    with 'If-None-Match' receive an empty 304 Not Modified instead of the full body.
+
+    Args:
+        path (str): Path of the source file.
+        build (callable): Reads the file at the given path and returns the JSON-serializable content.
+            Exceptions are propagated and nothing is cached, so errors are retried on the next request.
+    """
+    def __init__(self, path: str, build):
+        self.path = path
+        self.build = build
+        self.body = None
+        self.etag = None
+        self.content = None
+        self._stamp = None
+
+    def invalidate(self):
+        """Forces the body to be rebuilt on the next request, e.g. after the file was written by this process."""
+        self.body = None
+        self._stamp = None
+
+    def refresh(self):
+        """Rebuilds the body and ETag if the source file changed since they were computed."""
+        try:
+            stat = os.stat(self.path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stamp = None
+
+        if self.body is not None and stamp is not None and stamp == self._stamp:
+            return
+
+        content = self.build(self.path)
+        body = json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self.content = content
+        self.body = body
+        self._stamp = stamp
+
+    def respond(self, request: Request) -> Response:
+        """
+        Builds the response for a request, honouring 'If-None-Match'.
+
+        Args:
+            request (Request): The incoming FastAPI request instance.
+
+        Returns:
+            Response: 304 with no body if the client's cached copy is current, otherwise the JSON body.
+        """
+        self.refresh()
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache"}  # Cacheable, but revalidated on every load
+
+        if_none_match = request.headers.get("if-none-match", "")
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if self.etag in candidates or "*" in candidates:
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.body, media_type="application/json", headers=headers)
+
+class SecureDeleter:
+    """
+    Securely deletes files by overwriting their content with random data before removing them.
+    Files are overwritten in fixed-size chunks from a single random buffer that is reused across passes
+    and files, so memory use is constant regardless of file size. Files are processed in groups, each pass
+    overwriting the whole group before syncing it, so the writes of a group reach the disk together.
+
+    Args:
+        passes (int): Number of passes to overwrite each file before deletion.
+        buffer_size (int): Size (in bytes) of the random buffer written per chunk.
+        batch_size (int): Maximum number of files overwritten (and held open) together.
+    """
+    def __init__(self, passes: int = 3, buffer_size: int = 64 * 1024, batch_size: int = 32):
+        self.passes = passes
+        self.batch_size = max(1, batch_size)
+        self.buffer = os.urandom(buffer_size)
+
+    def _pattern(self, index: int) -> memoryview:
+        """Returns the random buffer rotated per pass, so consecutive passes do not write identical data."""
+        offset = (index * 4099) % len(self.buffer)
+        return memoryview(self.buffer[offset:] + self.buffer[:offset])
+
+    @staticmethod
+    def _overwrite(f, length: int, pattern: memoryview):
+        f.seek(0)
+        remaining = length
+        while remaining > 0:
+            written = f.write(pattern[:min(remaining, len(pattern))])
+            remaining -= written
+        f.flush()
+
+    @staticmethod
+    def _sync(handles: list, errors: dict):
+        """Flushes the written files (and only those) to disk."""
+        for path, f in handles:
+            try:
+                os.fsync(f.fileno())
+            except Exception as e:
+                errors[path] = e
+
+    def delete_files(self, file_paths: list[str]) -> dict:
+        """
+        Overwrites and deletes the given files. Missing files are skipped.
+
+        Args:
+            file_paths (list[str]): Paths to the files intended for secure deletion.
+
+        Returns:
+            dict: Maps the path of each file that could not be deleted to its exception.
+        """
+        errors = {}
+        for start in range(0, len(file_paths), self.batch_size):
+            handles = []
+            for path in file_paths[start:start + self.batch_size]:
+                try:
+                    f = open(path, "r+b")
+                    handles.append((path, f, os.fstat(f.fileno()).st_size))
+                except FileNotFoundError:
+                    continue
+                except Exception as e:
+                    errors[path] = e
+
+            try:
+                for index in range(self.passes):
+                    pattern = self._pattern(index)
+                    for path, f, length in handles:
+                        if path in errors:
+                            continue
+                        try:
+                            self._overwrite(f, length, pattern)
+                        except Exception as e:
+                            errors[path] = e
+
+                    # Sync the group after each pass, so each pass reaches the disk before the next overwrites it
+                    self._sync([(path, f) for path, f, _ in handles if path not in errors], errors)
+            finally:
+                for _, f, _ in handles:
+                    f.close()
+
+            for path, _, _ in handles:
+                if path not in errors:
+                    try:
+                        os.remove(path)
+                    except Exception as e:
+                        errors[path] = e
+
+        return errors
+
+secure_deleter = SecureDeleter()
+
 def secure_delete(file_path, passes=3):
     """
     Securely deletes a file by overwriting its content with random chars before deletion.
@@ -22,16 +212,18 @@ def secure_delete(file_path, passes=3):
         file_path (str): Path to the file intended for secure deletion.
         passes (int): Number of passes to overwrite file before deletion.
     """
-    try:
-        if os.path.exists(file_path):
-            with open(file_path, "wb") as f:
-                length = os.path.getsize(file_path)
-                for _ in range(passes):
-                    f.seek(0)
-                    f.write(os.urandom(length))
-                    f.flush()
-                    os.fsync(f.fileno())
-
-            os.remove(file_path)
-    except Exception as e:
-        print(f"Error securely deleting {file_path}: {e}")
\ No newline at end of file
+    deleter = secure_deleter if passes == secure_deleter.passes else SecureDeleter(passes)
+    for path, e in deleter.delete_files([file_path]).items():
+        print(f"Error securely deleting {path}: {e}")
+
+async def secure_delete_files(file_paths: list[str]) -> dict:
+    """
+    Securely deletes a group of files in a worker thread, keeping the event loop responsive.
+
+    Args:
+        file_paths (list[str]): Paths to the files intended for secure deletion.
+
+    Returns:
+        dict: Maps the path of each file that could not be deleted to its exception.
+    """
+    return await asyncio.to_thread(secure_deleter.delete_files, file_paths)
@@ -0,0 +1,104 @@
+# startup_profile.py
+import os
+import sys
+import json
+import time
+import socket
+import subprocess
+import urllib.request
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+TIME_TO_FIRST_REQUEST_TARGET = 0.5  # Seconds from launching the backend to its first response
+PROBE_PATH = "/api/client_count"
+
+def measure_imports(module="app"):
+    """
+    Imports a module in a fresh interpreter with '-X importtime', so nothing is already cached.
+
+    Returns:
+        list: (name, self_ms, cumulative_ms, depth) for every module imported, in import order.
+        'self' covers the module's own initialization (its top-level code), 'cumulative' includes its imports.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=APP_DIR, capture_output=True, text=True, check=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000, depth))
+    return modules
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def measure_first_request(timeout=30.0):
+    """
+    Launches the backend in a fresh process and polls it until it answers its first request.
+
+    Returns:
+        dict: Seconds from launch until 'app' was imported ('imported'), and until the first response ('first_response').
+    """
+    port = _free_port()
+    script = (
+        "import time, sys; started = time.perf_counter(); import app, uvicorn; "
+        "print(time.perf_counter() - started, flush=True); "
+        f"uvicorn.run(app.app, host='127.0.0.1', port={port}, log_level='critical')"
+    )
+    launched = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", script], cwd=APP_DIR, stdout=subprocess.PIPE, text=True)
+    try:
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}{PROBE_PATH}", timeout=1) as response:
+                    response.read()
+                first_response = time.perf_counter() - launched
+                break
+            except OSError:
+                if process.poll() is not None:
+                    raise RuntimeError("Backend exited before answering")
+                if time.perf_counter() - launched > timeout:
+                    raise TimeoutError(f"Backend did not answer within {timeout} seconds")
+                time.sleep(0.005)
+        imported = float(process.stdout.readline())
+    finally:
+        process.terminate()
+        process.wait()
+    return {"imported": imported, "first_response": first_response}
+
+def profile_startup(top=15, runs=3):
+    """
+    Prints the slowest modules to import and initialize, then the backend's time to first request
+    (the best of several runs) against 'TIME_TO_FIRST_REQUEST_TARGET'.
+
+    Returns:
+        dict: The time to first request measurements of the best run, and whether the target was met.
+    """
+    modules = measure_imports()
+    total = sum(self_ms for _, self_ms, _, _ in modules)
+
+    print(f"> Importing app: {total:.1f} ms across {len(modules)} modules")
+    print("> Slowest imports of app (cumulative ms, self ms):")
+    for name, self_ms, cumulative_ms, _ in sorted((m for m in modules if m[3] == 1), key=lambda m: -m[2])[:top]:
+        print(f"    {cumulative_ms:8.1f} {self_ms:8.1f}  {name}")
+
+    print("> Backend modules (cumulative ms, self ms):")
+    for name, self_ms, cumulative_ms, _ in modules:
+        if name in ("app", "routes", "generate_model_dict") or name.startswith("routes."):
+            print(f"    {cumulative_ms:8.1f} {self_ms:8.1f}  {name}")
+
+    best = min((measure_first_request() for _ in range(runs)), key=lambda r: r["first_response"])
+    best["target"] = TIME_TO_FIRST_REQUEST_TARGET
+    best["met"] = best["first_response"] <= TIME_TO_FIRST_REQUEST_TARGET
+    print(f"> Time to first request: {best['first_response'] * 1000:.0f} ms "
+          f"(imports {best['imported'] * 1000:.0f} ms; target {TIME_TO_FIRST_REQUEST_TARGET * 1000:.0f} ms, "
+          f"{'met' if best['met'] else 'MISSED'})")
+    return best
+
+if __name__ == "__main__":
+    print(json.dumps(profile_startup()))
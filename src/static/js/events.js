@@ -0,0 +1,153 @@
+// Versioned /ws event protocol: frames are {v: 1, events: [{type: ...}, ...]}, as MessagePack (binary) or JSON (text)
+export const PROTOCOL_VERSION = 1;
+export const SUBPROTOCOLS = [`vchaos.v${PROTOCOL_VERSION}.msgpack`, `vchaos.v${PROTOCOL_VERSION}.json`];
+
+const textEncoder = new TextEncoder();
+const textDecoder = new TextDecoder();
+
+// Decodes a received message into its events; legacy (non-negotiated) messages are mapped onto the same event shapes
+export function decodeFrame(data, subprotocol) {
+    if (!subprotocol) {
+        if (data === "disconnect_client") return [{ type: "disconnect" }];
+        if (!data.startsWith("{")) throw new Error("Received non-JSON message: " + data);
+        return [JSON.parse(data)];
+    }
+
+    const frame = typeof data === "string" ? JSON.parse(data) : msgpackDecode(new Uint8Array(data));
+    if (!frame || frame.v !== PROTOCOL_VERSION || !Array.isArray(frame.events)) {
+        throw new Error("Unsupported event frame version: " + (frame && frame.v));
+    }
+    return frame.events;
+}
+
+// Encodes events to send over a socket, in the encoding negotiated for it
+export function encodeFrame(events, subprotocol) {
+    if (!subprotocol) {
+        // Legacy protocol only has acknowledgements
+        return events.filter(e => e.type === "ack").map(e => `ack:${e.id}`).join("\n");
+    }
+    const frame = { v: PROTOCOL_VERSION, events };
+    return subprotocol.endsWith(".msgpack") ? msgpackEncode(frame) : JSON.stringify(frame);
+}
+
+// Minimal MessagePack codec (nil, booleans, numbers, strings, binary, arrays and maps)
+export function msgpackEncode(value) {
+    const bytes = [];
+    const pushUint = (n, size) => {
+        for (let i = size - 1; i >= 0; i--) bytes.push(Math.floor(n / 2 ** (8 * i)) & 0xff);
+    };
+    const pushHeader = (length, fix, fixMax, codes) => {
+        if (length <= fixMax && fix !== null) bytes.push(fix | length);
+        else if (length < 0x100 && codes[0] !== null) { bytes.push(codes[0]); pushUint(length, 1); }
+        else if (length < 0x10000) { bytes.push(codes[1]); pushUint(length, 2); }
+        else { bytes.push(codes[2]); pushUint(length, 4); }
+    };
+    const write = v => {
+        if (v === null || v === undefined) bytes.push(0xc0);
+        else if (v === false) bytes.push(0xc2);
+        else if (v === true) bytes.push(0xc3);
+        else if (typeof v === "number") {
+            if (Number.isInteger(v) && v >= 0 && v < 2 ** 32) {
+                if (v < 0x80) bytes.push(v);
+                else if (v < 0x100) { bytes.push(0xcc); pushUint(v, 1); }
+                else if (v < 0x10000) { bytes.push(0xcd); pushUint(v, 2); }
+                else { bytes.push(0xce); pushUint(v, 4); }
+            } else if (Number.isInteger(v) && v < 0 && v >= -32) {
+                bytes.push(v & 0xff);
+            } else if (Number.isInteger(v) && v < 0 && v >= -(2 ** 31)) {
+                bytes.push(0xd2); pushUint(v >>> 0, 4);
+            } else {
+                const view = new DataView(new ArrayBuffer(8));
+                view.setFloat64(0, v);
+                bytes.push(0xcb, ...new Uint8Array(view.buffer));
+            }
+        } else if (typeof v === "string") {
+            const utf8 = textEncoder.encode(v);
+            pushHeader(utf8.length, 0xa0, 31, [0xd9, 0xda, 0xdb]);
+            for (const b of utf8) bytes.push(b);
+        } else if (v instanceof Uint8Array) {
+            pushHeader(v.length, null, -1, [0xc4, 0xc5, 0xc6]);
+            for (const b of v) bytes.push(b);
+        } else if (Array.isArray(v)) {
+            pushHeader(v.length, 0x90, 15, [null, 0xdc, 0xdd]);
+            v.forEach(write);
+        } else {
+            const keys = Object.keys(v).filter(k => v[k] !== undefined);
+            pushHeader(keys.length, 0x80, 15, [null, 0xde, 0xdf]);
+            keys.forEach(k => { write(k); write(v[k]); });
+        }
+    };
+    write(value);
+    return new Uint8Array(bytes);
+}
+
+export function msgpackDecode(bytes) {
+    const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+    let offset = 0;
+    const uint = size => {
+        const n = size === 1 ? view.getUint8(offset) : size === 2 ? view.getUint16(offset) : size === 4 ? view.getUint32(offset)
+            : Number(view.getBigUint64(offset));
+        offset += size;
+        return n;
+    };
+    const int = size => {
+        const n = size === 1 ? view.getInt8(offset) : size === 2 ? view.getInt16(offset) : size === 4 ? view.getInt32(offset)
+            : Number(view.getBigInt64(offset));
+        offset += size;
+        return n;
+    };
+    const str = length => {
+        const s = textDecoder.decode(bytes.subarray(offset, offset + length));
+        offset += length;
+        return s;
+    };
+    const bin = length => {
+        const b = bytes.slice(offset, offset + length);
+        offset += length;
+        return b;
+    };
+    const array = length => Array.from({ length }, read);
+    const map = length => {
+        const obj = {};
+        for (let i = 0; i < length; i++) {
+            const key = read();
+            obj[key] = read();
+        }
+        return obj;
+    };
+    const read = () => {
+        const code = uint(1);
+        if (code < 0x80) return code;
+        if (code < 0x90) return map(code & 0x0f);
+        if (code < 0xa0) return array(code & 0x0f);
+        if (code < 0xc0) return str(code & 0x1f);
+        if (code >= 0xe0) return code - 0x100;
+        switch (code) {
+            case 0xc0: return null;
+            case 0xc2: return false;
+            case 0xc3: return true;
+            case 0xc4: return bin(uint(1));
+            case 0xc5: return bin(uint(2));
+            case 0xc6: return bin(uint(4));
+            case 0xca: { const v = view.getFloat32(offset); offset += 4; return v; }
+            case 0xcb: { const v = view.getFloat64(offset); offset += 8; return v; }
+            case 0xcc: return uint(1);
+            case 0xcd: return uint(2);
+            case 0xce: return uint(4);
+            case 0xcf: return uint(8);
+            case 0xd0: return int(1);
+            case 0xd1: return int(2);
+            case 0xd2: return int(4);
+            case 0xd3: return int(8);
+            case 0xd9: return str(uint(1));
+            case 0xda: return str(uint(2));
+            case 0xdb: return str(uint(4));
+            case 0xdc: return array(uint(2));
+            case 0xdd: return array(uint(4));
+            case 0xde: return map(uint(2));
+            case 0xdf: return map(uint(4));
+            default: throw new Error("Unsupported MessagePack type 0x" + code.toString(16));
+        }
+    };
+    return read();
+}
@@ -1,7 +1,10 @@
+import { SUBPROTOCOLS, decodeFrame, encodeFrame } from './events.js';
+
 var app, model2;
 var socket;
 var modelLoaded = false;
 let manualDisconnect = false;
+let unavailableUpstreams = new Set(); // Upstream services (e.g. "stt", "webhook") reported unavailable by the backend
 
 // Idle Motion Variables
 let isSpeaking = false;
@@ -17,6 +20,10 @@ const mouthParamNames = [
 let mouthParamId = null;
 let mouthParamMax = 1;
 let mouthParamMin = 0;
+let mouthEnvelope = null; // Mouth movement precomputed by the backend for the latest response ({url, fps, values})
+let mouthFormParamId = null;
+let mouthVisemes = null; // Viseme timeline of the latest response, published by the Piper handler ({url, phonemes})
+const visemeMouthForms = { A: 0, E: 1, I: 1, O: -0.5, U: -1, MBP: 0, FV: 0, TH: 0.3, L: 0.3, S: 0.5, rest: 0 };
 
 // Audio Player Variables
 const audioContext = new (window.AudioContext || window.webkitAudioContext)();
@@ -39,17 +46,69 @@ const live2dModule = (function() {
             transparent: true,
             backgroundAlpha: 0,
         });
+        saveDeviceHint();
+    }
+
+    // Record this device's screen size, memory, maximum texture size and WebP support,
+    // so the backend can choose suitably sized model textures in a format the browser decodes
+    function saveDeviceHint() {
+        const screenPx = Math.round(Math.max(screen.width, screen.height) * (window.devicePixelRatio || 1));
+        const gl = app.renderer.gl;
+        const maxTexture = gl ? gl.getParameter(gl.MAX_TEXTURE_SIZE) : 0;
+        const webpProbe = new Image(); // 1x1 lossless WebP with alpha, as used by the texture variants
+        webpProbe.onload = webpProbe.onerror = () => {
+            const webp = webpProbe.width === 1 ? 1 : 0;
+            document.cookie = `device-hint=${screenPx}_${navigator.deviceMemory || 0}_${maxTexture}_${webp}; max-age=31536000; path=/; samesite=strict`;
+        };
+        webpProbe.src = "data:image/webp;base64,UklGRhoAAABXRUJQVlA4TA0AAAAvAAAAEAcQERGIiP4HAA==";
+    }
+
+    function getCookie(name) {
+        const match = document.cookie.split("; ").find(cookie => cookie.startsWith(name + "="));
+        return match ? decodeURIComponent(match.slice(name.length + 1)) : null;
+    }
+
+    // Unpack a model bundle (see routes/models.py) into files the Live2D loader can read
+    async function fetchModelBundle(bundleUrl) {
+        const response = await fetch(bundleUrl);
+        if (!response.ok) {
+            throw new Error(`Failed to fetch model bundle: ${response.status}`);
+        }
+
+        const buffer = await response.arrayBuffer();
+        const indexLength = new DataView(buffer).getUint32(0, true);
+        const index = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, indexLength)));
+        const dataStart = 4 + indexLength;
+
+        return index.map(({ path, offset, length }) => {
+            const file = new File([new Uint8Array(buffer, dataStart + offset, length)], path.split("/").pop());
+            Object.defineProperty(file, "webkitRelativePath", { value: path });
+            return file;
+        });
+    }
+
+    async function createModel(modelInfo) {
+        // Use the texture variant the backend chose for this device (and preloaded), if it was built
+        const bundleUrl = (modelInfo.bundleUrls || {})[getCookie("texture-variant")] || modelInfo.bundleUrl;
+        if (bundleUrl) {
+            try {
+                return await live2d.Live2DModel.from(await fetchModelBundle(bundleUrl));
+            } catch (error) {
+                console.warn("Falling back to loading model files individually:", error);
+            }
+        }
+        return live2d.Live2DModel.from(modelInfo.url);
     }
 
     async function loadModel(modelInfo) {
-        console.log("Loading Live2D model:", modelInfo.url);
+        console.log("Loading Live2D model:", modelInfo.bundleUrl || modelInfo.url);
 
         if (model2) {
             app.stage.removeChild(model2);
         }
 
         try {
-            model2 = await live2d.Live2DModel.from(modelInfo.url);
+            model2 = await createModel(modelInfo);
             app.stage.addChild(model2);
 
             model2.scale.set(modelInfo.kScale || 0.2);
@@ -69,6 +128,7 @@ const live2dModule = (function() {
             enablePointerEvents(model2, modelInfo.idleMotion, modelInfo.idleMotionCount, modelInfo.tapMotion, modelInfo.tapMotionCount);
 
             mouthParamId = getMouthOpenParam(model2);
+            mouthFormParamId = getMouthFormParam(model2);
             if (mouthParamId) {
                 let params = model2.internalModel.coreModel;
                 let paramIndex = params._parameterIds.indexOf(mouthParamId);
@@ -231,13 +291,13 @@ function connectWebSocket() {
     if (manualDisconnect) return;
 
     const wsProtocol = window.location.protocol === "https:" ? "wss://" : "ws://";
-    socket = new WebSocket(wsProtocol + window.location.hostname + ":11405/ws");
+    socket = new WebSocket(wsProtocol + window.location.hostname + ":11405/ws", SUBPROTOCOLS);
+    socket.binaryType = "arraybuffer";
     var wsStatus = document.getElementById("wsStatus");
 
     socket.onopen = function () {
-        wsStatus.textContent = "Connected";
-        wsStatus.classList.remove("disconnected");
-        wsStatus.classList.add("connected");
+        unavailableUpstreams.clear(); // The backend reports unavailable services on connection
+        updateConnectionStatus();
         if (window.appSettings["adaptive-background"]) {
             document.dispatchEvent(new Event("backgroundUpdate"));
         }
@@ -252,6 +312,8 @@ function connectWebSocket() {
                     if (selectedModel) {
                         live2dModule.loadModel({
                             url: selectedModel.file_path,
+                            bundleUrl: selectedModel.bundleUrl,
+                            bundleUrls: selectedModel.bundleUrls,
                             kScale: selectedModel.kScale,
                             xOffset: selectedModel.xOffset,
                             yOffset: selectedModel.yOffset,
@@ -272,7 +334,7 @@ function connectWebSocket() {
 
     socket.onclose = function () {
         wsStatus.textContent = "Disconnected";
-        wsStatus.classList.remove("connected");
+        wsStatus.classList.remove("connected", "degraded");
         wsStatus.classList.add("disconnected");
 
         if (!manualDisconnect) {
@@ -287,78 +349,112 @@ function connectWebSocket() {
     };
 
     socket.onmessage = function (event) {
-
-        if (event.data === "ping") {
+        // Events are batched into one frame by the server when using the event protocol (socket.protocol)
+        let events;
+        try {
+            events = decodeFrame(event.data, socket.protocol);
+        } catch (error) {
+            console.error("Error parsing WebSocket message:", error);
             return;
         }
+        events.forEach(handleEvent);
+    };
+}
 
-        if (event.data === "disconnect_client") {
-            manualDisconnect = true;
-            disconnectWebSocket();
-            return;
+// Shows the connection as degraded while the backend reports an upstream service (Whisper, the webhook) unavailable
+function updateConnectionStatus() {
+    const wsStatus = document.getElementById("wsStatus");
+    const degraded = unavailableUpstreams.size > 0;
+    wsStatus.textContent = degraded ? `Degraded (${[...unavailableUpstreams].join(", ").toUpperCase()} unavailable)` : "Connected";
+    wsStatus.classList.remove("disconnected");
+    wsStatus.classList.toggle("connected", !degraded);
+    wsStatus.classList.toggle("degraded", degraded);
+}
+
+function handleEvent(data) {
+    if (data.type === "disconnect") {
+        manualDisconnect = true;
+        disconnectWebSocket();
+        return;
+    }
+
+    if (data.type === "queue_status") {
+        const responseStatus = document.getElementById("responseStatus");
+        if (data.position) {
+            updateStatus("queued");
+            responseStatus.textContent = `Queued (${data.position} of ${data.waiting})`;
+        } else if (responseStatus.classList.contains("status-queued")) {
+            updateStatus(data.stage === "stt" ? "transcribing" : "waiting");
         }
+        return;
+    }
 
-        let data;
-        try {
-            if (event.data.startsWith("{") || event.data.startsWith("[")) {
-                data = JSON.parse(event.data);
-            } else {
-                throw new Error("Received non-JSON message: " + event.data);
-            }
-        } catch (error) {
-            console.error("Error parsing WebSocket message:", error);
+    if (data.type === "upstream_status") {
+        if (data.state === "closed") {
+            unavailableUpstreams.delete(data.upstream);
+        } else {
+            unavailableUpstreams.add(data.upstream);
+        }
+        updateConnectionStatus();
+        return;
+    }
+
+    if (data.type === "new_audio") {
+        var textOutput = document.getElementById("textOutput");
+
+        if (!textOutput) {
+            console.error("Missing text output element.");
+            updateStatus("error")
             return;
         }
 
-        if (data.type === "new_audio") {
-            var textOutput = document.getElementById("textOutput");
+        var audioFilePath = window.location.origin + data.audio_file;
+        var textFilePath = audioFilePath.replace(".wav", ".txt");
+        let textContent = '';
+
+        fetch(textFilePath)
+            .then(response => response.ok ? response.text() : Promise.reject("Text file not found"))
+            .then(text => {
+                textContent = text;
+                return fetch(audioFilePath);
+            })
+            .then(response => response.ok ? response.blob() : Promise.reject("Audio file not found"))
+            .then(blob => {
+                let audioUrl = URL.createObjectURL(blob);
+                mouthEnvelope = data.mouth_envelope ? { url: audioUrl, ...data.mouth_envelope } : null;
+                mouthVisemes = null;
+                if (data.visemes_file) {
+                    fetch(window.location.origin + data.visemes_file)
+                        .then(response => response.ok ? response.json() : null)
+                        .then(timeline => { if (timeline) mouthVisemes = { url: audioUrl, phonemes: timeline.phonemes }; })
+                        .catch(error => console.warn("Viseme timeline unavailable:", error));
+                }
 
-            if (!textOutput) {
-                console.error("Missing text output element.");
-                updateStatus("error")
-                return;
-            }
+                const textPrefix = document.getElementById("textDisplay").querySelector("strong");
+                textPrefix.textContent = "Latest Response:";
+                textPrefix.style.removeProperty("color");
+                textOutput.innerText = textContent;
+                document.getElementById("fixedBottom").scrollTop = 0;
 
-            var audioFilePath = window.location.origin + data.audio_file;
-            var textFilePath = audioFilePath.replace(".wav", ".txt");
-            let textContent = '';
-
-            fetch(textFilePath)
-                .then(response => response.ok ? response.text() : Promise.reject("Text file not found"))
-                .then(text => {
-                    textContent = text;
-                    return fetch(audioFilePath);
-                })
-                .then(response => response.ok ? response.blob() : Promise.reject("Audio file not found"))
-                .then(blob => {
-                    let audioUrl = URL.createObjectURL(blob);
-
-                    const textPrefix = document.getElementById("textDisplay").querySelector("strong");
-                    textPrefix.textContent = "Latest Response:";
-                    textPrefix.style.removeProperty("color");
-                    textOutput.innerText = textContent;
-                    document.getElementById("fixedBottom").scrollTop = 0;
-
-                    if (!historySidebar.classList.contains("hidden")) {
-                        document.dispatchEvent(new Event("chatHistoryUpdate"));
-                    }
+                if (!historySidebar.classList.contains("hidden")) {
+                    document.dispatchEvent(new Event("chatHistoryUpdate"));
+                }
 
-                    playAudioLipSync(audioUrl);
-                    updateStatus("received");
+                playAudioLipSync(audioUrl);
+                updateStatus("received");
 
-                    if (!window.appSettings["save-chat-history"]) {
-                        var fileIdMatch = audioFilePath.match(/(\d{19})/);
-                        var fileId = fileIdMatch[0];
-                        socket.send(`ack:${fileId}`);
-                    }
-                })
-                .catch(error => {
-                    console.error("Failed to load files:", error);
-                    textOutput.innerText = "No text response provided by LLM. Please check your connection or try resending your prompt!";
-                    textOutput.innerText += "\nError message: " + error;
-                });
-        }
-    };
+                // Acknowledge playback (used for request tracing, and for deletion in private mode)
+                var fileIdMatch = audioFilePath.match(/(\d{19})/);
+                if (fileIdMatch) {
+                    socket.send(encodeFrame([{ type: "ack", id: fileIdMatch[0] }], socket.protocol));
+                }
+            })
+            .catch(error => {
+                console.error("Failed to load files:", error);
+                textOutput.innerText = "No text response provided by LLM. Please check your connection or try resending your prompt!";
+                textOutput.innerText += "\nError message: " + error;
+            });
+    }
 }
 
 function disconnectWebSocket() {
@@ -387,27 +483,40 @@ function playAudioLipSync(audioUrl) {
     }
     audioPlayer.paused && audioPlayer.play().catch(error => console.error("Audio playback error:", error));
 
-    if (!audioSourceNode) {
-        audioSourceNode = audioContext.createMediaElementSource(audioPlayer);
-        analyser = audioContext.createAnalyser();
-        audioSourceNode.connect(analyser);
-        analyser.connect(audioContext.destination);
-        analyser.fftSize = 512;
-        dataArray = new Uint8Array(analyser.frequencyBinCount);
-    }
-
     function animateMouth() {
-        if (!analyser || !mouthParamId) return;
+        if (!mouthParamId) return;
+
+        // Use the backend's precomputed envelope when there is one, and only analyse the audio in the browser otherwise
+        let maxEnergy;
+        if (mouthEnvelope && audioPlayer.currentSrc === mouthEnvelope.url) {
+            const frame = Math.min(mouthEnvelope.values.length - 1, Math.floor(audioPlayer.currentTime * mouthEnvelope.fps));
+            maxEnergy = mouthEnvelope.values[frame] || 0;
+        } else {
+            if (!audioSourceNode) {
+                audioSourceNode = audioContext.createMediaElementSource(audioPlayer);
+                analyser = audioContext.createAnalyser();
+                audioSourceNode.connect(analyser);
+                analyser.connect(audioContext.destination);
+                analyser.fftSize = 512;
+                dataArray = new Uint8Array(analyser.frequencyBinCount);
+            }
 
-        const startFreq = Math.floor(85 / (audioContext.sampleRate / analyser.fftSize));
-        const endFreq = Math.floor(255 / (audioContext.sampleRate / analyser.fftSize));
+            const startFreq = Math.floor(85 / (audioContext.sampleRate / analyser.fftSize));
+            const endFreq = Math.floor(255 / (audioContext.sampleRate / analyser.fftSize));
 
-        analyser.getByteFrequencyData(dataArray);
-        const maxEnergy = Math.max(...dataArray.slice(startFreq, endFreq));
-        const mouthMovement = window.appSettings["enable-mouth-scaling"]
+            analyser.getByteFrequencyData(dataArray);
+            maxEnergy = Math.max(...dataArray.slice(startFreq, endFreq));
+        }
+        let mouthMovement = window.appSettings["enable-mouth-scaling"]
             ? mouthParamMin + Math.pow(Math.max(0, Math.min(1, maxEnergy / 255)), 1.2) * (mouthParamMax - mouthParamMin)
             : mouthParamMax;
 
+        // Shape the mouth after the phoneme being pronounced, when the response has a viseme timeline
+        const viseme = currentViseme();
+        if (viseme === "MBP" && window.appSettings["enable-mouth-scaling"]) {
+            mouthMovement = mouthParamMin;
+        }
+
         const setMouthParam = (value) => {
             if (typeof model2.internalModel.coreModel.setParameterValueById === "function") {
                 model2.internalModel.coreModel.setParameterValueById(mouthParamId, value);
@@ -415,13 +524,22 @@ function playAudioLipSync(audioUrl) {
                 model2.internalModel.coreModel.setParamFloat("PARAM_MOUTH_OPEN_Y", value);
             }
         };
+        const setMouthForm = (value) => {
+            if (mouthFormParamId && typeof model2.internalModel.coreModel.setParameterValueById === "function") {
+                model2.internalModel.coreModel.setParameterValueById(mouthFormParamId, value);
+            }
+        };
 
         setMouthParam(mouthMovement);
+        if (viseme) {
+            setMouthForm(visemeMouthForms[viseme] ?? 0);
+        }
 
         if (!audioPlayer.paused) {
             requestAnimationFrame(animateMouth);
         } else {
             setMouthParam(0);
+            setMouthForm(0);
             if (window.appSettings["enable-idle-motion"]) {
                 isSpeaking = false;
                 setTimeout(() => modelMotionController.loopIdle(), 3000);
@@ -432,6 +550,20 @@ function playAudioLipSync(audioUrl) {
     requestAnimationFrame(animateMouth);
 }
 
+// Returns the viseme being pronounced in the playing response, or null if it has no viseme timeline
+function currentViseme() {
+    if (!mouthVisemes || audioPlayer.currentSrc !== mouthVisemes.url) return null;
+    const time = audioPlayer.currentTime;
+    const phoneme = mouthVisemes.phonemes.find(p => time >= p.start && time < p.end);
+    return phoneme ? phoneme.viseme : "rest";
+}
+
+function getMouthFormParam(model) {
+    if (!model || !model.internalModel || !model.internalModel.coreModel) return null;
+    const allParams = model.internalModel.coreModel._parameterIds || model.internalModel.coreModel.parameters.ids;
+    return allParams.find(param => ["parammouthform", "param_mouth_form"].includes(param.toLowerCase())) || null;
+}
+
 function getMouthOpenParam(model) {
     if (!model || !model.internalModel || !model.internalModel.coreModel) {
         console.warn("Model is not fully initialized.");
@@ -13,6 +13,7 @@ document.addEventListener("DOMContentLoaded", async function () {
     const enablePromptRepeat = document.getElementById("enablePromptRepeat");
     const enableMouthScaling = document.getElementById("enableMouthScaling");
     const enableVoiceInput = document.getElementById("enableVoiceInput");
+    const streamVoiceInput = document.getElementById("streamVoiceInput");
     const saveChatHistory = document.getElementById("saveChatHistory");
     const adaptiveBg = document.getElementById("adaptiveBg");
     const timeoutInput = document.getElementById("timeoutInput");
@@ -70,6 +71,7 @@ document.addEventListener("DOMContentLoaded", async function () {
         enablePromptRepeat.checked = window.appSettings["enable-prompt-repeat"];
         enableMouthScaling.checked = window.appSettings["enable-mouth-scaling"];
         enableVoiceInput.checked = window.appSettings["enable-voice-input"];
+        streamVoiceInput.checked = window.appSettings["stream-voice-input"];
         saveChatHistory.checked = window.appSettings["save-chat-history"];
         adaptiveBg.checked = window.appSettings["adaptive-background"];
         timeoutInput.value = window.appSettings["timeout"];
@@ -104,6 +106,7 @@ document.addEventListener("DOMContentLoaded", async function () {
                 "enable-prompt-repeat": enablePromptRepeat.checked,
                 "enable-mouth-scaling": enableMouthScaling.checked,
                 "enable-voice-input": enableVoiceInput.checked,
+                "stream-voice-input": streamVoiceInput.checked,
                 "save-chat-history": saveChatHistory.checked,
                 "adaptive-background": adaptiveBg.checked,
                 "timeout": parseInt(timeoutInput.value),
@@ -36,9 +36,7 @@ document.addEventListener("DOMContentLoaded", function () {
             };
         } else if (!window.textMode && window.lastInputVoice) {
             repeatButton.classList.remove("hidden");
-            repeatButton.onclick = () => {
-                sendToBackend(window.lastInputVoice);
-            };
+            repeatButton.onclick = window.repeatVoiceInput;
         } else {
             repeatButton.classList.add("hidden");
         }
@@ -49,6 +47,7 @@ document.addEventListener("DOMContentLoaded", function () {
             "listening": "Listening to Mic",
             "transcribing": "Transcribing Audio",
             "waiting": "Waiting for Response",
+            "queued": "Queued",
             "received": "Response Received",
             "error": "Error",
             "timeout": "Timed Out",
@@ -18,6 +18,16 @@ import { sendToBackend, initHotkey } from './common.js';
     let isRecording = false;
     let stream = null;
     window.lastInputVoice = "";
+    window.lastInputVoiceBlob = null; // Last recording, resent by the repeat button so its transcript comes from the backend's cache
+
+    // Repeat the last voice prompt: resend the recording if there is one (streamed prompts are only kept as text)
+    window.repeatVoiceInput = () => {
+        if (window.lastInputVoiceBlob) {
+            sendAudioToBackend(window.lastInputVoiceBlob);
+        } else {
+            sendToBackend(window.lastInputVoice);
+        }
+    };
 
     // Functions
     async function startRecording() {
@@ -105,6 +115,113 @@ import { sendToBackend, initHotkey } from './common.js';
         updateStatus("listening");
     }
 
+    // Streaming voice input: audio is sent over a WebSocket while the user speaks, so transcription starts immediately
+    let sttSocket = null;
+    let streamContext = null;
+    let streamProcessor = null;
+
+    async function startStreaming() {
+        if (isRecording) return;
+
+        try {
+            if (!stream) {
+                stream = await navigator.mediaDevices.getUserMedia({ audio: true });
+            }
+        } catch (error) {
+            console.error("Microphone access denied:", error);
+            if (error.name === "NotAllowedError" || error.name === "PermissionDeniedError") {
+                alert("Microphone access is blocked. Please enable in your browser settings.");
+            }
+            voiceButton.disabled = true;
+            return;
+        }
+
+        isRecording = true;
+        voiceButton.style.color = "red";
+
+        const wsProtocol = window.location.protocol === "https:" ? "wss://" : "ws://";
+        const socket = new WebSocket(wsProtocol + window.location.hostname + ":11405/ws/stt");
+        let streaming = false;
+        sttSocket = socket;
+
+        // Whisper works at 16 kHz mono, so let the browser resample before anything is sent
+        streamContext = new AudioContext({ sampleRate: 16000 });
+        const source = streamContext.createMediaStreamSource(stream);
+        streamProcessor = streamContext.createScriptProcessor(4096, 1, 1);
+        streamProcessor.onaudioprocess = (event) => {
+            if (!streaming || socket.readyState !== WebSocket.OPEN) return;
+            const input = event.inputBuffer.getChannelData(0);
+            const pcm = new Int16Array(input.length);
+            for (let i = 0; i < input.length; i++) {
+                pcm[i] = Math.max(-1, Math.min(1, input[i])) * 0x7FFF;
+            }
+            socket.send(pcm.buffer);
+        };
+        source.connect(streamProcessor);
+        streamProcessor.connect(streamContext.destination);
+
+        socket.onopen = () => {
+            socket.send(JSON.stringify({ type: "start", rate: streamContext.sampleRate, width: 2, channels: 1 }));
+            streaming = true;
+        };
+        socket.onmessage = (event) => handleStreamMessage(socket, JSON.parse(event.data));
+        socket.onerror = () => updateStatus("error");
+
+        updateStatus("listening");
+    }
+
+    function stopStreaming() {
+        if (!isRecording) return;
+
+        if (streamProcessor) streamProcessor.disconnect();
+        if (streamContext) streamContext.close();
+        streamProcessor = streamContext = null;
+
+        if (sttSocket && sttSocket.readyState === WebSocket.OPEN) {
+            sttSocket.send(JSON.stringify({ type: "stop" }));
+            updateStatus("transcribing");
+        } else {
+            updateStatus("idle");
+        }
+
+        isRecording = false;
+        voiceButton.style.color = "white";
+    }
+
+    function handleStreamMessage(socket, data) {
+        const textPrefix = document.getElementById("textDisplay").querySelector("strong");
+        const textOutput = document.getElementById("textOutput");
+
+        if (data.type === "partial") {
+            textPrefix.textContent = "Hearing:";
+            textPrefix.style.removeProperty("color");
+            textOutput.textContent = data.text;
+        } else if (data.type === "final") {
+            if (window.appSettings["show-sent-prompts"]) {
+                textPrefix.textContent = "Sent Prompt:";
+                textPrefix.style.color = "lightgreen";
+                textOutput.textContent = data.text;
+            }
+            updateStatus("waiting");
+
+            if (window.appSettings["enable-prompt-repeat"] && data.text) {
+                window.lastInputVoice = data.text;
+                window.lastInputVoiceBlob = null;
+                const repeatButton = document.getElementById("repeatButton");
+                if (repeatButton) {
+                    repeatButton.classList.remove("hidden");
+                    repeatButton.onclick = window.repeatVoiceInput;
+                }
+            }
+        } else if (data.type === "submitted" || data.type === "error") {
+            if (!data.success) {
+                console.error("Voice stream error:", data.error);
+                updateStatus("error");
+            }
+            socket.close();
+        }
+    }
+
     function stopRecording() {
         if (mediaRecorder && mediaRecorder.state === "recording") {
             mediaRecorder.stop();
@@ -136,12 +253,11 @@ import { sendToBackend, initHotkey } from './common.js';
 
             if (window.appSettings["enable-prompt-repeat"]) {
                 window.lastInputVoice = result.transcription;
+                window.lastInputVoiceBlob = audioBlob;
                 const repeatButton = document.getElementById("repeatButton");
                 if (repeatButton) {
                     repeatButton.classList.remove("hidden");
-                    repeatButton.onclick = () => {
-                        window.sendToBackend(window.lastInputVoice);
-                    };
+                    repeatButton.onclick = window.repeatVoiceInput;
                 }
             }
         } catch {
@@ -149,15 +265,23 @@ import { sendToBackend, initHotkey } from './common.js';
         }
     }
 
+    function startVoiceInput() {
+        return window.appSettings["stream-voice-input"] ? startStreaming() : startRecording();
+    }
+
+    function stopVoiceInput() {
+        return window.appSettings["stream-voice-input"] ? stopStreaming() : stopRecording();
+    }
+
     // Event Listeners
     voiceButton.addEventListener("pointerdown", (e) => {
         e.preventDefault();
 
         requestAnimationFrame(() => {
-            startRecording();
+            startVoiceInput();
 
             const stop = () => {
-                stopRecording();
+                stopVoiceInput();
                 window.removeEventListener("pointerup", stop);
                 window.removeEventListener("pointercancel", stop);
             };
@@ -169,7 +293,7 @@ import { sendToBackend, initHotkey } from './common.js';
     
     document.addEventListener("keyup", function (event) {
         if (event.key === " " || event.code === "Space") {
-            stopRecording();
+            stopVoiceInput();
         }
     });
 
@@ -181,7 +305,7 @@ import { sendToBackend, initHotkey } from './common.js';
             () => {
                 const isRecording = false;
                 if (!isRecording) {
-                    startRecording();
+                    startVoiceInput();
                 }
             },
         ],
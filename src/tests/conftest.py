@@ -2,13 +2,18 @@
 import pytest
 from fastapi.testclient import TestClient
 from app import app
-from routes.globals import connected_clients
+from routes.globals import connected_clients, transcript_cache
 
 @pytest.fixture(scope="module")
 def client():
     """Creates a test client for the FastAPI app."""
     return TestClient(app)
 
+@pytest.fixture(autouse=True)
+def clear_transcript_cache():
+    """Keeps transcripts cached by one test from answering the voice prompts of another."""
+    transcript_cache.entries.clear()
+
 @pytest.fixture
 def setup_websocket(client):
     """Create WebSocket connection and register the client."""
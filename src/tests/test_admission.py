@@ -0,0 +1,136 @@
+# tests/test_admission.py
+import pytest
+import json
+import asyncio
+from fastapi.websockets import WebSocket
+from unittest.mock import patch, AsyncMock, MagicMock
+from routes import admission
+from routes.admission import AdmissionStage, AdmissionRejected
+from routes.globals import connected_clients
+
+# Test AdmissionStage
+@pytest.mark.asyncio
+async def test_admission_limits_concurrency():
+    """Test that no more than 'concurrency' requests run at once"""
+    stage = AdmissionStage("llm", concurrency=2, max_queue=10)
+    running = peak = 0
+
+    async def worker():
+        nonlocal running, peak
+        async with stage.admit():
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(*(worker() for _ in range(6)))
+
+    assert peak == 2
+    assert stage.active == 0
+    assert stage.waiting == 0
+
+@pytest.mark.asyncio
+async def test_admission_fifo_order():
+    """Test that queued requests are admitted in arrival order"""
+    stage = AdmissionStage("stt", concurrency=1, max_queue=10)
+    order = []
+
+    async def worker(i):
+        async with stage.admit():
+            order.append(i)
+            await asyncio.sleep(0)
+
+    tasks = []
+    for i in range(4):
+        tasks.append(asyncio.create_task(worker(i)))
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+
+    assert order == [0, 1, 2, 3]
+
+@pytest.mark.asyncio
+async def test_admission_rejects_when_queue_full():
+    """Test that requests beyond the queue limit are rejected with a retry-after"""
+    stage = AdmissionStage("llm", concurrency=1, max_queue=1, retry_after=7)
+    release = asyncio.Event()
+
+    async def holder():
+        async with stage.admit():
+            await release.wait()
+
+    first = asyncio.create_task(holder())
+    second = asyncio.create_task(holder())
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejected) as exc_info:
+        async with stage.admit():
+            pass
+
+    assert exc_info.value.retry_after >= 7
+    release.set()
+    await asyncio.gather(first, second)
+
+@pytest.mark.asyncio
+async def test_admission_cancelled_waiter_is_removed():
+    """Test that a cancelled waiter leaves the queue without leaking a slot"""
+    stage = AdmissionStage("stt", concurrency=1, max_queue=5)
+    release = asyncio.Event()
+
+    async def holder():
+        async with stage.admit():
+            await release.wait()
+
+    first = asyncio.create_task(holder())
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(holder())
+    await asyncio.sleep(0)
+    assert stage.waiting == 1
+
+    waiter.cancel()
+    await asyncio.sleep(0)
+    assert stage.waiting == 0
+
+    release.set()
+    await first
+    assert stage.active == 0
+
+@pytest.mark.asyncio
+async def test_broadcast_queue_status_positions():
+    """Test that each client receives its own queue position"""
+    stage = AdmissionStage("llm", concurrency=1, max_queue=5)
+    stage.waiters.append((asyncio.get_running_loop().create_future(), "192.168.1.2"))
+
+    mock_websocket_1 = MagicMock(spec=WebSocket)
+    mock_websocket_1.send_text = AsyncMock()
+    mock_websocket_2 = MagicMock(spec=WebSocket)
+    mock_websocket_2.send_text = AsyncMock()
+    connected_clients.update({(mock_websocket_1, "192.168.1.1"), (mock_websocket_2, "192.168.1.2")})
+
+    await admission.broadcast_queue_status(stage)
+
+    message_1 = json.loads(mock_websocket_1.send_text.call_args[0][0])
+    message_2 = json.loads(mock_websocket_2.send_text.call_args[0][0])
+    assert message_1["type"] == "queue_status"
+    assert message_1["position"] is None
+    assert message_2["position"] == 1
+    assert message_2["waiting"] == 1
+
+    connected_clients.clear()
+
+# Test POST /api/send_prompt when saturated
+def test_send_prompt_rejected(client, setup_websocket):
+    """Test that a saturated LLM stage returns 429 with a Retry-After header"""
+    with patch.object(admission.stages["llm"], "admit", side_effect=AdmissionRejected("llm", 12)):
+        response = client.post("/api/send_prompt", json={"text": "Hello"})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "12"
+    assert response.json()["success"] is False
+
+# Test GET /api/queue_status
+def test_get_queue_status(client):
+    """Test retrieval of the admission queue status"""
+    response = client.get("/api/queue_status")
+
+    assert response.status_code == 200
+    assert set(response.json()) == {"llm", "stt"}
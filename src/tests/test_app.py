@@ -6,7 +6,7 @@ import wave
 import io
 from fastapi.websockets import WebSocket, WebSocketDisconnect
 from routes.globals import connected_clients
-from app import send_voice, send_to_clients
+from app import send_to_clients
 from unittest.mock import patch, AsyncMock, MagicMock
 
 # Test GET /
@@ -27,6 +27,18 @@ def test_send_prompt_empty(client, setup_websocket):
     assert response.status_code == 200
     assert response.json()["success"] is False
 
+def test_send_prompt_webhook_error_hides_url(client, setup_websocket, caplog):
+    """Test that a webhook error status is reported without the webhook URL, which is a credential"""
+    import httpx
+    url = "http://homeassistant.local:8123/api/webhook/secret_id"
+    response = httpx.Response(404, request=httpx.Request("POST", url))
+
+    with patch("httpx.AsyncClient.post", AsyncMock(return_value=response)):
+        result = client.post("/api/send_prompt", json={"text": "Hello"}).json()
+
+    assert result == {"success": False, "error": "Webhook returned 404"}
+    assert "secret_id" not in caplog.text
+
 def test_send_prompt_disconnected(client):
     """Test API response without an active WebSocket connection"""
     response = client.post("/api/send_prompt", json={"text": ""})
@@ -43,53 +55,89 @@ def generate_placeholder_wav():
     return buf.getvalue()
 
 # Test POST /api/send_voice
-@pytest.mark.asyncio
-async def test_send_voice_success(client, setup_websocket):
-    """Test successful audio transcription"""
-    mock_audio_file = MagicMock()
-    mock_audio_file.read = AsyncMock(return_value=generate_placeholder_wav())
+def post_voice(client, wav: bytes):
+    """Sends a recording to /api/send_voice as the frontend does"""
+    return client.post("/api/send_voice", files={"audio": ("input.wav", wav, "audio/wav")})
 
+def test_send_voice_success(client, setup_websocket):
+    """Test successful audio transcription"""
     mock_transcript = MagicMock()
     mock_transcript.text = "Test transcription"
 
-    with patch("app.AsyncTcpClient") as mock_client, \
-         patch("app.Transcript.from_event", return_value=mock_transcript), \
-         patch("app.asyncio.create_subprocess_exec") as mock_ffmpeg:
-
-        mock_ffmpeg.return_value.communicate = AsyncMock(return_value=(b"converted audio", None))
-        mock_ffmpeg.return_value.returncode = 0
+    with patch("wyoming.client.AsyncTcpClient") as mock_client, \
+         patch("wyoming.asr.Transcript.from_event", return_value=mock_transcript):
 
         mock_client.return_value.__aenter__.return_value.write_event = AsyncMock()
         mock_client.return_value.__aenter__.return_value.read_event = AsyncMock(return_value="fake event")
 
-        response = await send_voice(audio=mock_audio_file)
+        response = post_voice(client, generate_placeholder_wav()).json()
 
         assert response["success"] is True
         assert response["transcription"] == "Test transcription"
 
-@pytest.mark.asyncio
-async def test_send_voice_ffmpeg_conversion_failure(client, setup_websocket):
-    """Test FFmpeg failure handling"""
-    mock_audio_file = MagicMock()
-    mock_audio_file.read = AsyncMock(return_value=b"fake audio data")
+def test_send_voice_trims_silence(client, setup_websocket):
+    """Test that silence around the voice prompt is trimmed and reported"""
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(16000)
+        wf.writeframes(b'\x00\x00' * 16000 + b'\x00\x40\x00\xc0' * 4000 + b'\x00\x00' * 16000)
 
-    with patch("app.asyncio.create_subprocess_exec") as mock_ffmpeg:
-        mock_ffmpeg.return_value.communicate = AsyncMock(return_value=(b"", None))
-        mock_ffmpeg.return_value.returncode = 1
+    mock_transcript = MagicMock()
+    mock_transcript.text = "Test transcription"
 
-        response = await send_voice(audio=mock_audio_file)
+    with patch("wyoming.client.AsyncTcpClient") as mock_client, \
+         patch("wyoming.asr.Transcript.from_event", return_value=mock_transcript):
 
-        assert response.status_code == 500
+        mock_client.return_value.__aenter__.return_value.write_event = AsyncMock()
+        mock_client.return_value.__aenter__.return_value.read_event = AsyncMock(return_value="fake event")
 
-@pytest.mark.asyncio
-async def test_send_voice_exception(client, setup_websocket):
-    """Test API response if an exception occurs"""
-    mock_audio_file = MagicMock()
-    mock_audio_file.read = AsyncMock(side_effect=Exception("Unexpected error"))
+        response = post_voice(client, buf.getvalue()).json()
+
+    assert response["success"] is True
+    assert response["trimmed_ms"] > 1500
+    assert response["trimmed_bytes"] > 0
+
+def test_send_voice_cached_transcript(client, setup_websocket):
+    """Test that sending the same recording again is answered from the transcript cache, without contacting Whisper"""
+    mock_transcript = MagicMock()
+    mock_transcript.text = "Test transcription"
+
+    with patch("wyoming.client.AsyncTcpClient") as mock_client, \
+         patch("wyoming.asr.Transcript.from_event", return_value=mock_transcript):
 
-    response = await send_voice(audio=mock_audio_file)
+        mock_client.return_value.__aenter__.return_value.write_event = AsyncMock()
+        mock_client.return_value.__aenter__.return_value.read_event = AsyncMock(return_value="fake event")
+
+        first = post_voice(client, generate_placeholder_wav()).json()
+        second = post_voice(client, generate_placeholder_wav()).json()
+
+    assert mock_client.call_count == 1
+    assert first["cached"] is False and second["cached"] is True
+    assert second["transcription"] == "Test transcription"
+    assert second["trimmed_ms"] == first["trimmed_ms"]
+
+def test_send_voice_invalid_audio(client, setup_websocket):
+    """Test API response if the recording is not a valid .wav file"""
+    response = post_voice(client, b"fake audio data")
+
+    assert response.status_code == 500
+    assert response.json()["success"] is False
+
+def test_send_voice_exception(client, setup_websocket):
+    """Test API response if an exception occurs"""
+    wav = generate_placeholder_wav()
+    with patch("app.wave.open", side_effect=Exception("Unexpected error")):
+        response = post_voice(client, wav)
 
     assert response.status_code == 500
+    assert response.json()["error"] == "Unexpected error"
+
+def test_send_voice_disconnected(client):
+    """Test API response without an active WebSocket connection"""
+    response = post_voice(client, generate_placeholder_wav())
+    assert response.status_code == 403
 
 # Test send_to_clients()
 @pytest.mark.asyncio
@@ -143,3 +191,166 @@ async def test_send_to_clients_exception():
     assert (mock_websocket, "192.168.1.4") not in connected_clients
 
     connected_clients.clear()
+
+# Test WebSocket /ws/stt
+def test_stream_voice_partial_and_final(client, setup_websocket):
+    """Test streaming voice input relays interim transcripts and submits the final transcript"""
+    from wyoming.asr import Transcript, TranscriptChunk
+
+    events = [TranscriptChunk(text="Hello").event(), TranscriptChunk(text=" there").event(), Transcript(text="Hello there").event()]
+
+    with patch("wyoming.client.AsyncTcpClient") as mock_client, \
+         patch("app.forward_prompt", new=AsyncMock(return_value={"success": True, "message": "Sent successfully", "input": "Hello there"})) as mock_forward:
+
+        mock_client.return_value.__aenter__.return_value.write_event = AsyncMock()
+        mock_client.return_value.__aenter__.return_value.read_event = AsyncMock(side_effect=events)
+
+        with client.websocket_connect("/ws/stt") as stt_socket:
+            stt_socket.send_json({"type": "start", "rate": 16000, "width": 2, "channels": 1})
+            stt_socket.send_bytes(b"\x00\x40\x00\xc0" * 1600)
+            messages = [stt_socket.receive_json(), stt_socket.receive_json()]
+            stt_socket.send_json({"type": "stop"})
+            messages += [stt_socket.receive_json(), stt_socket.receive_json()]
+
+    assert messages[0] == {"type": "partial", "text": "Hello"}
+    assert messages[1] == {"type": "partial", "text": "Hello there"}
+    assert messages[2] == {"type": "final", "text": "Hello there"}
+    assert messages[3]["type"] == "submitted" and messages[3]["success"] is True
+    mock_forward.assert_awaited_once_with("Hello there", "testclient")
+
+def test_stream_voice_holds_back_leading_silence(client, setup_websocket):
+    """Test that silent frames before speech are not forwarded beyond the padding"""
+    from wyoming.asr import Transcript
+
+    with patch("wyoming.client.AsyncTcpClient") as mock_client, \
+         patch("app.forward_prompt", new=AsyncMock(return_value={"success": True})):
+
+        write_event = AsyncMock()
+        mock_client.return_value.__aenter__.return_value.write_event = write_event
+        mock_client.return_value.__aenter__.return_value.read_event = AsyncMock(return_value=Transcript(text="Hi").event())
+
+        with client.websocket_connect("/ws/stt") as stt_socket:
+            stt_socket.send_json({"type": "start", "rate": 16000, "width": 2, "channels": 1})
+            for _ in range(20):
+                stt_socket.send_bytes(b"\x00\x00" * 1600)  # 2 seconds of silence in 100 ms frames
+            stt_socket.send_bytes(b"\x00\x40\x00\xc0" * 800)
+            stt_socket.send_json({"type": "stop"})
+            stt_socket.receive_json()
+            stt_socket.receive_json()
+
+    audio_bytes = sum(len(call.args[0].payload or b"") for call in write_event.call_args_list)
+    assert audio_bytes <= 3 * 3200 + 3200
+
+def test_stream_voice_disconnected(client):
+    """Test that streaming requires an active /ws connection"""
+    with client.websocket_connect("/ws/stt") as stt_socket:
+        message = stt_socket.receive_json()
+
+    assert message["type"] == "error"
+
+# Test server_options()
+def test_server_options_defaults():
+    """Test that the server runtime defaults to uvicorn's automatic choice and its usual limits"""
+    from app import server_options
+
+    assert server_options({}) == {
+        "loop": "auto", "http": "auto", "workers": 1, "timeout_keep_alive": 5, "backlog": 2048,
+        "ws_ping_interval": 20.0, "ws_ping_timeout": 20.0, "ws_per_message_deflate": True
+    }
+
+def test_server_options_configured():
+    """Test that configured runtime options are passed to uvicorn"""
+    from app import server_options
+
+    with patch("app.importlib.util.find_spec", return_value=object()):
+        options = server_options({"loop": "uvloop", "http": "httptools", "workers": 2, "keep_alive": 30, "backlog": 64})
+
+    assert options.items() >= {"loop": "uvloop", "http": "httptools", "workers": 2, "timeout_keep_alive": 30, "backlog": 64}.items()
+
+def test_server_options_fall_back_when_not_installed():
+    """Test that requesting uvloop/httptools without them installed falls back to the stock implementations"""
+    from app import server_options
+
+    with patch("app.importlib.util.find_spec", return_value=None):
+        options = server_options({"loop": "uvloop", "http": "httptools", "workers": 0})
+
+    assert (options["loop"], options["http"], options["workers"]) == ("asyncio", "h11", 1)
+    assert server_options({"loop": "tokio"})["loop"] == "auto"
+
+def test_server_options_websocket():
+    """Test that WebSocket keep-alive and compression are passed to uvicorn, with 0 disabling pings"""
+    from app import server_options
+
+    options = server_options({}, {"ping_interval": 0, "ping_timeout": 5, "compression": False})
+
+    assert options["ws_ping_interval"] is None
+    assert options["ws_ping_timeout"] == 5.0
+    assert options["ws_per_message_deflate"] is False
+
+# Test compute_mouth_envelope()
+
+def test_compute_mouth_envelope(tmp_path):
+    """Test that the lip sync envelope of a response covers its whole duration"""
+    from app import compute_mouth_envelope
+
+    wav_path = tmp_path / "1234567890123456789.wav"
+    with wave.open(str(wav_path), "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(22050)
+        wav_file.writeframes((b"\x00\x10" * 20 + b"\x00\xf0" * 20) * 551 + b"\x00\x10" * 10)  # 1 s of a 551 Hz square wave
+
+    envelope = compute_mouth_envelope(str(wav_path))
+
+    assert envelope["fps"] == 30
+    assert len(envelope["values"]) == 30
+    assert min(envelope["values"]) > 0
+
+# Test postprocess_tts()
+
+def test_postprocess_tts_rewrites_response(tmp_path):
+    """Test that a response is normalised and trimmed in place, keeping its wav format"""
+    from app import postprocess_tts
+
+    wav_path = tmp_path / "1234567890123456789.wav"
+    with wave.open(str(wav_path), "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(22050)
+        wav_file.writeframes(b"\x00\x00" * 22050 + (b"\x00\x01" * 20 + b"\x00\xff" * 20) * 551)  # 1 s of silence, then a quiet tone
+
+    with patch("app.metrics.count_tts") as count_tts:
+        report = postprocess_tts(str(wav_path))
+
+    count_tts.assert_not_called()  # Left to the event loop
+    with wave.open(str(wav_path), "rb") as wav_file:
+        assert (wav_file.getframerate(), wav_file.getsampwidth(), wav_file.getnchannels()) == (22050, 2, 1)
+        assert wav_file.getnframes() < 22050 + 22040 - 0.8 * 22050
+    assert report["gain_db"] > 0
+    assert report["trimmed_ms"] > 800
+    assert "processing_ms" in report
+
+def test_postprocess_tts_shifts_visemes(tmp_path):
+    """Test that the viseme timeline of a response stays aligned with its audio once leading silence is trimmed"""
+    from app import postprocess_tts
+
+    wav_path = tmp_path / "1234567890123456789.wav"
+    with wave.open(str(wav_path), "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(22050)
+        wav_file.writeframes(b"\x00\x00" * 22050 + (b"\x00\x10" * 20 + b"\x00\xf0" * 20) * 551)
+    phonemes = [
+        {"start": 0.0, "end": 1.0, "phoneme": "", "viseme": "rest"},
+        {"start": 1.0, "end": 1.5, "phoneme": "a", "viseme": "A"},
+        {"start": 1.5, "end": 2.0, "phoneme": "m", "viseme": "MBP"}
+    ]
+    (tmp_path / "1234567890123456789.visemes.json").write_text(json.dumps({"version": 1, "duration": 2.0, "phonemes": phonemes}))
+
+    report = postprocess_tts(str(wav_path))
+    timeline = json.loads((tmp_path / "1234567890123456789.visemes.json").read_text())
+
+    offset = report["trimmed_start_ms"] / 1000
+    assert offset > 0.8
+    assert [p["viseme"] for p in timeline["phonemes"]] == ["rest", "A", "MBP"]
+    assert timeline["phonemes"][1]["start"] == pytest.approx(1.0 - offset, abs=0.001)
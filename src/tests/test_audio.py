@@ -0,0 +1,178 @@
+# tests/test_audio.py
+import pytest
+import numpy as np
+from routes import audio
+
+RATE = 16000
+
+def tone(ms, rate=RATE, amplitude=0.5, freq=440):
+    """Generate a sine tone as float samples."""
+    t = np.arange(int(rate * ms / 1000)) / rate
+    return amplitude * np.sin(2 * np.pi * freq * t)
+
+def silence(ms, rate=RATE):
+    """Generate digital silence as float samples."""
+    return np.zeros(int(rate * ms / 1000))
+
+def to_pcm16(samples, channels=1):
+    """Encode float samples as interleaved 16-bit PCM."""
+    pcm = (np.clip(samples, -1, 1) * 32767).astype("<i2")
+    return np.repeat(pcm, channels).tobytes()
+
+# Test pcm_to_float()
+def test_pcm_to_float_shapes_channels():
+    """Test decoding of interleaved 16-bit stereo PCM"""
+    samples = audio.pcm_to_float(to_pcm16(tone(10), channels=2), 2, 2)
+
+    assert samples.shape == (160, 2)
+    assert np.allclose(samples[:, 0], samples[:, 1])
+    assert np.abs(samples).max() <= 1.0
+
+# Test trim_silence()
+def test_trim_silence_leading_and_trailing():
+    """Test that leading and trailing silence is trimmed down to the padding"""
+    frames = to_pcm16(np.concatenate([silence(1000), tone(500), silence(1500)]))
+
+    trimmed, report = audio.trim_silence(frames, RATE, 2, 1, threshold_db=-45, frame_ms=20, padding_ms=100, max_pause_ms=0)
+
+    assert len(trimmed) == 2 * RATE * 700 // 1000
+    assert report["trimmed_bytes"] == len(frames) - len(trimmed)
+    assert report["trimmed_ms"] == 2300.0
+    assert report["original_ms"] == 3000.0
+
+def test_trim_silence_shortens_long_pauses():
+    """Test that internal pauses longer than 'max_pause_ms' are shortened"""
+    frames = to_pcm16(np.concatenate([tone(400), silence(3000), tone(400)]))
+
+    trimmed, report = audio.trim_silence(frames, RATE, 2, 1, threshold_db=-45, frame_ms=20, padding_ms=0, max_pause_ms=500)
+
+    assert len(trimmed) == 2 * RATE * 1300 // 1000
+    assert report["trimmed_ms"] == 2500.0
+
+def test_trim_silence_keeps_short_pauses():
+    """Test that pauses shorter than 'max_pause_ms' are kept intact"""
+    frames = to_pcm16(np.concatenate([tone(400), silence(300), tone(400)]))
+
+    trimmed, report = audio.trim_silence(frames, RATE, 2, 1, threshold_db=-45, frame_ms=20, padding_ms=0, max_pause_ms=500)
+
+    assert trimmed == frames
+    assert report["trimmed_bytes"] == 0
+
+def test_trim_silence_all_silent_returns_input():
+    """Test that audio with no detected speech is passed through unchanged"""
+    frames = to_pcm16(silence(1000))
+
+    trimmed, report = audio.trim_silence(frames, RATE, 2, 1, threshold_db=-45)
+
+    assert trimmed == frames
+    assert report["trimmed_bytes"] == 0
+
+def test_trim_silence_stereo_keeps_frame_alignment():
+    """Test that trimmed stereo audio still contains whole sample frames"""
+    frames = to_pcm16(np.concatenate([silence(500), tone(300), silence(500)]), channels=2)
+
+    trimmed, _ = audio.trim_silence(frames, RATE, 2, 2, threshold_db=-45, frame_ms=20, padding_ms=40, max_pause_ms=0)
+
+    assert len(trimmed) % 4 == 0
+    assert len(trimmed) == 4 * RATE * 380 // 1000
+
+# Test to_whisper_format()
+def test_to_whisper_format_passthrough():
+    """Test that audio already at 16 kHz mono 16-bit is returned untouched"""
+    frames = to_pcm16(tone(100))
+
+    assert audio.to_whisper_format(frames, RATE, 2, 1) == (frames, RATE, 2, 1)
+
+@pytest.mark.parametrize("src_rate", [44100, 48000, 22050, 8000])
+def test_to_whisper_format_preserves_speech_band(src_rate):
+    """Test that a 1 kHz stereo tone survives resampling/downmixing with high SNR"""
+    frames = to_pcm16(tone(1000, rate=src_rate, freq=1000), channels=2)
+
+    converted, rate, width, channels = audio.to_whisper_format(frames, src_rate, 2, 2)
+    result = audio.pcm_to_float(converted, 2, 1)[:, 0]
+    expected = tone(1000, rate=RATE, freq=1000)[:len(result)]
+
+    # Ignore the filter edges, where the signal starts and stops abruptly
+    error = (result - expected)[200:-200]
+    snr_db = 10 * np.log10(np.sum(expected[200:-200] ** 2) / np.sum(error ** 2))
+
+    assert (rate, width, channels) == (16000, 2, 1)
+    assert abs(len(result) - RATE) <= 1
+    assert snr_db > 35
+
+def test_to_whisper_format_suppresses_aliasing():
+    """Test that content above 8 kHz is filtered out instead of folding into the speech band"""
+    frames = to_pcm16(tone(1000, rate=48000, freq=12000))
+
+    converted, _, _, _ = audio.to_whisper_format(frames, 48000, 2, 1)
+    result = audio.pcm_to_float(converted, 2, 1)[200:-200, 0]
+
+    assert np.sqrt(np.mean(result ** 2)) < 0.005
+
+# Test mouth_envelope()
+def test_mouth_envelope_follows_speech():
+    """Test that the mouth is closed during silence and opens while speech-band audio plays"""
+    frames = to_pcm16(np.concatenate([silence(500), tone(500, freq=600), silence(500), tone(500, amplitude=0.1, freq=600)]))
+
+    values = np.array(audio.mouth_envelope(frames, RATE, 2, 1, fps=20, band_hz=(300, 3000), threshold_db=-45))
+
+    assert len(values) == 40
+    assert values.dtype.kind == "i" and values.min() >= 0 and values.max() <= 255
+    assert not values[:10].any() and not values[20:30].any()
+    assert (values[11:19] > 200).all()
+    assert (0 < values[31:39]).all() and (values[31:39] < values[11:19].min()).all()
+
+def test_mouth_envelope_ignores_energy_outside_band():
+    """Test that a tone outside the speech band opens the mouth less than one inside it"""
+    frames = to_pcm16(np.concatenate([tone(500, freq=1000), tone(500, freq=100)]))
+
+    values = np.array(audio.mouth_envelope(frames, RATE, 2, 1, fps=20, band_hz=(300, 3000), threshold_db=-45))
+
+    assert values[2:8].mean() > 2 * values[12:18].mean()
+
+def test_mouth_envelope_silent_or_unsupported():
+    """Test that silent audio gives a closed mouth, and unsupported formats no envelope"""
+    assert audio.mouth_envelope(to_pcm16(silence(100)), RATE, 2, 1, fps=20) == [0, 0]
+    assert audio.mouth_envelope(b"\x00" * 30, RATE, 3, 1, fps=20) == []
+
+# Test normalize_loudness()
+@pytest.mark.parametrize("rate", [48000, 22050])
+def test_normalize_loudness_measures_reference_tone(rate):
+    """Test that a full-scale 997 Hz sine measures about -3 LUFS (ITU-R BS.1770) and is brought to the target"""
+    frames = to_pcm16(tone(3000, rate=rate, amplitude=1.0, freq=997))
+
+    processed, report = audio.normalize_loudness(frames, rate, 2, 1, target_lufs=-16, peak_db=0, silence_db=-60)
+    _, remeasured = audio.normalize_loudness(processed, rate, 2, 1, target_lufs=-16, peak_db=0, silence_db=-60)
+
+    assert report["input_lufs"] == pytest.approx(-3.0, abs=0.2)
+    assert report["gain_db"] == pytest.approx(-13.0, abs=0.2)
+    assert remeasured["input_lufs"] == pytest.approx(-16.0, abs=0.2)
+
+def test_normalize_loudness_trims_silence():
+    """Test that leading and trailing silence is trimmed down to the padding"""
+    frames = to_pcm16(np.concatenate([silence(700), tone(1000, amplitude=0.1), silence(500)]))
+
+    processed, report = audio.normalize_loudness(frames, RATE, 2, 1, silence_db=-60, padding_ms=100)
+
+    assert report["original_ms"] == 2200.0
+    assert report["trimmed_ms"] == pytest.approx(1000, abs=20)
+    assert len(processed) == len(frames) - report["trimmed_ms"] * RATE * 2 // 1000
+
+def test_normalize_loudness_limits_gain_and_peak():
+    """Test that quiet audio is not boosted beyond 'max_gain_db', and peaks stay below 'peak_db'"""
+    quiet = to_pcm16(tone(1000, amplitude=0.001))
+    _, report = audio.normalize_loudness(quiet, RATE, 2, 1, target_lufs=-16, max_gain_db=20)
+    assert report["gain_db"] == 20.0
+
+    spiky = to_pcm16(np.concatenate([tone(1000, amplitude=0.01), np.ones(10), tone(1000, amplitude=0.01)]))
+    processed, _ = audio.normalize_loudness(spiky, RATE, 2, 1, target_lufs=-16, peak_db=-1, max_gain_db=40)
+    assert np.abs(audio.pcm_to_float(processed, 2, 1)).max() <= 10 ** (-1 / 20) + 1e-4
+
+def test_normalize_loudness_silent_returns_input():
+    """Test that silent audio is passed through unchanged"""
+    frames = to_pcm16(silence(500))
+
+    processed, report = audio.normalize_loudness(frames, RATE, 2, 1)
+
+    assert processed == frames
+    assert report["input_lufs"] is None
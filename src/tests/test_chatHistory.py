@@ -183,4 +183,74 @@ def test_secure_delete_oserror(temp_file):
          patch("builtins.print") as mock_print:
         utils.secure_delete(temp_file)
     
-    mock_print.assert_called_with(f"Error securely deleting {temp_file}: File modification error")
\ No newline at end of file
+    mock_print.assert_called_with(f"Error securely deleting {temp_file}: File modification error")
+
+def test_secure_delete_overwrites_in_chunks(tmp_path):
+    """Test that files larger than the buffer are fully overwritten before removal"""
+    test_file = tmp_path / "large.wav"
+    original = b"A" * 10_000
+    test_file.write_bytes(original)
+    deleter = utils.SecureDeleter(passes=2, buffer_size=1024)
+
+    with patch("routes.utils.os.remove") as mock_remove:
+        errors = deleter.delete_files([str(test_file)])
+
+    overwritten = test_file.read_bytes()
+    assert errors == {}
+    assert len(overwritten) == len(original)
+    assert overwritten != original
+    mock_remove.assert_called_once_with(str(test_file))
+
+def test_secure_delete_batches_syncs(tmp_path):
+    """Test that each file is synced once per pass, without syncing the whole system, and all files are removed"""
+    paths = []
+    for i in range(5):
+        path = tmp_path / f"{i}.txt"
+        path.write_bytes(b"secret" * 100)
+        paths.append(str(path))
+    deleter = utils.SecureDeleter(passes=3, batch_size=2)
+
+    with patch("routes.utils.os.sync") as mock_sync, patch("routes.utils.os.fsync") as mock_fsync:
+        errors = deleter.delete_files(paths + [str(tmp_path / "missing.txt")])
+
+    assert errors == {}
+    assert mock_fsync.call_count == 3 * 5  # 3 passes for each of the 5 files, in groups of 2 + 2 + 1
+    mock_sync.assert_not_called()
+    assert not any(os.path.exists(path) for path in paths)
+
+@pytest.mark.asyncio
+async def test_process_chat_history_delete_files():
+    """Test securely deleting real chat history files"""
+    filenames = ["9999999999999999901.txt", "9999999999999999901.wav"]
+    for name in filenames:
+        with open(os.path.join("output", name), "wb") as f:
+            f.write(b"data")
+
+    try:
+        response = await chatHistory.process_chat_history("delete", filenames)
+    finally:
+        for name in filenames:
+            if os.path.exists(os.path.join("output", name)):
+                os.remove(os.path.join("output", name))
+
+    assert response["success"] is True
+    assert response["message"] == "Deleted 2 chat history files (1 .wav, 1 .txt)."
+
+@pytest.mark.asyncio
+async def test_process_chat_history_deletes_sidecars():
+    """Test that a response's viseme timeline is deleted with its .txt file, without being counted"""
+    names = ["9999999999999999902.txt", "9999999999999999902.wav", "9999999999999999902.visemes.json"]
+    for name in names:
+        with open(os.path.join("output", name), "wb") as f:
+            f.write(b"data")
+
+    try:
+        response = await chatHistory.process_chat_history("delete", names[:2])
+        remaining = [name for name in names if os.path.exists(os.path.join("output", name))]
+    finally:
+        for name in names:
+            if os.path.exists(os.path.join("output", name)):
+                os.remove(os.path.join("output", name))
+
+    assert remaining == []
+    assert response["message"] == "Deleted 2 chat history files (1 .wav, 1 .txt)."
@@ -0,0 +1,76 @@
+# tests/test_deletions.py
+from unittest.mock import patch, AsyncMock
+from routes.deletions import DeletionLedger
+
+# Test DeletionLedger
+def test_acknowledge_all_expected_clients():
+    """Test that an entry is released once every expected client acknowledged it"""
+    ledger = DeletionLedger()
+    ledger.add("1", ["1.wav", "1.txt"], {"192.168.1.1", "192.168.1.2"})
+
+    assert ledger.acknowledge("1", "192.168.1.1") is None
+    assert ledger.acknowledge("1", "192.168.1.2") == ["1.wav", "1.txt"]
+    assert "1" not in ledger
+
+def test_acknowledge_ignores_unexpected_clients():
+    """Test that acks from clients the response was not sent to do not count"""
+    ledger = DeletionLedger()
+    ledger.add("1", ["1.wav"], {"192.168.1.1", "192.168.1.2"})
+
+    assert ledger.acknowledge("1", "192.168.1.9") is None
+    assert ledger.acknowledge("1", "192.168.1.1") is None
+    assert "1" in ledger
+
+def test_add_without_clients_is_due_immediately():
+    """Test that responses broadcast to nobody are not kept"""
+    ledger = DeletionLedger()
+
+    assert ledger.add("1", ["1.wav"], set()) == [("1", ["1.wav"])]
+    assert len(ledger) == 0
+
+def test_forget_client_releases_entries():
+    """Test that a client disconnecting before acking no longer blocks deletion"""
+    ledger = DeletionLedger()
+    ledger.add("1", ["1.wav"], {"192.168.1.1", "192.168.1.2"})
+    ledger.add("2", ["2.wav"], {"192.168.1.2", "192.168.1.3"})
+    ledger.acknowledge("1", "192.168.1.1")
+
+    assert ledger.forget_client("192.168.1.2") == [("1", ["1.wav"])]
+    assert "2" in ledger
+
+def test_expired_entries():
+    """Test that entries past their TTL are released"""
+    ledger = DeletionLedger(ttl=10)
+    with patch("routes.deletions.time.monotonic", return_value=100):
+        ledger.add("1", ["1.wav"], {"192.168.1.1"})
+    with patch("routes.deletions.time.monotonic", return_value=105):
+        ledger.add("2", ["2.wav"], {"192.168.1.1"})
+
+    assert ledger.expired(now=109) == []
+    assert ledger.expired(now=110) == [("1", ["1.wav"])]
+    assert len(ledger) == 1
+
+def test_max_entries_evicts_oldest():
+    """Test that the ledger is bounded"""
+    ledger = DeletionLedger(max_entries=2)
+    ledger.add("1", ["1.wav"], {"192.168.1.1"})
+    ledger.add("2", ["2.wav"], {"192.168.1.1"})
+
+    assert ledger.add("3", ["3.wav"], {"192.168.1.1"}) == [("1", ["1.wav"])]
+    assert len(ledger) == 2
+
+# Test WebSocket acknowledgement handling
+def test_ack_deletes_files_in_private_mode(client):
+    """Test that the last expected ack on /ws triggers deletion"""
+    from routes.globals import pending_deletions
+
+    pending_deletions.add("1234567890123456789", ["/output/1234567890123456789.wav"], {"testclient"})
+
+    with patch("routes.clients.SAVE_CHAT_HISTORY", False), \
+         patch("routes.clients.delete_responses", new=AsyncMock()) as mock_delete:
+        with client.websocket_connect("/ws") as websocket:
+            websocket.send_text("ack:1234567890123456789")
+            websocket.send_text("flush")
+
+    mock_delete.assert_any_await([("1234567890123456789", ["/output/1234567890123456789.wav"])])
+    assert "1234567890123456789" not in pending_deletions
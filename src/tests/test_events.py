@@ -0,0 +1,124 @@
+# tests/test_events.py
+import json
+import pytest
+import asyncio
+import msgpack
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi.websockets import WebSocket
+from routes import events
+from routes.globals import connected_clients
+from routes.utils import send_to_clients
+
+def test_negotiate():
+    """Test that MessagePack is preferred, JSON is the fallback, and other clients use the legacy protocol"""
+    assert events.negotiate(["vchaos.v1.json", "vchaos.v1.msgpack"]) == "vchaos.v1.msgpack"
+    assert events.negotiate(["vchaos.v1.json"]) == "vchaos.v1.json"
+    assert events.negotiate(["vchaos.v2.msgpack"]) is None
+    assert events.negotiate([]) is None
+
+    with patch.object(events, "MSGPACK_AVAILABLE", False):
+        assert events.negotiate(["vchaos.v1.msgpack", "vchaos.v1.json"]) == "vchaos.v1.json"
+
+def test_encode_decode_roundtrip():
+    """Test that frames are versioned, and decode into the events they contain"""
+    batch = [{"type": "ack", "id": "1234567890123456789"}, {"type": "ack", "id": "1234567890123456790"}]
+
+    binary = events.encode(batch, "msgpack")
+    assert msgpack.unpackb(binary) == {"v": 1, "events": batch}
+    assert events.decode({"bytes": binary}, "msgpack") == batch
+
+    text = events.encode(batch, "json")
+    assert json.loads(text) == {"v": 1, "events": batch}
+    assert events.decode({"text": text}, "json") == batch
+
+def test_decode_drops_invalid_events():
+    """Test that malformed frames, other versions, unknown types and events missing fields are dropped"""
+    assert events.decode({"bytes": b"\xc1"}, "msgpack") == []
+    assert events.decode({"text": "not json"}, "json") == []
+    assert events.decode({"text": json.dumps({"v": 2, "events": [{"type": "ack", "id": "1"}]})}, "json") == []
+
+    frame = {"v": 1, "events": [{"type": "unknown"}, {"type": "ack"}, "ack", {"type": "ack", "id": "1"}]}
+    assert events.decode({"text": json.dumps(frame)}, "json") == [{"type": "ack", "id": "1"}]
+
+def test_decode_legacy():
+    """Test that legacy 'ack:<id>' messages are decoded into ack events"""
+    assert events.decode({"text": "ack:1234567890123456789"}, None) == [{"type": "ack", "id": "1234567890123456789"}]
+    assert events.decode({"text": "hello"}, None) == []
+    assert events.decode({"bytes": b"\xff\xff"}, None) == []
+
+def test_encode_legacy():
+    """Test that legacy clients receive the messages they always did"""
+    assert events.encode_legacy({"type": "disconnect"}) == "disconnect_client"
+    assert json.loads(events.encode_legacy({"type": "new_audio", "audio_file": "/output/a.wav"})) == {"type": "new_audio", "audio_file": "/output/a.wav"}
+
+@pytest.mark.asyncio
+async def test_session_batches_events():
+    """Test that events sent within the batch window are sent as one frame"""
+    websocket = MagicMock(spec=WebSocket)
+    websocket.send_bytes = AsyncMock()
+    session = events.Session(websocket, "192.168.1.20", "msgpack", batch_window=0.02)
+
+    session.send({"type": "queue_status", "stage": "llm", "position": 1})
+    session.send({"type": "queue_status", "stage": "llm", "position": None})
+    session.send({"type": "new_audio", "audio_file": "/output/a.wav"})
+    await asyncio.sleep(0.05)
+
+    websocket.send_bytes.assert_called_once()
+    frame = msgpack.unpackb(websocket.send_bytes.call_args.args[0])
+    assert [event["type"] for event in frame["events"]] == ["queue_status", "queue_status", "new_audio"]
+
+@pytest.mark.asyncio
+async def test_session_drops_unreachable_client():
+    """Test that a client whose frame cannot be sent is removed from the connected clients"""
+    websocket = MagicMock(spec=WebSocket)
+    websocket.send_text = AsyncMock(side_effect=RuntimeError("closed"))
+    session = events.sessions[websocket] = events.Session(websocket, "192.168.1.21", "json")
+    connected_clients.add((websocket, "192.168.1.21"))
+
+    session.send({"type": "disconnect"})
+    await session.flush()
+
+    assert (websocket, "192.168.1.21") not in connected_clients
+    assert websocket not in events.sessions
+
+@pytest.mark.asyncio
+async def test_send_to_clients_mixed_protocols():
+    """Test that a broadcast reaches legacy clients as JSON text and event protocol clients in their encoding"""
+    legacy = MagicMock(spec=WebSocket)
+    legacy.send_text = AsyncMock()
+    modern = MagicMock(spec=WebSocket)
+    modern.send_bytes = AsyncMock()
+    session = events.sessions[modern] = events.Session(modern, "192.168.1.23", "msgpack")
+    connected_clients.update({(legacy, "192.168.1.22"), (modern, "192.168.1.23")})
+
+    try:
+        notification = {"type": "new_audio", "audio_file": "/output/1234567890123456789.wav"}
+        await send_to_clients(notification)
+        await session.flush()
+
+        legacy.send_text.assert_called_once_with(json.dumps(notification))
+        assert msgpack.unpackb(modern.send_bytes.call_args.args[0]) == {"v": 1, "events": [notification]}
+    finally:
+        events.sessions.pop(modern, None)
+        connected_clients.clear()
+
+def test_websocket_negotiates_msgpack(client):
+    """Test that /ws accepts the MessagePack subprotocol and handles acknowledgements sent as events"""
+    with patch("routes.clients.state.backend.publish", new=AsyncMock()) as publish:
+        with client.websocket_connect("/ws", subprotocols=["vchaos.v1.msgpack", "vchaos.v1.json"]) as websocket:
+            assert websocket.accepted_subprotocol == "vchaos.v1.msgpack"
+            websocket.send_bytes(events.encode([{"type": "ack", "id": "1234567890123456789"}], "msgpack"))
+            websocket.send_text("ack:ignored")  # Legacy messages are not part of the event protocol
+
+        acks = [call.args for call in publish.call_args_list if call.args[0] == "ack"]
+        assert acks == [("ack", {"file_id": "1234567890123456789", "ip": "testclient"})]
+
+def test_websocket_legacy_protocol(client):
+    """Test that clients without a subprotocol keep using the text protocol"""
+    with patch("routes.clients.state.backend.publish", new=AsyncMock()) as publish:
+        with client.websocket_connect("/ws") as websocket:
+            assert websocket.accepted_subprotocol is None
+            websocket.send_text("ack:1234567890123456789")
+
+        acks = [call.args for call in publish.call_args_list if call.args[0] == "ack"]
+        assert acks == [("ack", {"file_id": "1234567890123456789", "ip": "testclient"})]
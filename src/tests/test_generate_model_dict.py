@@ -0,0 +1,98 @@
+# tests/test_generate_model_dict.py
+import pytest
+import os
+import json
+from unittest.mock import patch
+import generate_model_dict as generator
+
+def make_model(base_dir, folder, name, motions, cubism=3):
+    """Create a minimal Live2D model directory with the given motion groups."""
+    runtime = base_dir / folder / "runtime" if cubism == 3 else base_dir / folder
+    (runtime / "motion").mkdir(parents=True)
+    (runtime / "motion" / "idle.motion3.json").write_text("{}")
+    if cubism == 3:
+        model_file = runtime / f"{name}.model3.json"
+        model_file.write_text(json.dumps({"Version": 3, "FileReferences": {"Moc": f"{name}.moc3", "Motions": motions}}))
+    else:
+        model_file = runtime / f"{name}.model.json"
+        model_file.write_text(json.dumps({"model": f"{name}.moc", "motions": motions}))
+    return model_file
+
+@pytest.fixture
+def paths(tmp_path):
+    """Temporary Live2D directory, model dictionary and manifest."""
+    base_dir = tmp_path / "live2d_models"
+    base_dir.mkdir()
+    return base_dir, str(tmp_path / "model_dict.json"), str(tmp_path / "model_manifest.json")
+
+def run(paths):
+    base_dir, model_dict_file, manifest_file = paths
+    return generator.generate_model_dict(str(base_dir), model_dict_file, manifest_file)
+
+# Test pick_motion()
+def test_pick_motion_preference_order():
+    """Test exact, prefix, unnamed and first group fallbacks"""
+    assert generator.pick_motion({"Flick": [1], "Idle": [1, 2, 3]}, "idle") == ("Idle", 3)
+    assert generator.pick_motion({"Flick": [1], "Tap@Body": [1, 2]}, "tap") == ("Tap@Body", 2)
+    assert generator.pick_motion({"": [1] * 27}, "tap") == ("", 27)
+    assert generator.pick_motion({"Shake": [1]}, "idle") == ("Shake", 1)
+    assert generator.pick_motion({}, "idle") == ("idle", 1)
+
+# Test generate_model_dict()
+def test_generate_reads_real_motion_groups(paths):
+    """Test that new models are added with the motion groups from their model files"""
+    base_dir, model_dict_file, _ = paths
+    make_model(base_dir, "hiyori", "hiyori_free_t08", {"Idle": [{}, {}, {}], "Tap": [{}], "Tap@Body": [{}]})
+    make_model(base_dir, "shizuku", "shizuku", {"idle": [{}, {}], "tap_body": [{}, {}, {}]}, cubism=2)
+
+    added = run(paths)
+    model_dict = json.load(open(model_dict_file))
+
+    assert [m["name"] for m in added] == ["hiyori_free_t08", "shizuku"]
+    assert model_dict[0]["file_path"] == f"{base_dir}/hiyori/runtime/hiyori_free_t08.model3.json".replace(os.sep, "/")
+    assert (model_dict[0]["idleMotion"], model_dict[0]["idleMotionCount"]) == ("Idle", 3)
+    assert (model_dict[0]["tapMotion"], model_dict[0]["tapMotionCount"]) == ("Tap", 1)
+    assert (model_dict[1]["tapMotion"], model_dict[1]["tapMotionCount"]) == ("tap_body", 3)
+
+def test_generate_keeps_existing_entries(paths):
+    """Test that manually tuned entries are neither duplicated nor overwritten"""
+    base_dir, model_dict_file, _ = paths
+    model_file = make_model(base_dir, "haru", "haru", {"": [{}] * 27})
+    tuned = {"name": "haru", "file_path": str(model_file).replace(os.sep, "/"), "kScale": 0.25, "idleMotion": "", "tapMotion": ""}
+    with open(model_dict_file, "w") as f:
+        json.dump([tuned], f)
+
+    assert run(paths) == []
+    assert json.load(open(model_dict_file)) == [tuned]
+
+def test_generate_skips_unchanged_directories(paths):
+    """Test that unchanged model directories are not walked or parsed again"""
+    base_dir, _, _ = paths
+    make_model(base_dir, "haru", "haru", {"Idle": [{}]})
+    run(paths)
+
+    with patch.object(generator, "scan_model_dir", side_effect=AssertionError("rescanned")), \
+         patch.object(generator, "parse_model", side_effect=AssertionError("reparsed")):
+        assert run(paths) == []
+
+def test_generate_picks_up_new_models(paths):
+    """Test that models added after a previous scan are found, as in watch mode"""
+    base_dir, model_dict_file, _ = paths
+    make_model(base_dir, "haru", "haru", {"Idle": [{}]})
+    run(paths)
+
+    make_model(base_dir, "hiyori", "hiyori", {"Idle": [{}]})
+    added = run(paths)
+
+    assert [m["name"] for m in added] == ["hiyori"]
+    assert len(json.load(open(model_dict_file))) == 2
+
+def test_generate_invalid_model_file_uses_defaults(paths):
+    """Test that an unreadable model file still gets an entry with default motions"""
+    base_dir, _, _ = paths
+    model_file = make_model(base_dir, "broken", "broken", {})
+    model_file.write_text("invalid json")
+
+    added = run(paths)
+
+    assert (added[0]["idleMotion"], added[0]["tapMotion"]) == ("idle", "tap")
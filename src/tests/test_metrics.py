@@ -0,0 +1,68 @@
+# tests/test_metrics.py
+from unittest.mock import patch
+from routes import metrics
+from routes.metrics import StageMetrics, BUCKETS
+from routes.globals import connected_clients
+
+# Test StageMetrics
+def test_stage_metrics_observe():
+    """Test that observations land in the correct histogram bucket"""
+    stage = StageMetrics("test", "Test stage")
+    stage.observe(0.0005)
+    stage.observe(0.3)
+    stage.observe(10_000)
+
+    assert stage.count == 3
+    assert stage.bucket_counts[0] == 1
+    assert stage.bucket_counts[BUCKETS.index(0.5)] == 1
+    assert stage.bucket_counts[-1] == 1
+
+def test_begin_end_tracks_in_flight_and_errors():
+    """Test that begin/end update the in-flight gauge and error counter"""
+    stage = metrics.stages["webhook"]
+    count, errors = stage.count, stage.errors
+
+    started = metrics.begin("webhook")
+    assert stage.in_flight == 1
+    metrics.end("webhook", started, failed=True)
+
+    assert stage.in_flight == 0
+    assert stage.count == count + 1
+    assert stage.errors == errors + 1
+
+def test_render_histogram_is_cumulative():
+    """Test that the rendered histogram buckets are cumulative and end with +Inf"""
+    with patch.dict(metrics.stages, {"webhook": StageMetrics("webhook", "Test stage")}, clear=True):
+        metrics.stages["webhook"].observe(0.002)
+        metrics.stages["webhook"].observe(0.2)
+        body = metrics.render()
+
+    assert 'vchaos_stage_duration_seconds_bucket{stage="webhook",le="0.001"} 0' in body
+    assert 'vchaos_stage_duration_seconds_bucket{stage="webhook",le="0.005"} 1' in body
+    assert 'vchaos_stage_duration_seconds_bucket{stage="webhook",le="600.0"} 2' in body
+    assert 'vchaos_stage_duration_seconds_bucket{stage="webhook",le="+Inf"} 2' in body
+    assert 'vchaos_stage_duration_seconds_count{stage="webhook"} 2' in body
+
+# Test GET /metrics
+def test_metrics_endpoint(client):
+    """Test the Prometheus metrics endpoint"""
+    connected_clients.clear()
+    connected_clients.update({(None, "192.168.1.1"), (None, "192.168.1.2")})
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "vchaos_connected_clients 2" in response.text
+    assert 'vchaos_stage_in_flight{stage="whisper"}' in response.text
+    assert 'vchaos_admission_waiting{stage="llm"}' in response.text
+
+    connected_clients.clear()
+
+def test_history_listing_is_timed(client, setup_websocket):
+    """Test that listing chat history records a 'history' observation"""
+    count = metrics.stages["history"].count
+    with patch("os.listdir", return_value=[]):
+        client.get("/api/get_history")
+
+    assert metrics.stages["history"].count == count + 1
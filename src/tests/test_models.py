@@ -0,0 +1,244 @@
+# tests/test_models.py
+import io
+import pytest
+import os
+import gzip
+import json
+from unittest.mock import patch, AsyncMock, MagicMock
+from PIL import Image
+from routes import models, settings, textures, metrics
+
+@pytest.fixture(autouse=True)
+def reset_bundles():
+    """Forget built bundles between tests."""
+    models.bundles.clear()
+    models.bundle_files.clear()
+    yield
+    models.bundles.clear()
+    models.bundle_files.clear()
+    settings.models_response.invalidate()
+    settings.settings_response.invalidate()
+
+@pytest.fixture
+def model_file(tmp_path):
+    """Create a small Live2D model directory."""
+    runtime = tmp_path / "live2d_models" / "haru" / "runtime"
+    (runtime / "motion").mkdir(parents=True)
+    (runtime / "haru.model3.json").write_text(json.dumps({"Version": 3, "FileReferences": {"Moc": "haru.moc3"}}))
+    (runtime / "haru.moc3").write_bytes(b"\x00\x01" * 100)
+    (runtime / "motion" / "idle.motion3.json").write_text("{}")
+    (runtime / ".DS_Store").write_bytes(b"junk")
+    return str(runtime / "haru.model3.json")
+
+# Test build_bundle()
+def test_build_bundle_packs_model_directory(model_file, tmp_path):
+    """Test that a bundle contains every (non-hidden) model file under paths relative to the model file"""
+    filename = models.build_bundle(model_file, str(tmp_path / "bundles"))["original"]
+
+    with open(models.bundle_files[filename]["path"], "rb") as f:
+        files = models.unpack(gzip.decompress(f.read()))
+
+    assert filename.startswith("haru.") and filename.endswith(".bundle")
+    assert sorted(files) == ["haru.moc3", "haru.model3.json", "motion/idle.motion3.json"]
+    assert files["haru.moc3"] == b"\x00\x01" * 100
+
+def test_build_bundle_url_follows_content(model_file, tmp_path):
+    """Test that the URL only changes when the model's content changes"""
+    bundle_dir = str(tmp_path / "bundles")
+    first = models.build_bundle(model_file, bundle_dir)["original"]
+    models.bundles.clear()
+
+    assert models.build_bundle(model_file, bundle_dir)["original"] == first
+
+    with open(os.path.join(os.path.dirname(model_file), "haru.moc3"), "ab") as f:
+        f.write(b"\x02")
+    assert models.build_bundle(model_file, bundle_dir)["original"] != first
+
+def test_build_bundles_removes_stale_bundles(model_file, tmp_path):
+    """Test that bundles of previous versions are cleaned up"""
+    bundle_dir = str(tmp_path / "bundles")
+    first = models.build_bundle(model_file, bundle_dir)["original"]
+    with open(model_file, "a") as f:
+        f.write(" ")
+
+    models.build_bundles([model_file], bundle_dir)
+
+    assert first not in os.listdir(bundle_dir)
+    assert first not in models.bundle_files
+    assert len([filename for filename in os.listdir(bundle_dir) if filename.endswith(".bundle")]) == 1
+
+# Test texture variants
+@pytest.fixture
+def textured_model_file(model_file):
+    """Add a 64 px RGBA texture to the model."""
+    runtime = os.path.dirname(model_file)
+    os.makedirs(os.path.join(runtime, "haru.2048"))
+    Image.new("RGBA", (64, 64), (255, 0, 0, 128)).save(os.path.join(runtime, "haru.2048", "texture_00.png"))
+    with open(model_file, "w") as f:
+        json.dump({"Version": 3, "FileReferences": {"Moc": "haru.moc3", "Textures": ["haru.2048/texture_00.png"]}}, f)
+    return model_file
+
+def test_build_bundle_texture_variants(textured_model_file, tmp_path):
+    """Test that variants carry downscaled WebP textures and settings pointing at them"""
+    with patch.dict(textures.VARIANTS, {"webp": None, "1024": 32, "512": 16}, clear=True):
+        variants = models.build_bundle(textured_model_file, str(tmp_path / "bundles"))
+
+    with open(models.bundle_files[variants["512"]]["path"], "rb") as f:
+        files = models.unpack(gzip.decompress(f.read()))
+    settings_json = json.loads(files["haru.model3.json"])
+
+    assert sorted(variants) == ["1024", "512", "original", "webp"]
+    assert settings_json["FileReferences"]["Textures"] == ["haru.2048/texture_00.512.webp"]
+    assert "haru.2048/texture_00.png" not in files
+    with Image.open(io.BytesIO(files["haru.2048/texture_00.512.webp"])) as image:
+        assert (image.format, image.size, image.mode) == ("WEBP", (16, 16), "RGBA")
+
+def test_transcode_cached_on_disk(tmp_path):
+    """Test that each texture is only transcoded once"""
+    output = io.BytesIO()
+    Image.new("RGBA", (8, 8)).save(output, "PNG")
+    first = textures.transcode(output.getvalue(), "webp", str(tmp_path))
+
+    with patch("PIL.Image.open", side_effect=AssertionError("transcoded again")):
+        assert textures.transcode(output.getvalue(), "webp", str(tmp_path)) == first
+
+def test_build_bundle_without_pillow(textured_model_file, tmp_path):
+    """Test that models are still bundled with their original textures when Pillow is unavailable"""
+    with patch.object(textures, "PILLOW_AVAILABLE", False):
+        variants = models.build_bundle(textured_model_file, str(tmp_path / "bundles"))
+
+    assert list(variants) == ["original"]
+
+# Test choose_variant()
+@pytest.mark.parametrize("cookies, headers, expected", [
+    ({}, {}, "original"),
+    ({}, {"accept": "text/html,image/avif,image/webp,*/*;q=0.8"}, "webp"),
+    ({"device-hint": "2560_8_16384_1"}, {}, "webp"),
+    ({"device-hint": "1280_4_8192_1"}, {}, "1024"),
+    ({"device-hint": "2400_1_8192_1"}, {}, "512"),
+    ({"device-hint": "2400_0_1024_1"}, {}, "1024"),
+    ({"device-hint": "1280_4_8192_0"}, {}, "original"),  # No WebP support (e.g. iOS Safari < 14)
+    ({"device-hint": "1280_4_8192"}, {}, "original"),    # Cookie from before WebP support was reported
+    ({"device-hint": "invalid"}, {"accept": "image/webp", "sec-ch-viewport-width": "390", "sec-ch-dpr": "2"}, "512"),
+    ({}, {"accept": "image/webp", "sec-ch-device-memory": "2"}, "1024"),
+    ({"device-hint": "2560_8_16384_1"}, {"save-data": "on"}, "1024"),
+])
+def test_choose_variant(cookies, headers, expected):
+    """Test texture variant selection from the device hint cookie and Client Hints"""
+    request = MagicMock()
+    request.cookies = cookies
+    request.headers = headers
+
+    assert models.choose_variant(request) == expected
+
+# Test watch_live2d_models()
+@pytest.mark.asyncio
+async def test_watch_rebuilds_edited_models(model_file, tmp_path):
+    """Test that editing a model's files repackages it under a new URL and refreshes /api/get_models"""
+    import app
+    model_dict_file = tmp_path / "model_dict.json"
+    model_dict_file.write_text(json.dumps([{"name": "haru", "file_path": model_file}]))
+
+    with patch.object(app, "MODEL_WATCH_INTERVAL", 0), patch.object(app, "MODEL_BUNDLE", True), \
+         patch.object(settings, "model_dict_file", str(model_dict_file)), \
+         patch.object(models, "BUNDLE_DIR", str(tmp_path / "bundles")), \
+         patch.object(settings.models_response, "invalidate") as invalidate:
+        await app.watch_live2d_models()
+        first = models.bundle_url(model_file)
+        await app.watch_live2d_models()
+        assert models.bundle_url(model_file) == first and invalidate.call_count == 1  # Unchanged: nothing rebuilt
+
+        with open(os.path.join(os.path.dirname(model_file), "haru.moc3"), "ab") as f:
+            f.write(b"\x02")
+        await app.watch_live2d_models()
+
+    assert models.bundle_url(model_file) != first and invalidate.call_count == 2
+
+@pytest.mark.asyncio
+async def test_watch_serves_bundles_built_by_another_worker(model_file, tmp_path):
+    """Test that workers not holding the 'live2d_models' claim serve the bundles recorded by the one that built them"""
+    import app
+    bundle_dir = str(tmp_path / "bundles")
+    filename = models.build_bundle(model_file, bundle_dir)["original"]
+    models.save_index(bundle_dir)
+    models.bundles.clear()
+    models.bundle_files.clear()
+
+    with patch.object(app, "MODEL_WATCH_INTERVAL", 0), patch.object(app, "MODEL_BUNDLE", True), \
+         patch.object(models, "BUNDLE_DIR", bundle_dir), \
+         patch.object(app.state.backend, "claim", AsyncMock(return_value=False)), \
+         patch.object(models, "build_bundles") as build_bundles, \
+         patch.object(settings.models_response, "invalidate") as invalidate:
+        await app.watch_live2d_models()
+
+    build_bundles.assert_not_called()
+    invalidate.assert_called_once()
+    assert models.bundle_url(model_file) == f"/live2d_bundles/{filename}"
+
+# Test GET /live2d_bundles/{filename}
+def test_get_bundle_immutable_gzip(client, model_file, tmp_path):
+    """Test that bundles are served gzip-encoded with immutable caching"""
+    url = f"/live2d_bundles/{models.build_bundle(model_file, str(tmp_path / 'bundles'))['original']}"
+
+    response = client.get(url)
+
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "immutable" in response.headers["Cache-Control"]
+    assert "haru.moc3" in models.unpack(response.content)
+
+def test_get_bundle_without_gzip_support(client, model_file, tmp_path):
+    """Test that clients which do not accept gzip receive the decoded bundle"""
+    url = f"/live2d_bundles/{models.build_bundle(model_file, str(tmp_path / 'bundles'))['original']}"
+
+    response = client.get(url, headers={"Accept-Encoding": "identity"})
+
+    assert "Content-Encoding" not in response.headers
+    assert "haru.moc3" in models.unpack(response.content)
+
+def test_get_bundle_reports_bytes_saved(client, textured_model_file, tmp_path):
+    """Test that serving a texture variant counts the bytes saved against the original textures"""
+    variants = models.build_bundle(textured_model_file, str(tmp_path / "bundles"))
+    saved_before = metrics.bundle_bytes_saved.get("512", 0)
+
+    client.get(f"/live2d_bundles/{variants['512']}")
+
+    bundle = models.bundle_files[variants["512"]]
+    assert metrics.bundle_bytes_saved["512"] - saved_before == bundle["original_size"] - bundle["size"]
+    assert 'vchaos_model_bundle_bytes_saved_total{variant="512"}' in client.get("/metrics").text
+
+def test_get_bundle_not_found(client):
+    """Test API response for an unknown or outdated bundle"""
+    response = client.get("/live2d_bundles/haru.0000000000000000.bundle")
+
+    assert response.status_code == 404
+
+# Test preload hints
+def test_root_preloads_configured_model(client, textured_model_file, tmp_path):
+    """Test that the page announces the bundle of the model chosen by 'frontend.model-name', in the device's texture variant"""
+    model_file = textured_model_file
+    filename = models.build_bundle(model_file, str(tmp_path / "bundles"))["1024"]
+    settings_file = tmp_path / "settings.yaml"
+    settings_file.write_text("frontend:\n  model-name: haru\n")
+    model_dict_file = tmp_path / "model_dict.json"
+    model_dict_file.write_text(json.dumps([{"name": "haru", "file_path": model_file}]))
+
+    with patch.object(settings.settings_response, "path", str(settings_file)), \
+         patch.object(settings.models_response, "path", str(model_dict_file)):
+        settings.settings_response.invalidate()
+        settings.models_response.invalidate()
+        response = client.get("/", headers={"Cookie": "device-hint=1280_4_8192_1"})
+        model_list = client.get("/api/get_models").json()
+
+    assert response.status_code == 200
+    assert response.headers["Link"] == f"</live2d_bundles/{filename}>; rel=preload; as=fetch; crossorigin=anonymous"
+    assert response.cookies["texture-variant"] == "1024"
+    assert model_list[0]["bundleUrls"]["1024"] == f"/live2d_bundles/{filename}"
+    assert model_list[0]["bundleUrl"] == model_list[0]["bundleUrls"]["original"]
+
+def test_root_without_bundle_has_no_preload(client):
+    """Test that no preload hint is sent for models that have not been packaged"""
+    response = client.get("/")
+
+    assert response.status_code == 200
+    assert "Link" not in response.headers
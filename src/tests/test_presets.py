@@ -1,234 +1,275 @@
 # tests/test_presets.py
 import pytest
+import os
 import json
-from unittest.mock import patch, mock_open
+from unittest.mock import patch
 from routes import presets
 
+@pytest.fixture
+def preset_path(tmp_path, monkeypatch):
+    """Point the preset store at a temporary 'preset_file'."""
+    path = tmp_path / "presets.json"
+    monkeypatch.setattr(presets, "store", presets.PresetStore(str(path)))
+    return path
+
+def write_presets(path, data):
+    """Write raw preset file contents, as if edited outside of the store."""
+    path.write_text(data if isinstance(data, str) else json.dumps(data), encoding="utf-8")
+
 # Test GET /api/get_presets
-def test_get_presets_success(client, setup_websocket):
+def test_get_presets_success(client, setup_websocket, preset_path):
     """Test successful retrieval of presets"""
-    mock_data = json.dumps([
+    mock_data = [
         {"name": "Preset1", "prompt": "Hello World"},
         {"name": "Preset2", "prompt": "Another Prompt"}
-    ])
-    with patch("builtins.open", mock_open(read_data=mock_data)), \
-         patch("os.path.exists", return_value=True):
+    ]
+    write_presets(preset_path, mock_data)
 
-        response = client.get("/api/get_presets")
+    response = client.get("/api/get_presets")
     
     assert response.status_code == 200
-    assert response.json() == json.loads(mock_data)
+    assert response.json() == mock_data
 
 @pytest.mark.asyncio
-async def test_get_presets_not_list(client, setup_websocket):
+async def test_get_presets_not_list(client, setup_websocket, preset_path):
     """Test handling when 'preset_file' contains invalid non-list data"""
-    mock_data = json.dumps({"name": "Only name but no prompt (dict instead of list)"})
-    with patch("builtins.open", mock_open(read_data=mock_data)), \
-         patch("os.path.exists", return_value=True):
+    write_presets(preset_path, {"name": "Only name but no prompt (dict instead of list)"})
 
-        response = client.get("/api/get_presets")
+    response = client.get("/api/get_presets")
 
     assert response.status_code == 200
     assert response.json() == []
 
-def test_get_presets_file_missing(client, setup_websocket):
+def test_get_presets_file_missing(client, setup_websocket, preset_path):
     """Test handling when 'preset_file' is missing"""
-    with patch("os.path.exists", return_value=False):
-        response = client.get("/api/get_presets")
+    response = client.get("/api/get_presets")
 
     assert response.status_code == 200
     assert response.json() == []
 
-def test_get_presets_invalid_json(client, setup_websocket):
+def test_get_presets_invalid_json(client, setup_websocket, preset_path):
     """Test handling when 'preset_file' contains invalid JSON format"""
-    with patch("builtins.open", mock_open(read_data="invalid json")), \
-         patch("os.path.exists", return_value=True):
+    write_presets(preset_path, "invalid json")
 
-        response = client.get("/api/get_presets")
+    response = client.get("/api/get_presets")
     
     assert response.status_code == 500
     assert response.json() == {"error": "Invalid JSON format"}
 
 @pytest.mark.asyncio
-async def test_get_presets_exception(client, setup_websocket):
+async def test_get_presets_exception(client, setup_websocket, preset_path):
     """Test API response when an exception occurs"""
-    with patch("builtins.open", side_effect=Exception("Unexpected error")), \
-         patch("os.path.exists", return_value=True):
+    write_presets(preset_path, [])
+    with patch("builtins.open", side_effect=Exception("Unexpected error")):
         response = client.get("/api/get_presets")
 
     assert response.status_code == 500
     assert response.json() == {"error": "Unexpected error"}
 
+def test_get_presets_served_from_memory(client, setup_websocket, preset_path):
+    """Test that the preset file is parsed once and not reopened while unchanged"""
+    write_presets(preset_path, [{"name": "Preset1", "prompt": "Hello World"}])
+    client.get("/api/get_presets")
+
+    with patch("builtins.open", side_effect=AssertionError("preset file reopened")):
+        response = client.get("/api/get_presets")
+
+    assert response.json() == [{"name": "Preset1", "prompt": "Hello World"}]
+
+def test_get_presets_reloads_external_changes(client, setup_websocket, preset_path):
+    """Test that edits made to 'preset_file' outside of the API are picked up"""
+    write_presets(preset_path, [{"name": "Preset1", "prompt": "Hello World"}])
+    client.get("/api/get_presets")
+
+    write_presets(preset_path, [{"name": "Preset2", "prompt": "Edited"}])
+    os.utime(preset_path, ns=(0, 0))
+    response = client.get("/api/get_presets")
+
+    assert response.json() == [{"name": "Preset2", "prompt": "Edited"}]
+
 # Test POST /api/save_presets
 @pytest.mark.asyncio
-async def test_save_preset_new(client, setup_websocket):
+async def test_save_preset_new(client, setup_websocket, preset_path):
     """Test successful saving of a new preset"""
-    mock_data = json.dumps([
-        {"name": "Preset1", "prompt": "Hello World"}
-    ])
-
-    with patch("builtins.open", mock_open(read_data=mock_data)), \
-         patch("os.path.exists", return_value=True):
+    write_presets(preset_path, [{"name": "Preset1", "prompt": "Hello World"}])
 
-        response = client.post("/api/save_preset", json={"name": "Preset2", "prompt": "New Prompt"})
+    response = client.post("/api/save_preset", json={"name": "Preset2", "prompt": "New Prompt"})
     
     assert response.status_code == 200
     assert response.json() == {"success": True, "message": "Preset saved successfully"}
+    assert json.loads(preset_path.read_text()) == [
+        {"name": "Preset1", "prompt": "Hello World"},
+        {"name": "Preset2", "prompt": "New Prompt"}
+    ]
 
 @pytest.mark.asyncio
-async def test_save_preset_update(client, setup_websocket):
-    """Test successful updating of a new preset"""
-    mock_data = json.dumps([
-        {"name": "Preset1", "prompt": "Old Prompt"}
-    ])
+async def test_save_preset_update(client, setup_websocket, preset_path):
+    """Test successful updating of an existing preset"""
+    write_presets(preset_path, [{"name": "Preset1", "prompt": "Old Prompt"}])
 
-    with patch("builtins.open", mock_open(read_data=mock_data)), \
-         patch("os.path.exists", return_value=True):
-
-        response = client.post("/api/save_preset", json={"name": "Preset1", "prompt": "Updated Prompt"})
+    response = client.post("/api/save_preset", json={"name": "Preset1", "prompt": "Updated Prompt"})
     
     assert response.status_code == 200
     assert response.json() == {"success": True, "message": "Preset saved successfully"}
+    assert json.loads(preset_path.read_text()) == [{"name": "Preset1", "prompt": "Updated Prompt"}]
 
 @pytest.mark.asyncio
-async def test_save_preset_creates_new_file(client, setup_websocket):
-    """Test that save_preset creates a new 'preset_file' if missing."""
-    with patch("os.path.exists", return_value=False), \
-         patch("builtins.open", mock_open()) as mock_file:
+async def test_save_preset_keeps_names_differing_in_case(client, setup_websocket, preset_path):
+    """Test that presets whose names differ only in case are kept apart, both when loaded and saved"""
+    write_presets(preset_path, [{"name": "Preset1", "prompt": "First"}, {"name": "PRESET1", "prompt": "Second"}])
 
-        response = client.post("/api/save_preset", json={"name": "Preset1", "prompt": "Hello World"})
+    response = client.post("/api/save_preset", json={"name": "preset1", "prompt": "Third"})
+
+    assert response.status_code == 200
+    assert json.loads(preset_path.read_text()) == [
+        {"name": "Preset1", "prompt": "First"},
+        {"name": "PRESET1", "prompt": "Second"},
+        {"name": "preset1", "prompt": "Third"}
+    ]
+
+@pytest.mark.asyncio
+async def test_save_preset_keeps_file_permissions(client, setup_websocket, preset_path):
+    """Test that replacing the preset file keeps its permissions"""
+    write_presets(preset_path, [{"name": "Preset1", "prompt": "Old Prompt"}])
+    os.chmod(preset_path, 0o664)
+
+    client.post("/api/save_preset", json={"name": "Preset1", "prompt": "Updated Prompt"})
+
+    assert os.stat(preset_path).st_mode & 0o777 == 0o664
+
+@pytest.mark.asyncio
+async def test_save_preset_creates_new_file(client, setup_websocket, preset_path):
+    """Test that save_preset creates a new 'preset_file' if missing."""
+    response = client.post("/api/save_preset", json={"name": "Preset1", "prompt": "Hello World"})
 
     assert response.status_code == 200
     assert response.json() == {"success": True, "message": "Preset saved successfully"}
+    assert json.loads(preset_path.read_text()) == [{"name": "Preset1", "prompt": "Hello World"}]
 
 @pytest.mark.asyncio
-async def test_save_preset_missing_fields(client, setup_websocket):
+async def test_save_preset_missing_fields(client, setup_websocket, preset_path):
     """Test API response when required fields name and prompt are missing"""
-    with patch("os.path.exists", return_value=True), \
-         patch("builtins.open", mock_open(read_data="[]")):
-
-        response = client.post("/api/save_preset", json={"name": "", "prompt": ""})
+    response = client.post("/api/save_preset", json={"name": "", "prompt": ""})
 
     assert response.status_code == 400
     assert response.json() == {"success": False, "error": "Both name and prompt are required."}
+    assert not preset_path.exists()
 
 @pytest.mark.asyncio
-async def test_save_preset_not_list(client, setup_websocket):
+async def test_save_preset_sanitizes_input(client, setup_websocket, preset_path):
+    """Test that markup characters in names and prompts are escaped"""
+    client.post("/api/save_preset", json={"name": "<b>", "prompt": "a=b"})
+
+    assert json.loads(preset_path.read_text()) == [{"name": "&lt;b&gt;", "prompt": "a&#x3D;b"}]
+
+@pytest.mark.asyncio
+async def test_save_preset_not_list(client, setup_websocket, preset_path):
     """Test API response when 'preset_file' contains valid JSON but not a list"""
-    mock_data = json.dumps({"name": "Only name but no prompt"})
-    with patch("builtins.open", mock_open(read_data=mock_data)), \
-         patch("os.path.exists", return_value=True):
+    write_presets(preset_path, {"name": "Only name but no prompt"})
 
-        response = client.post("/api/save_preset", json={"name": "Preset1", "prompt": "Hello World"})
+    response = client.post("/api/save_preset", json={"name": "Preset1", "prompt": "Hello World"})
 
     assert response.status_code == 200
     assert response.json() == {"success": True, "message": "Preset saved successfully"}
 
 @pytest.mark.asyncio
-async def test_save_preset_json_decode_error(client, setup_websocket):
+async def test_save_preset_json_decode_error(client, setup_websocket, preset_path):
     """Test API response when a JSON decode error occurs"""
-    with patch("builtins.open", mock_open(read_data="invalid json")), \
-         patch("os.path.exists", return_value=True):
-        response = client.post("/api/save_preset", json={"name": "Preset1", "prompt": "Hello World"})
+    write_presets(preset_path, "invalid json")
+
+    response = client.post("/api/save_preset", json={"name": "Preset1", "prompt": "Hello World"})
 
     assert response.status_code == 200
+    assert json.loads(preset_path.read_text()) == [{"name": "Preset1", "prompt": "Hello World"}]
 
 @pytest.mark.asyncio
-async def test_save_preset_exception(client, setup_websocket):
-    """Test API response when an exception occurs"""
-    with patch("builtins.open", side_effect=Exception("Unexpected write error")), \
-         patch("os.path.exists", return_value=True):
-        response = client.post("/api/save_preset", json={"name": "Preset1", "prompt": "Hello World"})
+async def test_save_preset_exception(client, setup_websocket, preset_path):
+    """Test API response when an exception occurs, leaving the original file intact"""
+    write_presets(preset_path, [{"name": "Preset1", "prompt": "Hello World"}])
+
+    with patch("routes.presets.os.replace", side_effect=Exception("Unexpected write error")):
+        response = client.post("/api/save_preset", json={"name": "Preset2", "prompt": "New Prompt"})
 
     assert response.status_code == 500
     assert response.json() == {"success": False, "error": "Unexpected write error"}
+    assert json.loads(preset_path.read_text()) == [{"name": "Preset1", "prompt": "Hello World"}]
+    assert os.listdir(preset_path.parent) == ["presets.json"]
+    assert client.get("/api/get_presets").json() == [{"name": "Preset1", "prompt": "Hello World"}]
 
 # Test DELETE /api/delete_presets
 @pytest.mark.asyncio
-async def test_delete_presets_success(client, setup_websocket):
-    """Test successful deletion of a preset"""
-    mock_data = json.dumps([
+async def test_delete_presets_success(client, setup_websocket, preset_path):
+    """Test successful deletion of a preset, matched case-insensitively"""
+    write_presets(preset_path, [
         {"name": "Preset1", "prompt": "Hello World"},
         {"name": "Preset2", "prompt": "Another Prompt"}
     ])
 
-    with patch("builtins.open", mock_open(read_data=mock_data)), \
-         patch("os.path.exists", return_value=True):
-
-        response = client.post("/api/delete_presets", json={"names": ["Preset1"]})
+    response = client.post("/api/delete_presets", json={"names": ["PRESET1"]})
     
     assert response.status_code == 200
     assert response.json() == {"success": True, "message": "Deleted 1 preset successfully."}
+    assert json.loads(preset_path.read_text()) == [{"name": "Preset2", "prompt": "Another Prompt"}]
 
 @pytest.mark.asyncio
-async def test_delete_presets_not_found(client, setup_websocket):
+async def test_delete_presets_not_found(client, setup_websocket, preset_path):
     """Test API response when the provided preset is not in the 'preset_file'"""
-    mock_data = json.dumps([
-        {"name": "Preset1", "prompt": "Hello World"}
-    ])
-
-    with patch("builtins.open", mock_open(read_data=mock_data)), \
-         patch("os.path.exists", return_value=True):
+    write_presets(preset_path, [{"name": "Preset1", "prompt": "Hello World"}])
 
-        response = client.post("/api/delete_presets", json={"names": ["NonexistentPreset"]})
+    response = client.post("/api/delete_presets", json={"names": ["NonexistentPreset"]})
     
     assert response.status_code == 404
     assert response.json() == {"success": False, "error": "No matching presets found."}
 
 @pytest.mark.asyncio
-async def test_delete_presets_file_missing(client, setup_websocket):
+async def test_delete_presets_file_missing(client, setup_websocket, preset_path):
     """Test API response when 'preset_file' is missing"""
-    with patch("os.path.exists", return_value=False):
-        response = client.post("/api/delete_presets", json={"names": ["Preset1"]})
+    response = client.post("/api/delete_presets", json={"names": ["Preset1"]})
 
     assert response.status_code == 404
     assert response.json() == {"success": False, "error": "Preset file not found"}
 
 @pytest.mark.asyncio
-async def test_delete_presets_not_list(client, setup_websocket):
+async def test_delete_presets_not_list(client, setup_websocket, preset_path):
     """Test API response when 'preset_file' contains valid JSON but not a list"""
-    mock_data = json.dumps({"name": "Only name but no prompt"})
-    
-    with patch("builtins.open", mock_open(read_data=mock_data)), \
-         patch("os.path.exists", return_value=True):
+    write_presets(preset_path, {"name": "Only name but no prompt"})
 
-        response = client.post("/api/delete_presets", json={"names": ["Preset1"]})
+    response = client.post("/api/delete_presets", json={"names": ["Preset1"]})
 
     assert response.status_code == 404
     assert response.json() == {"success": False, "error": "No matching presets found."}
 
 @pytest.mark.asyncio
-async def test_delete_presets_json_decode_error(client, setup_websocket):
+async def test_delete_presets_json_decode_error(client, setup_websocket, preset_path):
     """Test API response when a JSON decode error occurs"""
-    with patch("builtins.open", mock_open(read_data="invalid json")), \
-         patch("os.path.exists", return_value=True):
-        response = client.post("/api/delete_presets", json={"names": ["Preset1"]})
+    write_presets(preset_path, "invalid json")
+
+    response = client.post("/api/delete_presets", json={"names": ["Preset1"]})
 
     assert response.status_code == 404
     assert response.json() == {"success": False, "error": "No matching presets found."}
 
 @pytest.mark.asyncio
-async def test_delete_presets_no_names_provided(client, setup_websocket):
+async def test_delete_presets_no_names_provided(client, setup_websocket, preset_path):
     """Test deleting presets when no names are provided (it should delete all presets)"""
-    mock_data = json.dumps([
+    write_presets(preset_path, [
         {"name": "Preset1", "prompt": "Hello World"},
         {"name": "Preset2", "prompt": "Another Prompt"}
     ])
 
-    with patch("builtins.open", mock_open(read_data=mock_data)), \
-         patch("os.path.exists", return_value=True):
-
-        response = client.post("/api/delete_presets", json={})
+    response = client.post("/api/delete_presets", json={})
 
     assert response.status_code == 200
     assert response.json() == {"success": True, "message": "Deleted 2 presets successfully."}
+    assert json.loads(preset_path.read_text()) == []
 
 @pytest.mark.asyncio
-async def test_delete_presets_exception(client, setup_websocket):
+async def test_delete_presets_exception(client, setup_websocket, preset_path):
     """Test API response when an exception occurs"""
-    with patch("builtins.open", side_effect=Exception("Unexpected file error")), \
-         patch("os.path.exists", return_value=True):
+    write_presets(preset_path, [{"name": "Preset1", "prompt": "Hello World"}])
+
+    with patch("builtins.open", side_effect=Exception("Unexpected file error")):
         response = client.post("/api/delete_presets", json={"names": ["Preset1"]})
 
     assert response.status_code == 500
-    assert response.json() == {"success": False, "error": "Unexpected file error"}
\ No newline at end of file
+    assert response.json() == {"success": False, "error": "Unexpected file error"}
@@ -10,6 +10,15 @@ yaml = YAML()
 yaml.preserve_quotes = True
 yaml.indent(mapping=2, sequence=4, offset=2)
 
+@pytest.fixture(autouse=True)
+def reset_cached_responses():
+    """Discard precomputed response bodies, so each test reads its own mocked file."""
+    settings.settings_response.invalidate()
+    settings.models_response.invalidate()
+    yield
+    settings.settings_response.invalidate()
+    settings.models_response.invalidate()
+
 # Mock files
 mock_settings_yaml = """
     backend:
@@ -107,6 +116,44 @@ def test_get_settings_exception(client):
         assert response.status_code == 500
         assert "Unexpected failure" in response.json()["error"]
 
+def test_get_settings_not_modified(client):
+    """Test that a request carrying the current ETag receives an empty 304 response"""
+    with patch("builtins.open", mock_open(read_data=mock_settings_yaml)):
+        first = client.get("/api/get_settings")
+        second = client.get("/api/get_settings", headers={"If-None-Match": first.headers["ETag"]})
+
+    assert first.status_code == 200
+    assert first.headers["ETag"].startswith('"')
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["ETag"] == first.headers["ETag"]
+
+def test_get_settings_served_from_cache(client):
+    """Test that settings are not reparsed while 'settings_file' is unchanged"""
+    with patch("builtins.open", mock_open(read_data=mock_settings_yaml)):
+        first = client.get("/api/get_settings")
+
+    with patch("builtins.open", side_effect=AssertionError("settings file reopened")):
+        second = client.get("/api/get_settings", headers={"If-None-Match": '"stale"'})
+
+    assert second.status_code == 200
+    assert second.content == first.content
+
+def test_get_settings_rebuilt_after_file_change(client, tmp_path):
+    """Test that the body and ETag are recomputed when 'settings_file' changes"""
+    path = tmp_path / "settings.yaml"
+    path.write_text(mock_settings_yaml, encoding="utf-8")
+    cached = settings.FileBackedResponse(str(path), settings.load_frontend_settings)
+
+    with patch.object(settings, "settings_response", cached):
+        first = client.get("/api/get_settings")
+        path.write_text(mock_settings_yaml.replace("shizuku", "hiyori"), encoding="utf-8")
+        second = client.get("/api/get_settings", headers={"If-None-Match": first.headers["ETag"]})
+
+    assert second.status_code == 200
+    assert second.json()["model-name"] == "hiyori"
+    assert second.headers["ETag"] != first.headers["ETag"]
+
 # Test POST /api/update_settings
 def test_update_settings_success(client, setup_websocket):
     """Test updating all frontend settings using a mock file."""
@@ -238,6 +285,14 @@ def test_get_models_success(client):
         assert response.json()[1]["tapMotion"] == "tap"
         assert response.json()[1]["tapMotionCount"] == 1
 
+def test_get_models_not_modified(client):
+    """Test that model list revalidation with a matching ETag returns 304"""
+    with patch("builtins.open", mock_open(read_data=mock_model_dict_json)):
+        etag = client.get("/api/get_models").headers["ETag"]
+        response = client.get("/api/get_models", headers={"If-None-Match": f'W/"other", {etag}'})
+
+    assert response.status_code == 304
+
 def test_get_models_file_not_found(client):
     """Test API response when model_dict.json is missing"""
     with patch("builtins.open", side_effect=FileNotFoundError):
@@ -0,0 +1,43 @@
+# tests/test_startup.py
+import sys
+import json
+import subprocess
+import startup_profile
+
+def run_in_fresh_interpreter(code: str) -> str:
+    """Runs code in a new interpreter (from the app directory), as modules imported by the tests are already cached here."""
+    result = subprocess.run([sys.executable, "-c", code], cwd=startup_profile.APP_DIR, capture_output=True, text=True, check=True)
+    return result.stdout
+
+def test_heavy_dependencies_imported_lazily():
+    """Test that importing the app does not import dependencies only needed to handle prompts or to serve"""
+    output = run_in_fresh_interpreter(
+        "import sys, json, app; "
+        "print(json.dumps([m for m in ('httpx', 'wyoming', 'numpy', 'uvicorn', 'PIL', 'msgpack') if m in sys.modules]))"
+    )
+    assert json.loads(output) == []
+
+def test_settings_parsed_once():
+    """Test that settings.yaml is parsed once at startup, however many modules read it"""
+    output = run_in_fresh_interpreter(
+        "from routes import settings; calls = []; load = settings.load_settings; "
+        "settings.load_settings = lambda *args: calls.append(args) or load(*args); "
+        "import app; print(len(calls))"
+    )
+    assert int(output) == 1
+
+def test_logging_configured_by_app_only():
+    """Test that the log format and level configured by app.py are the ones in effect"""
+    output = run_in_fresh_interpreter(
+        "import logging, app; handler = logging.getLogger().handlers[0]; "
+        "print(handler.formatter._fmt)"
+    )
+    assert output.strip() == "[vCHAOS] (%(levelname)s) %(message)s"
+
+def test_measure_imports():
+    """Test parsing of the per-module import times"""
+    modules = {name: (self_ms, cumulative_ms, depth) for name, self_ms, cumulative_ms, depth in startup_profile.measure_imports("routes.globals")}
+
+    assert {"routes", "routes.globals", "routes.deletions"} <= set(modules)
+    assert modules["routes.deletions"][2] > modules["routes.globals"][2]  # Imported by routes.globals
+    assert all(cumulative_ms >= self_ms >= 0 for self_ms, cumulative_ms, _ in modules.values())
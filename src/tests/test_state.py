@@ -0,0 +1,212 @@
+# tests/test_state.py
+import pytest
+import pytest_asyncio
+import asyncio
+from routes import state
+from routes.globals import connected_clients
+from routes.state import StateBroker, BrokerStateBackend, MemoryStateBackend, create_backend
+
+async def wait_until(condition, timeout=2.0):
+    """Polls 'condition' until it holds, as broker messages are delivered asynchronously."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "Condition not met in time"
+        await asyncio.sleep(0.01)
+
+@pytest_asyncio.fixture
+async def workers(monkeypatch):
+    """Starts a broker on a free port and two workers connected to it, with isolated handlers."""
+    monkeypatch.setattr(state, "handlers", {})
+    broker = StateBroker()
+    port = await broker.start("127.0.0.1", 0)
+    backends = [BrokerStateBackend("127.0.0.1", port, embedded=False, reconnect_interval=0.05) for _ in range(2)]
+    for backend in backends:
+        await backend.start()
+    yield broker, backends
+    for backend in backends:
+        await backend.stop()
+    await broker.stop()
+
+@pytest.mark.asyncio
+async def test_registrations_are_shared(workers):
+    """Test that a client registered with one worker is known to every worker"""
+    _, (first, second) = workers
+
+    await first.register("192.168.1.10")
+    await wait_until(lambda: second.is_registered("192.168.1.10"))
+    assert second.client_ips() >= {"192.168.1.10"}
+    assert second.client_count() == 1
+
+    await second.register("192.168.1.10")
+    await wait_until(lambda: first.client_count() == 2)
+
+    assert await first.unregister("192.168.1.10") == 1  # Still connected to the second worker
+    assert await second.unregister("192.168.1.10") == 0
+    await wait_until(lambda: not first.is_registered("192.168.1.10"))
+
+@pytest.mark.asyncio
+async def test_publish_reaches_every_worker(workers):
+    """Test that published messages are delivered to the handlers of all workers, once each"""
+    _, (first, second) = workers
+    received = []
+
+    async def handler(payload):
+        received.append(payload)
+
+    state.subscribe("broadcast", handler)
+    await first.publish("broadcast", {"text": "hello"})
+
+    # Both workers share the handler registry in this process, so it runs once per worker
+    await wait_until(lambda: len(received) == 2)
+    assert received == [{"text": "hello"}, {"text": "hello"}]
+
+@pytest.mark.asyncio
+async def test_slow_handler_does_not_block_replies(workers):
+    """Test that a handler still running does not hold up the broker's replies to the same worker"""
+    _, (first, _) = workers
+    blocked = asyncio.Event()
+
+    async def handler(payload):
+        await blocked.wait()
+
+    state.subscribe("kick", handler)
+    await first.publish("kick", {"ip": "192.168.1.13"})
+    await asyncio.sleep(0.05)
+
+    assert await asyncio.wait_for(first.claim("notification:4", 30), 0.5)
+    blocked.set()
+
+@pytest.mark.asyncio
+async def test_claim_is_exclusive(workers):
+    """Test that a unit of work can only be claimed by one worker until its claim expires"""
+    _, (first, second) = workers
+
+    results = await asyncio.gather(first.claim("notification:1", 30), second.claim("notification:1", 30))
+    assert sorted(results) == [False, True]
+    owner, other = (first, second) if results[0] else (second, first)
+    assert await owner.claim("notification:1", 30)  # The claimant may retry its own claim
+    assert not await other.claim("notification:1", 30)
+
+    assert await first.claim("notification:2", 0.05)
+    await asyncio.sleep(0.1)
+    assert await second.claim("notification:2", 30)  # Expired, so another worker may take over
+
+@pytest.mark.asyncio
+async def test_slots_are_shared(workers):
+    """Test that a slot freed by one worker is handed to another worker waiting for it"""
+    _, (first, second) = workers
+
+    slot = await first.acquire("admission:llm", 1)
+    assert slot is not None
+    waiter = asyncio.create_task(second.acquire("admission:llm", 1))
+    await asyncio.sleep(0.1)
+    assert not waiter.done()
+
+    await first.release("admission:llm", slot)
+    assert await asyncio.wait_for(waiter, 0.5) is not None  # Woken by the broker, not the poll interval
+
+@pytest.mark.asyncio
+async def test_disconnected_worker_slots_are_freed(workers):
+    """Test that the slots of a worker that lost its broker connection are freed for the others"""
+    _, (first, second) = workers
+
+    await first.acquire("admission:stt", 1)
+    waiter = asyncio.create_task(second.acquire("admission:stt", 1))
+    await asyncio.sleep(0.1)
+
+    await first.stop()
+    assert await asyncio.wait_for(waiter, 0.5) is not None
+
+@pytest.mark.asyncio
+async def test_disconnected_worker_registrations_are_dropped(workers):
+    """Test that clients of a worker that lost its broker connection are no longer considered connected"""
+    _, (first, second) = workers
+
+    await first.register("192.168.1.11")
+    await wait_until(lambda: second.is_registered("192.168.1.11"))
+
+    await first.stop()
+    await wait_until(lambda: not second.is_registered("192.168.1.11"))
+
+@pytest.mark.asyncio
+async def test_registrations_replayed_after_reconnect(workers):
+    """Test that a worker re-registers its clients when the broker comes back"""
+    broker, (first, second) = workers
+    port = broker.server.sockets[0].getsockname()[1]
+
+    await first.register("192.168.1.12")
+    await broker.stop()
+    await wait_until(lambda: not first.connected and not second.connected)
+
+    # Unreachable broker: degrade to local behaviour
+    assert await first.claim("notification:3", 30)
+
+    restarted = StateBroker()
+    await restarted.start("127.0.0.1", port)
+    try:
+        await wait_until(lambda: second.is_registered("192.168.1.12"))
+    finally:
+        await first.stop()
+        await second.stop()
+        await restarted.stop()
+
+@pytest.mark.asyncio
+async def test_embedded_broker_hosted_by_first_worker(monkeypatch):
+    """Test that with an embedded broker, one worker hosts it and the others connect to it"""
+    monkeypatch.setattr(state, "handlers", {})
+    probe = StateBroker()
+    port = await probe.start("127.0.0.1", 0)
+    await probe.stop()
+
+    first = BrokerStateBackend("127.0.0.1", port, embedded=True, reconnect_interval=0.05)
+    second = BrokerStateBackend("127.0.0.1", port, embedded=True, reconnect_interval=0.05)
+    await first.start()
+    await second.start()
+    try:
+        assert first.broker is not None and second.broker is None
+        await second.register("192.168.1.13")
+        await wait_until(lambda: first.is_registered("192.168.1.13"))
+    finally:
+        await second.stop()
+        await first.stop()
+
+@pytest.mark.asyncio
+async def test_broker_requires_token(monkeypatch):
+    """Test that a broker with a token only shares state with workers presenting it"""
+    monkeypatch.setattr(state, "handlers", {})
+    broker = StateBroker(token="s3cret")
+    port = await broker.start("127.0.0.1", 0)
+    trusted = BrokerStateBackend("127.0.0.1", port, embedded=False, reconnect_interval=0.05, token="s3cret")
+    intruder = BrokerStateBackend("127.0.0.1", port, embedded=False, reconnect_interval=0.05, token="guess")
+    await trusted.start()
+    await intruder.start()
+    try:
+        await intruder.register("192.168.1.15")
+        await trusted.register("192.168.1.16")
+        await wait_until(lambda: trusted.is_registered("192.168.1.16") and len(broker.connections) == 1)
+        await asyncio.sleep(0.1)
+        assert not trusted.is_registered("192.168.1.15")
+    finally:
+        await intruder.stop()
+        await trusted.stop()
+        await broker.stop()
+
+@pytest.mark.asyncio
+async def test_memory_backend_uses_local_connections():
+    """Test that the default backend reflects this worker's connections"""
+    backend = MemoryStateBackend()
+    connected_clients.add((None, "192.168.1.14"))
+    try:
+        assert backend.is_registered("192.168.1.14")
+        assert "192.168.1.14" in backend.client_ips()
+        assert await backend.claim("notification:4", 30)
+    finally:
+        connected_clients.discard((None, "192.168.1.14"))
+    assert await backend.unregister("192.168.1.14") == 0
+
+def test_create_backend():
+    """Test selection of the backend from settings.yaml"""
+    assert isinstance(create_backend({}), MemoryStateBackend)
+    backend = create_backend({"backend": "broker", "broker_port": 12000})
+    assert isinstance(backend, BrokerStateBackend) and backend.port == 12000
+    assert create_backend({"backend": "broker", "broker_token": "s3cret"}).token == "s3cret"
@@ -0,0 +1,141 @@
+# tests/test_tracing.py
+import pytest
+import json
+import time
+from unittest.mock import patch, AsyncMock, MagicMock
+from routes import tracing
+
+@pytest.fixture(autouse=True)
+def reset_traces():
+    """Clear all recorded traces between tests."""
+    tracing.traces.clear()
+    tracing.response_index.clear()
+    tracing.pending_traces.clear()
+    yield
+    tracing.traces.clear()
+    tracing.response_index.clear()
+    tracing.pending_traces.clear()
+
+# Test trace correlation
+def test_attach_response_uses_oldest_pending_trace():
+    """Test that responses are attributed to prompts in the order they were sent"""
+    first = tracing.start_trace()
+    second = tracing.start_trace()
+
+    assert tracing.attach_response("1111111111111111111") == first
+    assert tracing.attach_response("2222222222222222222") == second
+    assert tracing.trace_for_response("1111111111111111111") == first
+
+def test_attach_response_prefers_explicit_trace_id():
+    """Test that a correlation ID carried in the notification takes precedence"""
+    first = tracing.start_trace()
+    second = tracing.start_trace()
+
+    assert tracing.attach_response("1111111111111111111", second) == second
+    assert tracing.attach_response("2222222222222222222") == first
+
+def test_attach_response_without_prompt_creates_trace():
+    """Test that unmatched responses (e.g. from satellites) get their own trace"""
+    trace_id = tracing.attach_response("1111111111111111111")
+
+    assert trace_id in tracing.traces
+    assert tracing.traces[trace_id]["response_id"] == "1111111111111111111"
+
+def test_discarded_trace_does_not_claim_response():
+    """Test that failed prompts no longer claim the next response"""
+    failed = tracing.start_trace()
+    tracing.discard_pending(failed)
+
+    assert tracing.attach_response("1111111111111111111") != failed
+
+def test_traces_are_bounded():
+    """Test that the oldest traces are evicted beyond 'MAX_TRACES'"""
+    with patch.object(tracing, "MAX_TRACES", 2):
+        oldest = tracing.start_trace(awaiting_response=False)
+        tracing.attach_response("1111111111111111111", oldest)
+        tracing.start_trace(awaiting_response=False)
+        tracing.start_trace(awaiting_response=False)
+
+    assert len(tracing.traces) == 2
+    assert oldest not in tracing.traces
+    assert tracing.trace_for_response("1111111111111111111") is None
+
+def test_timeline_reports_slowest_hop():
+    """Test timeline deltas and slowest hop detection"""
+    trace_id = tracing.start_trace(awaiting_response=False)
+    tracing.record(trace_id, "prompt_received", 100.0)
+    tracing.record(trace_id, "webhook_completed", 100.5)
+    tracing.record(trace_id, "synthesize_completed", 103.5)
+    tracing.record(trace_id, "client_ack", 103.7)
+
+    result = tracing.timeline(trace_id)
+
+    assert result["total_ms"] == 3700.0
+    assert result["slowest_hop"] == "synthesize_completed"
+    assert [hop["delta_ms"] for hop in result["hops"]] == [0.0, 500.0, 3000.0, 200.0]
+
+@pytest.mark.asyncio
+async def test_trace_log_written_in_batches(tmp_path):
+    """Test that hops are buffered, then appended to the trace log together"""
+    log_file = tmp_path / "traces.jsonl"
+    trace_id = tracing.start_trace(awaiting_response=False)
+
+    with patch.object(tracing, "TRACE_LOG_FILE", str(log_file)):
+        tracing.record(trace_id, "prompt_received", 100.0)
+        tracing.record(trace_id, "webhook_sent", 100.1)
+        assert not log_file.exists()
+
+        await tracing.flush_log()
+
+    lines = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert [line["hop"] for line in lines] == ["prompt_received", "webhook_sent"]
+    assert all(line["trace_id"] == trace_id for line in lines)
+    assert tracing.log_buffer == []
+
+# Test GET /api/trace/{trace_ref}
+def test_get_trace_by_response_id(client):
+    """Test retrieval of a timeline by response ID"""
+    trace_id = tracing.start_trace()
+    tracing.record(trace_id, "prompt_received")
+    tracing.attach_response("1234567890123456789")
+
+    response = client.get("/api/trace/1234567890123456789")
+
+    assert response.status_code == 200
+    assert response.json()["trace_id"] == trace_id
+    assert response.json()["hops"][0]["hop"] == "prompt_received"
+
+def test_get_trace_not_found(client):
+    """Test API response for an unknown response ID"""
+    response = client.get("/api/trace/0000000000000000000")
+
+    assert response.status_code == 404
+
+def test_send_prompt_propagates_trace_id(client, setup_websocket):
+    """Test that send_prompt forwards the correlation ID to the webhook"""
+    mock_response = MagicMock()
+    mock_response.raise_for_status = MagicMock()
+
+    with patch("httpx.AsyncClient") as mock_client:
+        mock_client.return_value.__aenter__.return_value.post = AsyncMock(return_value=mock_response)
+        response = client.post("/api/send_prompt", json={"text": "Hello"})
+        sent_json = mock_client.return_value.__aenter__.return_value.post.call_args.kwargs["json"]
+
+    trace_id = response.json()["trace_id"]
+    assert sent_json["trace_id"] == trace_id
+    assert [hop["hop"] for hop in tracing.traces[trace_id]["hops"]] == ["prompt_received", "webhook_sent", "webhook_completed"]
+
+def test_ack_records_client_hop(client):
+    """Test that a client's playback acknowledgement is recorded in the trace"""
+    trace_id = tracing.attach_response("1234567890123456789")
+
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_text("ack:1234567890123456789")
+        websocket.send_text("flush")
+
+    for _ in range(50):
+        if tracing.traces[trace_id]["hops"]:
+            break
+        time.sleep(0.01)
+
+    assert tracing.traces[trace_id]["hops"][-1]["hop"] == "client_ack"
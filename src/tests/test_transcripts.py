@@ -0,0 +1,53 @@
+# tests/test_transcripts.py
+from unittest.mock import patch
+from routes.transcripts import TranscriptCache
+
+# Test TranscriptCache
+def test_key_depends_on_audio_format_and_language():
+    """Test that only the same recording, in the same format and language, shares a key"""
+    key = TranscriptCache.key(b"\x00\x01" * 100, 16000, 2, 1, "en")
+
+    assert key == TranscriptCache.key(b"\x00\x01" * 100, 16000, 2, 1, "en")
+    assert key != TranscriptCache.key(b"\x00\x02" * 100, 16000, 2, 1, "en")
+    assert key != TranscriptCache.key(b"\x00\x01" * 100, 44100, 2, 1, "en")
+    assert key != TranscriptCache.key(b"\x00\x01" * 100, 16000, 2, 1, "de")
+
+def test_get_counts_hits_and_misses():
+    """Test that lookups are counted as hits or misses (exposed in /metrics)"""
+    cache = TranscriptCache()
+    assert cache.get("a") is None
+
+    cache.put("a", {"transcription": "Hello"})
+
+    assert cache.get("a") == {"transcription": "Hello"}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_expired_entries_are_not_used():
+    """Test that transcripts older than the TTL miss, and are dropped"""
+    cache = TranscriptCache(ttl=10)
+    with patch("routes.transcripts.time.monotonic", return_value=100):
+        cache.put("a", {"transcription": "Hello"})
+    with patch("routes.transcripts.time.monotonic", return_value=109):
+        assert cache.get("a") == {"transcription": "Hello"}
+    with patch("routes.transcripts.time.monotonic", return_value=110):
+        assert cache.get("a") is None
+
+    assert len(cache) == 0
+
+def test_max_entries_evicts_least_recently_used():
+    """Test that the cache is bounded, keeping recently used transcripts"""
+    cache = TranscriptCache(max_entries=2)
+    cache.put("a", {"transcription": "A"})
+    cache.put("b", {"transcription": "B"})
+    cache.get("a")
+    cache.put("c", {"transcription": "C"})
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+def test_disabled_cache():
+    """Test that nothing is cached with 'max_entries' set to 0"""
+    cache = TranscriptCache(max_entries=0)
+    cache.put("a", {"transcription": "A"})
+
+    assert cache.get("a") is None